@@ -1,11 +1,19 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import jwt
+from jose import jwt, JWTError
 import bcrypt
-from fastapi import Depends, HTTPException, status
+import threading
+import time
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_async_db
 from models import User
 import os
 
@@ -13,8 +21,106 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production-pleas
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
+# Authenticated principals are cached per process. Changes committed through
+# the ORM invalidate immediately; anything else (another worker, raw SQL) is
+# picked up within USER_CACHE_TTL_SECONDS.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+
+# bcrypt runs on a small dedicated executor so a login burst can't starve the
+# event loop or the shared threadpool. Requests beyond workers + queue limit
+# are rejected immediately with 503 instead of piling up.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
 security = HTTPBearer()
 
+@dataclass(frozen=True)
+class CachedUser:
+    """Detached, read-only snapshot of the User fields the API needs"""
+    id: int
+    username: str
+    email: str
+    role: str
+    is_active: bool
+
+class UserCache:
+    """Thread-safe LRU cache of user principals with a per-entry TTL"""
+    
+    def __init__(self, maxsize: int, ttl: float, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, username: str) -> Optional[CachedUser]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[username]
+            self.misses += 1
+            return None
+    
+    def set(self, user: CachedUser):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user.username] = (self.clock() + self.ttl, user)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    """Remember users whose row changed so their cache entry drops on commit"""
+    changed = session.info.setdefault("changed_usernames", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.username)
+            # A renamed user must also drop the entry under the old name
+            changed.update(n for n in inspect(obj).attrs.username.history.deleted if n)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for username in session.info.pop("changed_usernames", ()):
+        user_cache.invalidate(username)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_usernames", None)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hashed password"""
     try:
@@ -29,13 +135,81 @@ def get_password_hash(password: str) -> str:
     """Hash a password using bcrypt"""
     try:
         password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
         hashed = bcrypt.hashpw(password_bytes, salt)
         return hashed.decode('utf-8')
     except Exception as e:
         print(f"Password hashing error: {e}")
         raise
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with a different cost than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+class PasswordHasher:
+    """Bounded executor for bcrypt work with fast rejection when saturated"""
+    
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.capacity = workers + queue_limit
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service busy, please retry",
+                    headers={"Retry-After": "1"}
+                )
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._finished(None)
+            raise
+        # Released when the bcrypt job ends, not when the caller stops waiting:
+        # a cancelled request must not free a slot its job still occupies
+        future.add_done_callback(self._finished)
+        return await asyncio.wrap_future(future)
+    
+    def has_idle_worker(self) -> bool:
+        """True when a job would start right away instead of queueing"""
+        with self._lock:
+            return self.in_flight < self.workers
+    
+    def _finished(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+            }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -53,8 +227,14 @@ def decode_token(token: str):
     except JWTError:
         return None
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = credentials.credentials
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)) -> CachedUser:
+    return await user_from_token(credentials.credentials, db)
+
+async def get_current_user_from_query(token: str = Query(...), db: AsyncSession = Depends(get_async_db)) -> CachedUser:
+    """For EventSource connections, which cannot send an Authorization header"""
+    return await user_from_token(token, db)
+
+async def user_from_token(token: str, db: AsyncSession) -> CachedUser:
     payload = decode_token(token)
     if payload is None:
         raise HTTPException(
@@ -69,16 +249,32 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Invalid authentication credentials"
         )
     
-    user = db.query(User).filter(User.username == username).first()
+    user = user_cache.get(username)
     if user is None:
+        db_user = await db.scalar(select(User).where(User.username == username))
+        if db_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found"
+            )
+        user = CachedUser(
+            id=db_user.id,
+            username=db_user.username,
+            email=db_user.email,
+            role=db_user.role,
+            is_active=bool(db_user.is_active),
+        )
+        user_cache.set(user)
+    
+    if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
+            detail="User account is inactive"
         )
     
     return user
 
-def require_admin(current_user: User = Depends(get_current_user)):
+async def require_admin(current_user: CachedUser = Depends(get_current_user)) -> CachedUser:
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,149 @@
+"""
+Sync vs. async database path: requests/sec and latency percentiles under high concurrency
+
+Starts uvicorn in a subprocess serving two otherwise identical endpoints, one
+`def` route on the sync engine (threadpool) and one `async def` route on the
+async engine, then drives each with the same number of concurrent clients.
+
+Usage:
+    python -m benchmarks.bench_async --concurrency 200 --requests 5000
+    python -m benchmarks.bench_async --database-url postgresql://localhost/inventory_bench --db-sleep-ms 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi import FastAPI
+from sqlalchemy import func, select, text
+from database import AsyncSessionLocal, SessionLocal
+from models import Product
+
+DB_SLEEP_MS = int(os.getenv("BENCH_DB_SLEEP_MS", "0"))
+
+bench_app = FastAPI()
+
+
+def _products_query():
+    return select(Product.id, Product.sku, Product.price, Product.quantity).order_by(Product.price).limit(50)
+
+
+def _sleep_statement():
+    # Simulates a slower network round-trip to the database (PostgreSQL only)
+    return text("SELECT pg_sleep(:s)").bindparams(s=DB_SLEEP_MS / 1000)
+
+
+@bench_app.get("/sync/products")
+def sync_products():
+    db = SessionLocal()
+    try:
+        if DB_SLEEP_MS:
+            db.execute(_sleep_statement())
+        return [dict(row._mapping) for row in db.execute(_products_query())]
+    finally:
+        db.close()
+
+
+@bench_app.get("/async/products")
+async def async_products():
+    async with AsyncSessionLocal() as db:
+        if DB_SLEEP_MS:
+            await db.execute(_sleep_statement())
+        return [dict(row._mapping) for row in await db.execute(_products_query())]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def drive(url, concurrency, total):
+    import httpx
+
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await client.get(url)  # warm up pools
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return latencies, errors, wall
+
+
+def seed(products):
+    from database import Base, engine
+    from importer import import_products
+    from benchmarks.bench_import import synthetic_catalog
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.scalar(select(func.count(Product.id))) < products:
+            import_products(db, synthetic_catalog(products, "ASYNC"), "bench", 1000)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db-sleep-ms", type=int, default=0, help="Extra pg_sleep per request (PostgreSQL)")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    env = dict(os.environ)
+    env["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    env["BENCH_DB_SLEEP_MS"] = str(args.db_sleep_ms)
+    os.environ.update(env)
+    subprocess.run([sys.executable, "-c", f"from benchmarks.bench_async import seed; seed({args.products})"],
+                   env=env, check=True)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_async:bench_app",
+         "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        time.sleep(2)
+        for variant in ("sync", "async"):
+            url = f"http://127.0.0.1:{args.port}/{variant}/products"
+            latencies, errors, wall = asyncio.run(drive(url, args.concurrency, args.requests))
+            print(
+                f"{variant:>5}: {len(latencies) / wall:8.0f} req/s  "
+                f"p50={percentile(latencies, 50) * 1000:7.1f}ms  "
+                f"p99={percentile(latencies, 99) * 1000:7.1f}ms  "
+                f"mean={statistics.mean(latencies) * 1000:7.1f}ms  errors={errors}"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Throughput benchmark: bulk import vs. the one-product-at-a-time create path
+
+Usage:
+    python -m benchmarks.bench_import --rows 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Product, InventoryHistory
+from importer import import_products
+
+
+def synthetic_catalog(rows, prefix):
+    return [
+        {
+            "name": f"Product {i}",
+            "sku": f"{prefix}-{i:07d}",
+            "category": f"Category {i % 25}",
+            "price": round(1 + (i % 500) * 0.37, 2),
+            "quantity": i % 200,
+            "supplier": f"Supplier {i % 40}",
+        }
+        for i in range(rows)
+    ]
+
+
+def one_at_a_time(db, records):
+    """Mirror routes.products.create_product: two commits per product"""
+    for record in records:
+        product = Product(**record)
+        db.add(product)
+        db.commit()
+        db.refresh(product)
+        db.add(InventoryHistory(
+            product_id=product.id,
+            action="added",
+            quantity_change=product.quantity,
+            performed_by="bench",
+            notes=f"Product added: {product.name}"
+        ))
+        db.commit()
+
+
+def timed(label, rows, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {rows:>8} rows  {elapsed:8.2f}s  {rows / elapsed:10.0f} rows/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        db = Session()
+        try:
+            slow = timed("one-at-a-time (create)", args.rows,
+                         lambda: one_at_a_time(db, synthetic_catalog(args.rows, "ONE")))
+            records = synthetic_catalog(args.rows, "BULK")
+            fast = timed("bulk import (insert)", args.rows,
+                         lambda: import_products(db, records, "bench", args.chunk_size))
+            timed("bulk import (upsert)", args.rows,
+                  lambda: import_products(db, records, "bench", args.chunk_size))
+        finally:
+            db.close()
+            Base.metadata.drop_all(bind=engine)
+            engine.dispose()
+
+    print(f"speed-up: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
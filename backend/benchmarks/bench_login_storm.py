@@ -0,0 +1,113 @@
+"""
+Product-list latency with and without a concurrent login storm
+
+Starts the real app under uvicorn on a temporary SQLite database, measures
+GET /api/products/ latency on its own, then again while a second set of
+clients hammers POST /api/auth/login. With bcrypt on the bounded hasher
+pool the list latency should stay close to baseline; surplus logins are
+turned away with 503 instead of queueing behind each other.
+
+Usage:
+    python -m benchmarks.bench_login_storm --logins 400 --login-concurrency 100
+    PASSWORD_HASH_WORKERS=2 python -m benchmarks.bench_login_storm
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_async import percentile
+
+
+def seed(products):
+    from database import Base, SessionLocal, engine
+    from importer import import_products
+    from benchmarks.bench_import import synthetic_catalog
+    from main import create_default_admin
+
+    Base.metadata.create_all(bind=engine)
+    create_default_admin()
+    db = SessionLocal()
+    try:
+        import_products(db, synthetic_catalog(products, "STORM"), "bench", 1000)
+    finally:
+        db.close()
+
+
+async def run(base, reads, logins, login_concurrency):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base, timeout=120) as client:
+        token = (await client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async def list_products(count):
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                await client.get("/api/products/", params={"limit": 50}, headers=headers)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        async def storm():
+            statuses = []
+            remaining = iter(range(logins))
+
+            async def worker():
+                for _ in remaining:
+                    response = await client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+                    statuses.append(response.status_code)
+
+            await asyncio.gather(*(worker() for _ in range(login_concurrency)))
+            return statuses
+
+        baseline = await list_products(reads)
+        storm_task = asyncio.ensure_future(storm())
+        await asyncio.sleep(0.2)
+        under_load = await list_products(reads)
+        statuses = await storm_task
+    return baseline, under_load, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--login-concurrency", type=int, default=100)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    subprocess.run([sys.executable, "-c", f"from benchmarks.bench_login_storm import seed; seed({args.products})"],
+                   env=env, check=True)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        time.sleep(2)
+        baseline, under_load, statuses = asyncio.run(
+            run(f"http://127.0.0.1:{args.port}", args.reads, args.logins, args.login_concurrency)
+        )
+        for label, samples in (("baseline", baseline), ("login storm", under_load)):
+            print(
+                f"{label:>11}: p50={percentile(samples, 50) * 1000:7.1f}ms  "
+                f"p99={percentile(samples, 99) * 1000:7.1f}ms"
+            )
+        print(f"logins: {statuses.count(200)} ok, {statuses.count(503)} rejected with 503, "
+              f"{len(statuses) - statuses.count(200) - statuses.count(503)} other")
+    finally:
+        server.terminate()
+        server.wait()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
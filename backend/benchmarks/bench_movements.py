@@ -0,0 +1,100 @@
+"""
+Stock movement report latency: raw history scan vs. daily snapshots
+
+Seeds a year of synthetic inventory history, then times year-long movement
+reports computed from the raw log and again after snapshotting.
+
+Usage:
+    python -m benchmarks.bench_movements --products 1000 --events 2000000
+    python -m benchmarks.bench_movements --database-url postgresql://localhost/inventory_bench
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from movements import movement_report, snapshot_movements
+
+START = date(2023, 1, 1)
+DAYS = 365
+ROUNDS = 5
+
+# (period, group_by, product_id)
+REPORTS = [("month", "category", None), ("week", "product", None), ("day", "product", 42)]
+
+
+def seed(session, products, events):
+    """Generate products and history inside the database so seeding isn't the bottleneck"""
+    session.execute(text("""
+        WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :products)
+        INSERT INTO products (id, name, sku, category, price, quantity, min_stock_level)
+        SELECT n, 'Product ' || n, 'MOV-' || n, 'Category ' || (n % 20), 1.0, 100, 10 FROM seq
+    """), {"products": products})
+    # Spread events evenly over the year; one in three is outbound
+    seconds = DAYS * 86400
+    session.execute(text(f"""
+        WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :events)
+        INSERT INTO inventory_history (product_id, action, quantity_change, performed_by, created_at)
+        SELECT 1 + (n * 7919) % :products, 'stock_change',
+               CASE WHEN n % 3 = 0 THEN -(1 + n % 5) ELSE 1 + n % 9 END, 'bench',
+               datetime(:start, '+' || ((n * 104729) % {seconds}) || ' seconds')
+        FROM seq
+    """), {"events": events, "products": products, "start": START.isoformat()})
+    session.commit()
+
+
+def time_report(session, period, group_by, product_id):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        rows = movement_report(session, period, group_by, START, START + timedelta(days=DAYS), product_id)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file (seeding uses SQLite SQL)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        try:
+            start = time.perf_counter()
+            seed(db, args.products, args.events)
+            print(f"seeded {args.events} history rows for {args.products} products in {time.perf_counter() - start:.1f}s")
+
+            raw = {spec: time_report(db, *spec) for spec in REPORTS}
+            start = time.perf_counter()
+            written = snapshot_movements(db, through=START + timedelta(days=DAYS))
+            print(f"snapshotted {written} product-days in {time.perf_counter() - start:.1f}s")
+
+            print(f"{'year-long report':<28} {'raw log':>10} {'snapshots':>10} {'buckets':>8}")
+            for spec in REPORTS:
+                raw_time, raw_rows = raw[spec]
+                snap_time, snap_rows = time_report(db, *spec)
+                assert snap_rows == raw_rows
+                period, group_by, product_id = spec
+                label = f"{period} by {group_by}" + (f" (#{product_id})" if product_id else "")
+                print(f"{label:<28} {raw_time * 1000:8.1f}ms {snap_time * 1000:8.1f}ms {len(snap_rows):>8}")
+        finally:
+            db.close()
+            Base.metadata.drop_all(bind=engine)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Load test: request latency and pool wait times when clients outnumber connections
+
+Usage:
+    python -m benchmarks.bench_pool --clients 32 --requests 50 --pool-size 4 --max-overflow 2
+    python -m benchmarks.bench_pool --database-url postgresql://localhost/inventory_bench
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per client")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--max-overflow", type=int, default=2)
+    parser.add_argument("--pool-timeout", type=float, default=30)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    os.environ["DB_POOL_SIZE"] = str(args.pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(args.max_overflow)
+    os.environ["DB_POOL_TIMEOUT"] = str(args.pool_timeout)
+
+    # Imported late so the pool picks up the settings above
+    from fastapi.testclient import TestClient
+    from database import SessionLocal, engine, pool_status
+    from importer import import_products
+    from main import app
+    from benchmarks.bench_import import synthetic_catalog
+
+    db = SessionLocal()
+    import_products(db, synthetic_catalog(args.products, "POOL"), "bench", 1000)
+    db.close()
+
+    token = TestClient(app).post(
+        "/api/auth/login", json={"username": "admin", "password": "admin123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client_loop():
+        client = TestClient(app)
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get("/api/products/", params={"limit": 100, "sort": "-price"}, headers=headers)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_loop) for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    print(f"clients={args.clients} pool_size={args.pool_size} max_overflow={args.max_overflow}")
+    print(f"requests: {len(latencies)}  errors: {len(errors)}  throughput: {len(latencies) / wall:.0f} req/s")
+    print("latency ms: p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f} mean={:.1f}".format(
+        percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+        percentile(latencies, 99) * 1000, max(latencies) * 1000, statistics.mean(latencies) * 1000,
+    ))
+    print(f"pool: {pool_status(engine)}")
+
+    engine.dispose()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
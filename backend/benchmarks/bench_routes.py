@@ -0,0 +1,427 @@
+"""
+Route benchmark suite: latency percentiles and throughput for every products, reports and auth route
+
+Seeds synthetic catalogs (10k, 100k and 1M products by default, with
+HISTORY_PER_PRODUCT history rows each spread over the last 90 days), starts
+the API under uvicorn against each one and drives every route with
+concurrent clients. Results are written as JSON; pass a previous results
+file with --compare to fail (exit status 1) on routes whose p50 or p99 got
+slower than the tolerance allows.
+
+Latencies depend on the machine, so no baseline is committed: record one
+with --output on the revision to compare against (usually main), on the
+machine that will run the comparison.
+
+Seeded SQLite files are kept in --data-dir (created if missing) and reused
+on the next run; each run works on a fresh copy, so writes never leak into
+the next run. A PostgreSQL --database-url is reseeded for every size.
+
+Usage:
+    python -m benchmarks.bench_routes --sizes 10000 --output baseline.json
+    python -m benchmarks.bench_routes --sizes 10000 --compare baseline.json
+    python -m benchmarks.bench_routes --database-url postgresql://localhost/inventory_bench --routes "GET /api/products*"
+"""
+import argparse
+import asyncio
+import csv
+import fnmatch
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, NamedTuple, Optional
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from migrations import pending_migrations, run_migrations, schema_migrations
+from models import InventoryHistory, Product, User
+
+HISTORY_PER_PRODUCT = 5
+HISTORY_DAYS = 90
+CATEGORIES = 25
+SEED_BATCH = 20000
+ADMIN = {"username": "admin", "password": "admin123"}
+CUSTOMER = {"username": "bench_customer", "password": "bench-pass-123"}
+# Regressions smaller than this are noise, whatever the ratio
+MIN_REGRESSION_MS = 2.0
+
+
+class Scenario(NamedTuple):
+    """One benchmarked route; request(i, ctx) returns (method, url, httpx kwargs)"""
+    name: str
+    request: Callable[[int, dict], tuple]
+    max_requests: Optional[int] = None
+    token: str = "admin"
+    on_response: Optional[Callable[[object, dict], None]] = None
+
+
+def _sku(n: int) -> str:
+    return f"BENCH-{n:07d}"
+
+
+def _catalog_csv(rows: List[dict]) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+def _import_rows(i: int, ctx: dict) -> List[dict]:
+    """100 existing SKUs with new prices: the upsert path of a supplier feed"""
+    start = (i * 100) % max(1, ctx["products"] - 100)
+    return [
+        {"sku": _sku(n + 1), "name": f"Product {n + 1}", "price": round(2 + (n + i) % 300 * 0.41, 2)}
+        for n in range(start, start + 100)
+    ]
+
+
+def _remember_created(response, ctx: dict):
+    if response.status_code == 200:
+        ctx["created"].append(response.json()["id"])
+
+
+def _delete_created(i: int, ctx: dict):
+    product_id = ctx["created"][i] if i < len(ctx["created"]) else 0
+    return "DELETE", f"/api/products/{product_id}", {}
+
+
+SCENARIOS = [
+    # routes/auth.py; bcrypt keeps login and register deliberately slow
+    Scenario("POST /api/auth/login", lambda i, ctx: ("POST", "/api/auth/login", {"json": CUSTOMER}),
+             max_requests=50, token=None),
+    Scenario("POST /api/auth/register", lambda i, ctx: ("POST", "/api/auth/register", {"json": {
+        "username": f"bench_{ctx['run']}_{i}", "email": f"bench_{ctx['run']}_{i}@example.com", "password": "secret-123",
+    }}), max_requests=50, token=None),
+    Scenario("GET /api/auth/me", lambda i, ctx: ("GET", "/api/auth/me", {}), token="customer"),
+    Scenario("GET /api/auth/cache-stats", lambda i, ctx: ("GET", "/api/auth/cache-stats", {})),
+    # routes/products.py reads
+    Scenario("GET /api/products", lambda i, ctx: ("GET", "/api/products/", {}), token="customer"),
+    Scenario("GET /api/products?category", lambda i, ctx: (
+        "GET", "/api/products/", {"params": {"category": f"Category {i % CATEGORIES}", "sort": "-price"}})),
+    Scenario("GET /api/products?search", lambda i, ctx: (
+        "GET", "/api/products/", {"params": {"search": f"product {ctx['rng'].randint(1, ctx['products'])}"}})),
+    Scenario("GET /api/products?include_total", lambda i, ctx: (
+        "GET", "/api/products/", {"params": {"min_price": 50, "include_total": "true"}}), max_requests=50),
+    Scenario("GET /api/products/categories", lambda i, ctx: ("GET", "/api/products/categories", {})),
+    Scenario("GET /api/products/changes", lambda i, ctx: ("GET", "/api/products/changes", {"params": {"since": 0}})),
+    Scenario("GET /api/products/{id}", lambda i, ctx: (
+        "GET", f"/api/products/{ctx['rng'].randint(1, ctx['products'])}", {})),
+    Scenario("GET /api/products/{id}/history", lambda i, ctx: (
+        "GET", f"/api/products/{ctx['rng'].randint(1, ctx['products'])}/history", {})),
+    Scenario("GET /api/products/{id}/history/daily", lambda i, ctx: (
+        "GET", f"/api/products/{ctx['rng'].randint(1, ctx['products'])}/history/daily", {})),
+    # routes/reports.py
+    Scenario("GET /api/reports/stats", lambda i, ctx: ("GET", "/api/reports/stats", {})),
+    Scenario("GET /api/reports/category-stats", lambda i, ctx: ("GET", "/api/reports/category-stats", {})),
+    Scenario("GET /api/reports/recent-activity", lambda i, ctx: ("GET", "/api/reports/recent-activity", {})),
+    Scenario("GET /api/reports/stock-movements", lambda i, ctx: (
+        "GET", "/api/reports/stock-movements", {"params": {"period": "week", "group_by": "category"}}), max_requests=50),
+    Scenario("GET /api/reports/low-stock", lambda i, ctx: ("GET", "/api/reports/low-stock", {}), max_requests=50),
+    # Writes last, so they don't change what the reads above see
+    Scenario("POST /api/products", lambda i, ctx: ("POST", "/api/products/", {"json": {
+        "name": f"New {ctx['run']} {i}", "sku": f"NEW-{ctx['run']}-{i}", "price": 9.99, "quantity": 20,
+        "category": f"Category {i % CATEGORIES}",
+    }}), on_response=_remember_created),
+    Scenario("PUT /api/products/{id}", lambda i, ctx: (
+        "PUT", f"/api/products/{ctx['rng'].randint(1, ctx['products'])}", {"json": {"price": round(1 + i % 400 * 0.5, 2)}})),
+    Scenario("POST /api/products/stock-movements", lambda i, ctx: ("POST", "/api/products/stock-movements", {"json": {
+        "movements": [{"sku": _sku(ctx["rng"].randint(1, ctx["products"])), "delta": 1 + i % 3}],
+    }})),
+    Scenario("POST /api/products/import", lambda i, ctx: (
+        "POST", "/api/products/import", {"json": _import_rows(i, ctx)}), max_requests=50),
+    Scenario("POST /api/products/import/csv", lambda i, ctx: (
+        "POST", "/api/products/import/csv",
+        {"files": {"file": ("catalog.csv", _catalog_csv(_import_rows(i, ctx)), "text/csv")}}), max_requests=50),
+    Scenario("DELETE /api/products/{id}", _delete_created),
+    Scenario("POST /api/reports/rollups/rebuild", lambda i, ctx: ("POST", "/api/reports/rollups/rebuild", {}),
+             max_requests=10),
+]
+
+
+def seed(url: str, products: int):
+    """Create the schema and a synthetic catalog unless the database already holds one"""
+    from auth import get_password_hash
+    from movements import snapshot_movements
+    from rollup import rebuild_rollups
+    import search  # noqa: F401 - makes drop_all drop the full-text index on SQLite
+
+    engine = create_engine(url)
+    db = sessionmaker(bind=engine)()
+    try:
+        if not pending_migrations(engine) and db.scalar(select(func.count(Product.id))) == products:
+            return False
+        db.close()
+        # Build the schema the way a deployment does, so the API starts on it
+        Base.metadata.drop_all(bind=engine)
+        schema_migrations.drop(bind=engine, checkfirst=True)
+        run_migrations(engine, log=lambda message: None)
+        db = sessionmaker(bind=engine)()
+
+        now = datetime.utcnow()
+        for start in range(0, products, SEED_BATCH):
+            db.execute(insert(Product), [
+                {
+                    "name": f"Product {n}",
+                    "sku": _sku(n),
+                    "description": f"Synthetic product {n} for benchmarks",
+                    "category": f"Category {n % CATEGORIES}",
+                    "price": round(1 + (n * 7919) % 500 * 0.37, 2),
+                    # About one product in twenty is at or below its minimum
+                    "quantity": (n * 104729) % 400 if n % 20 else n % 10,
+                    "min_stock_level": 10,
+                    "supplier": f"Supplier {n % 40}",
+                    "created_at": now - timedelta(days=HISTORY_DAYS),
+                    "updated_at": now - timedelta(days=HISTORY_DAYS),
+                }
+                for n in range(start + 1, min(start + SEED_BATCH, products) + 1)
+            ])
+            db.commit()
+
+        events = products * HISTORY_PER_PRODUCT
+        seconds = HISTORY_DAYS * 86400
+        for start in range(0, events, SEED_BATCH):
+            db.execute(insert(InventoryHistory), [
+                {
+                    "product_id": 1 + (n * 7919) % products,
+                    "action": "stock_change",
+                    "quantity_change": -(1 + n % 5) if n % 3 == 0 else 1 + n % 9,
+                    "performed_by": "bench",
+                    "created_at": now - timedelta(seconds=(n * 104729) % seconds),
+                }
+                for n in range(start, min(start + SEED_BATCH, events))
+            ])
+            db.commit()
+
+        db.add_all([
+            User(username=ADMIN["username"], email="admin@wholesale.com",
+                 password=get_password_hash(ADMIN["password"]), role="admin"),
+            User(username=CUSTOMER["username"], email="customer@example.com",
+                 password=get_password_hash(CUSTOMER["password"]), role="customer"),
+        ])
+        rebuild_rollups(db)
+        db.commit()
+        snapshot_movements(db)
+        return True
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def drive(client, scenario: Scenario, ctx: dict, concurrency: int, total: int) -> dict:
+    import httpx
+
+    token = ctx["tokens"].get(scenario.token)
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in remaining:
+            method, url, kwargs = scenario.request(i, ctx)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, headers=headers, **kwargs)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+                elif scenario.on_response:
+                    scenario.on_response(response, ctx)
+            except httpx.HTTPError:
+                latencies.append(time.perf_counter() - start)
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+async def run_scenarios(base_url: str, products: int, scenarios: List[Scenario], concurrency: int, requests: int) -> dict:
+    import httpx
+
+    ctx = {"products": products, "run": int(time.time()), "rng": random.Random(products), "created": [], "tokens": {}}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        for name, credentials in (("admin", ADMIN), ("customer", CUSTOMER)):
+            response = await client.post("/api/auth/login", json=credentials)
+            response.raise_for_status()
+            ctx["tokens"][name] = response.json()["access_token"]
+
+        for scenario in scenarios:
+            total = min(requests, scenario.max_requests or requests)
+            if scenario.name.startswith("DELETE"):
+                total = min(total, len(ctx["created"]))
+            if total == 0:
+                continue
+            results[scenario.name] = stats = await drive(client, scenario, ctx, min(concurrency, total), total)
+            print(
+                f"  {scenario.name:<40} {stats['throughput_rps']:8.1f} req/s  "
+                f"p50={stats['p50_ms']:8.1f}ms  p99={stats['p99_ms']:8.1f}ms  errors={stats['errors']}"
+            )
+    return results
+
+
+def wait_for_server(base_url: str, server, timeout: float = 60):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            httpx.get(base_url + "/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+def benchmark_size(products: int, args, scenarios: List[Scenario], data_dir: Optional[str]) -> dict:
+    url = args.database_url
+    seed_path = None if url else os.path.join(data_dir, f"seed-{products}.db")
+    start = time.perf_counter()
+    seeded = seed(url or f"sqlite:///{seed_path}", products)
+    seed_seconds = time.perf_counter() - start
+    print(f"{products} products: {'seeded' if seeded else 'reused'} in {seed_seconds:.1f}s")
+    if seed_path:
+        run_path = os.path.join(data_dir, f"bench-{products}.db")
+        shutil.copyfile(seed_path, run_path)
+        url = f"sqlite:///{run_path}"
+
+    env = dict(os.environ, DATABASE_URL=url, OUTBOX_WORKER="false")
+    if not args.report_cache:
+        env["REPORT_CACHE_BACKEND"] = "none"
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        wait_for_server(base_url, server)
+        routes = asyncio.run(run_scenarios(base_url, products, scenarios, args.concurrency, args.requests))
+    finally:
+        server.terminate()
+        server.wait()
+    return {"seed_seconds": round(seed_seconds, 1) if seeded else None, "routes": routes}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Routes whose p50 or p99 grew by more than `tolerance` (and MIN_REGRESSION_MS)"""
+    regressions = []
+    for size, current in results["sizes"].items():
+        previous = baseline.get("sizes", {}).get(size)
+        if previous is None:
+            continue
+        for route, stats in current["routes"].items():
+            before = previous["routes"].get(route)
+            if before is None:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                limit = max(before[metric] * (1 + tolerance), before[metric] + MIN_REGRESSION_MS)
+                if stats[metric] > limit:
+                    regressions.append(
+                        f"{size} products, {route}: {metric} {before[metric]:.1f} -> {stats[metric]:.1f}"
+                    )
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated catalog sizes")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route (some routes cap lower)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--routes", help="Only run routes matching this pattern, e.g. 'GET /api/reports/*'")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--database-url", help="Defaults to one SQLite file per size in --data-dir")
+    parser.add_argument("--data-dir", help="Where seeded SQLite files are kept (default: a temporary directory)")
+    parser.add_argument("--report-cache", action="store_true", help="Leave the report cache on (default: off)")
+    parser.add_argument("--output", default="bench_routes.json", help="Where to write the results")
+    parser.add_argument("--compare", help="Results file to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    if args.compare and not os.path.exists(args.compare):
+        # Baselines are machine-specific, so none is committed; record one first
+        parser.error(f"no baseline at {args.compare}; record one with `--output {args.compare}` "
+                     "on the revision to compare against")
+    scenarios = [s for s in SCENARIOS if not args.routes or fnmatch.fnmatch(s.name, args.routes)]
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+    tmp = None
+    if not args.database_url and not args.data_dir:
+        tmp = tempfile.TemporaryDirectory()
+    data_dir = args.data_dir or (tmp.name if tmp else None)
+
+    results = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "database": (args.database_url or "sqlite").split(":", 1)[0],
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "report_cache": args.report_cache,
+        },
+        "sizes": {},
+    }
+    try:
+        for products in (int(size) for size in args.sizes.split(",")):
+            results["sizes"][str(products)] = benchmark_size(products, args, scenarios, data_dir)
+    finally:
+        if tmp:
+            tmp.cleanup()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
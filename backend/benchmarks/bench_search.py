@@ -0,0 +1,120 @@
+"""
+Product search latency: indexed search vs. the old unindexed ILIKE scan
+
+Seeds a synthetic catalog inside the database, then times the first page
+(LIMIT 50) of several searches and the total match count both ways.
+
+Usage:
+    python -m benchmarks.bench_search --rows 1000000
+    python -m benchmarks.bench_search --database-url postgresql://localhost/inventory_bench
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, or_, select, text
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Product
+from search import apply_search
+
+WORDS = ["Widget", "Gadget", "Lamp", "Chair", "Cable", "Battery", "Adapter", "Monitor",
+         "Keyboard", "Speaker", "Bracket", "Filter", "Sensor", "Valve", "Hinge", "Router"]
+ADJECTIVES = ["Compact", "Heavy Duty", "Wireless", "Premium", "Classic", "Portable", "Industrial", "Mini"]
+
+# A rare SKU prefix, a common word, a word inside a description and a multi-word query
+SEARCHES = ["SKU-0004242", "lamp", "ergonomic", "wireless bracket", "duty speak"]
+
+ROUNDS = 5
+
+
+def seed(session, rows):
+    """Generate products inside the database so seeding isn't the bottleneck"""
+    words = " ".join(f"WHEN {i} THEN '{w}'" for i, w in enumerate(WORDS))
+    adjectives = " ".join(f"WHEN {i} THEN '{a}'" for i, a in enumerate(ADJECTIVES))
+    session.execute(text(f"""
+        WITH RECURSIVE seq(n) AS (
+            SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < :rows
+        )
+        INSERT INTO products (name, sku, description, category, price, quantity, min_stock_level, supplier)
+        SELECT
+            (CASE n % {len(ADJECTIVES)} {adjectives} END) || ' ' || (CASE n % {len(WORDS)} {words} END),
+            'SKU-' || substr('0000000' || n, -7, 7),
+            CASE WHEN n % 97 = 0 THEN 'Ergonomic design, ships flat' ELSE 'Standard stock item ' || (n % 1000) END,
+            'Category ' || (n % 25),
+            1 + (n % 500) * 0.37,
+            n % 200,
+            10,
+            'Supplier ' || (n % 40)
+        FROM seq
+    """), {"rows": rows})
+    session.commit()
+
+
+def legacy_search(term):
+    return select(Product).where(or_(
+        Product.name.ilike(f"%{term}%"),
+        Product.sku.ilike(f"%{term}%")
+    ))
+
+
+def indexed_search(dialect, term):
+    return apply_search(select(Product), dialect, term)
+
+
+def count(stmt):
+    # The Products page asks for include_total, which counts every match
+    return select(func.count()).select_from(stmt.subquery())
+
+
+def time_query(session, stmt):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        rows = session.execute(stmt).all()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        db = Session()
+        try:
+            start = time.perf_counter()
+            seed(db, args.rows)
+            print(f"seeded {args.rows} products (index maintained by triggers) in {time.perf_counter() - start:.1f}s")
+            dialect = engine.dialect.name
+            print(f"{'search':<18} {'page: ILIKE':>12} {'ranked':>10} {'count: ILIKE':>13} {'indexed':>10} {'matches':>8}")
+            for term in SEARCHES:
+                legacy = legacy_search(term)
+                indexed, rank = indexed_search(dialect, term)
+                legacy_page, _ = time_query(db, legacy.order_by(Product.id).limit(50))
+                ranked_page, _ = time_query(db, indexed.add_columns(rank).order_by(rank, Product.id).limit(50))
+                legacy_count, _ = time_query(db, count(legacy))
+                indexed_count, _ = time_query(db, count(indexed))
+                matches = db.scalar(count(indexed))
+                print(f"{term:<18} {legacy_page * 1000:10.1f}ms {ranked_page * 1000:8.1f}ms "
+                      f"{legacy_count * 1000:11.1f}ms {indexed_count * 1000:8.1f}ms {matches:>8}")
+        finally:
+            db.close()
+            Base.metadata.drop_all(bind=engine)
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+CPU time and bytes on the wire for a 10k-product list response
+
+Compares the old path (ORM instances -> response_model validation ->
+jsonable_encoder -> stdlib json) with the fast path (column tuples ->
+orjson), and the payload size uncompressed, gzipped and brotli-compressed.
+
+Usage:
+    python -m benchmarks.bench_serialization --products 10000 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Product
+from exports import PRODUCT_COLUMNS
+from importer import import_products
+from serialization import encode_rows
+from compression import BrotliEncoder, GzipEncoder, brotli
+from routes.products import ProductResponse
+from benchmarks.bench_import import synthetic_catalog
+
+
+def legacy_body(db) -> bytes:
+    products = db.execute(select(Product).order_by(Product.id)).scalars().all()
+    field = create_response_field(name="products", type_=List[ProductResponse])
+    content = asyncio.run(serialize_response(field=field, response_content=products))
+    db.expunge_all()
+    return JSONResponse(content).body
+
+
+def fast_body(db) -> bytes:
+    rows = db.execute(select(*PRODUCT_COLUMNS).order_by(Product.id)).all()
+    return encode_rows(PRODUCT_COLUMNS, rows)
+
+
+def cpu_per_call(fn, rounds):
+    fn()  # warm up
+    start = time.process_time()
+    for _ in range(rounds):
+        body = fn()
+    return (time.process_time() - start) / rounds, body
+
+
+def compressed_size(encoder_class, body):
+    encoder = encoder_class()
+    start = time.process_time()
+    size = len(encoder.compress(body) + encoder.finish())
+    return size, time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    records = synthetic_catalog(args.products, "SER")
+    for record in records:
+        record["description"] = f"Synthetic description for {record['sku']}"
+    import_products(db, records, "bench", 5000)
+
+    legacy_cpu, legacy = cpu_per_call(lambda: legacy_body(db), args.rounds)
+    fast_cpu, fast = cpu_per_call(lambda: fast_body(db), args.rounds)
+    print(f"{args.products} products, CPU per response (query + serialization):")
+    print(f"  ORM + response_model + json: {legacy_cpu * 1000:8.1f}ms")
+    print(f"  row tuples + orjson:         {fast_cpu * 1000:8.1f}ms  ({legacy_cpu / fast_cpu:.1f}x less CPU)")
+
+    print("bytes on the wire:")
+    print(f"  stdlib json     {len(legacy):>10,}")
+    print(f"  orjson          {len(fast):>10,}")
+    encoders = [GzipEncoder] + ([BrotliEncoder] if brotli is not None else [])
+    for encoder_class in encoders:
+        size, cpu = compressed_size(encoder_class, fast)
+        print(f"  orjson + {encoder_class.name:<5}  {size:>10,}  ({len(fast) / size:.1f}x smaller, {cpu * 1000:.1f}ms to compress)")
+    if brotli is None:
+        print("  (install brotli to include br)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Import time and cold start of the API
+
+Import time is measured by importing `main` in fresh interpreters, net of
+interpreter startup. The slowest top-level imports come from
+`python -X importtime`. The import runs against a SQLite path that doesn't
+exist yet, so the check also shows whether the import touched the database.
+
+Cold start is the time from spawning uvicorn until the first response. It
+is measured on a migrated database. The first boot also creates the
+default admin (one bcrypt hash); later boots only check the schema.
+
+Usage:
+    python -m benchmarks.bench_startup --rounds 5
+    python -m benchmarks.bench_startup --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code: str, env: dict, *flags) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, "-c", code], env=env, cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+
+
+def timed_runs(code: str, env: dict, rounds: int) -> list:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run_python(code, env)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def slowest_imports(env: dict, top: int) -> list:
+    """(module, cumulative ms) for the slowest imports made directly by main"""
+    stderr = run_python("import main", env, "-X", "importtime").stderr
+    # "import time: self | cumulative | name", children listed before their
+    # parent and indented two spaces deeper
+    rows = []
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2]
+            rows.append((len(name) - len(name.lstrip()), name.strip(), int(parts[1]) / 1000))
+    main_index = next(i for i, row in enumerate(rows) if row[1] == "main")
+    depth = rows[main_index][0]
+    modules = []
+    for indent, name, ms in reversed(rows[:main_index]):
+        if indent <= depth:
+            break
+        if indent == depth + 2:
+            modules.append((name, ms))
+    return sorted(modules, key=lambda item: item[1], reverse=True)[:top]
+
+
+def cold_start(env: dict, port: int) -> float:
+    import httpx
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=ROOT,
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.db")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", OUTBOX_WORKER="false")
+
+        baseline = statistics.median(timed_runs("pass", env, args.rounds))
+        imports = [s - baseline for s in timed_runs("import main", env, args.rounds)]
+        touched = os.path.exists(db_path)
+        print(f"import main: median {statistics.median(imports) * 1000:.0f}ms, "
+              f"max {max(imports) * 1000:.0f}ms (net of {baseline * 1000:.0f}ms interpreter startup)")
+        print(f"database touched on import: {'yes' if touched else 'no'}")
+        modules = slowest_imports(env, args.top)
+        for name, ms in modules:
+            print(f"  {ms:8.1f}ms  {name}")
+
+        run_python("from migrate_db import migrate; migrate([])", env)
+        first_boot = cold_start(env, args.port)
+        boots = [cold_start(env, args.port) for _ in range(args.rounds)]
+        print(f"cold start: first boot {first_boot * 1000:.0f}ms, "
+              f"then median {statistics.median(boots) * 1000:.0f}ms, max {max(boots) * 1000:.0f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "import_ms": round(statistics.median(imports) * 1000, 1),
+                "database_touched_on_import": touched,
+                "slowest_imports_ms": {name: round(ms, 1) for name, ms in modules},
+                "first_boot_ms": round(first_boot * 1000, 1),
+                "cold_start_ms": round(statistics.median(boots) * 1000, 1),
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Side effects shared by every product write
+
+Anything that writes products (the API routes, bulk import, stock movements)
+calls record_product_changes() inside its transaction, so everything derived
+from the catalog commits or rolls back together with the write itself.
+"""
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from models import CatalogVersion, Product, ProductTombstone
+from outbox import record_threshold_crossings
+from live_feed import capture_product_changes
+from report_cache import report_cache
+from rollup import ProductState, apply_product_changes
+
+CATALOG_VERSION_ID = 1
+
+
+def bump_catalog_version(db: Session) -> int:
+    """
+    Increment the catalog version in the caller's transaction and return it.
+
+    The counter row stays locked until the caller commits, which is what
+    keeps the version from becoming visible before the data it describes;
+    call this as late in the transaction as possible.
+    """
+    now = datetime.utcnow()
+    version = db.execute(
+        update(CatalogVersion)
+        .where(CatalogVersion.id == CATALOG_VERSION_ID)
+        .values(version=CatalogVersion.version + 1, updated_at=now)
+        .returning(CatalogVersion.version)
+    ).scalar()
+    if version is None:
+        version = 1
+        db.execute(insert(CatalogVersion).values(id=CATALOG_VERSION_ID, version=version, updated_at=now))
+    db.info["catalog_changed"] = True
+    return version
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_report_cache(session):
+    # Older entries are already unreachable under the new version; this only frees them
+    if session.info.pop("catalog_changed", False):
+        report_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_change(session):
+    session.info.pop("catalog_changed", None)
+
+
+def read_catalog_version(db: Session) -> Tuple[int, Optional[datetime]]:
+    """(version, last change time); (0, None) before the first write"""
+    row = db.execute(
+        select(CatalogVersion.version, CatalogVersion.updated_at)
+        .where(CatalogVersion.id == CATALOG_VERSION_ID)
+    ).first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+def stamp_row_versions(db: Session, changes: list, version: int):
+    """Mark written rows with `version` and leave tombstones for deleted ones (delta sync)"""
+    ids = sorted({after.product_id for _, after in changes if after is not None and after.product_id is not None})
+    if ids:
+        db.execute(
+            update(Product)
+            .where(Product.id.in_(ids))
+            .values(row_version=version)
+            .execution_options(synchronize_session=False)
+        )
+    now = datetime.utcnow()
+    tombstones = [
+        {"product_id": before.product_id, "sku": before.sku, "row_version": version, "deleted_at": now}
+        for before, after in changes
+        if after is None and before is not None and before.product_id is not None
+    ]
+    if tombstones:
+        db.execute(insert(ProductTombstone), tombstones)
+
+
+def record_product_changes(db: Session, changes: Iterable[Tuple[Optional[ProductState], Optional[ProductState]]]) -> int:
+    """
+    Apply the side effects of product writes: fold the (before, after)
+    states into the category rollups, bump the catalog version, queue
+    low-stock alerts for threshold crossings and capture the changed rows
+    for the live feed.
+    """
+    changes = list(changes)
+    apply_product_changes(db, changes)
+    version = bump_catalog_version(db)
+    stamp_row_versions(db, changes, version)
+    record_threshold_crossings(db, changes, version)
+    capture_product_changes(db, changes, version)
+    return version
@@ -0,0 +1,71 @@
+"""
+Conditional GET (ETag / Last-Modified) driven by the catalog version
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Optional
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from changes import read_catalog_version
+from database import get_async_read_db
+
+
+def make_etag(version: int, request: Request, extra: str = "") -> str:
+    # The same version yields different representations for different queries
+    digest = hashlib.sha1(f"{request.url.path}?{request.url.query}|{extra}".encode("utf-8")).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [c.strip() for c in header.split(",")]
+    # Weak comparison: W/"x" and "x" name the same representation
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in candidates or any((c[2:] if c.startswith("W/") else c) == bare for c in candidates)
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def catalog_conditional(extra: Optional[Callable[[], str]] = None):
+    """
+    Dependency factory for read routes whose output only changes when the
+    catalog does. It sets ETag / Last-Modified on the response, or answers
+    304 straight away, before the route body runs its query.
+
+    `extra` contributes anything else the output depends on (e.g. the clock).
+    """
+    async def dependency(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)):
+        version, updated_at = await db.run_sync(read_catalog_version)
+        etag = make_etag(version, request, extra() if extra else "")
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        last_modified = updated_at.replace(tzinfo=timezone.utc) if updated_at else None
+        if last_modified:
+            headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        elif last_modified and if_modified_since and extra is None:
+            not_modified = _not_modified_since(if_modified_since, last_modified)
+        else:
+            not_modified = False
+        if not_modified:
+            raise HTTPException(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        return version
+
+    return dependency
+
+
+# For routes whose output depends on nothing but the catalog and the request
+catalog_etag = catalog_conditional()
@@ -1,15 +1,149 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from slow_queries import install_slow_query_log
+from read_replica import REPLICA_CONNECT_TIMEOUT, ReplicaRouter, read_session_dependency
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional read replica for GET routes in routes/products.py and routes/reports.py
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
 
-engine = create_engine(DATABASE_URL)
+# Connection pool settings; defaults suit a small managed Postgres instance
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+class PoolTimingMixin:
+    """Records how long callers wait to get a connection from a queue pool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+class TimedQueuePool(PoolTimingMixin, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(PoolTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+def async_database_url(url: str):
+    """Swap the sync driver for its asyncio counterpart (asyncpg / aiosqlite)"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg")
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite")
+    return parsed
+
+def engine_options(url, is_async: bool = False) -> dict:
+    """Pool and timeout arguments for create_engine, based on the backend"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite is tied to a single connection; leave SQLAlchemy's default pool
+        return {}
+
+    options = {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if parsed.get_backend_name() == "postgresql" and DB_STATEMENT_TIMEOUT_MS > 0:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+def pool_status(engine) -> dict:
+    """Point-in-time pool gauges plus cumulative wait statistics"""
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+        })
+    if isinstance(pool, PoolTimingMixin):
+        with pool._stats_lock:
+            status.update({
+                "checkouts": pool.checkouts,
+                "timeouts": pool.timeouts,
+                "total_wait_seconds": pool.total_wait,
+                "avg_wait_seconds": pool.total_wait / pool.checkouts if pool.checkouts else 0.0,
+                "max_wait_seconds": pool.max_wait,
+            })
+    return status
+
+# The sync engine serves CLI scripts and migrations; API routes use the async engine
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# Reads fall back to the primary while the replica is down or the client just wrote
+replica_async_engine = None
+ReplicaAsyncSessionLocal = None
+if DATABASE_REPLICA_URL:
+    REPLICA_ASYNC_URL = async_database_url(DATABASE_REPLICA_URL)
+    replica_options = engine_options(REPLICA_ASYNC_URL, is_async=True)
+    if REPLICA_ASYNC_URL.get_backend_name() == "postgresql":
+        replica_options.setdefault("connect_args", {})["timeout"] = REPLICA_CONNECT_TIMEOUT
+    replica_async_engine = create_async_engine(REPLICA_ASYNC_URL, **replica_options)
+    ReplicaAsyncSessionLocal = async_sessionmaker(
+        replica_async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+replica_router = ReplicaRouter(ReplicaAsyncSessionLocal)
+
+# Statements slower than SLOW_QUERY_MS are logged and aggregated (see slow_queries.py)
+install_slow_query_log(engine)
+install_slow_query_log(async_engine.sync_engine)
+if replica_async_engine is not None:
+    install_slow_query_log(replica_async_engine.sync_engine)
+
 Base = declarative_base()
 
 def get_db():
@@ -18,3 +152,10 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Read-only routes: a replica session when one is configured and usable
+get_async_read_db = read_session_dependency(AsyncSessionLocal, replica_router)
@@ -0,0 +1,32 @@
+"""
+Export products or inventory history to CSV / NDJSON without buffering
+
+Usage:
+    python export_data.py products --format csv --output products.csv
+    python export_data.py history --format ndjson --product-id 42
+"""
+import argparse
+import sys
+from database import SessionLocal
+from exports import EXPORT_FORMATS, export
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a catalog or history export")
+    parser.add_argument("dataset", choices=["products", "history"])
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--output", help="File to write (defaults to stdout)")
+    parser.add_argument("--product-id", type=int, help="Only export history for this product")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for chunk in export(db, args.dataset, args.format, args.product_id):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        db.close()
+
+if __name__ == "__main__":
+    main()
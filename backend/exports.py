@@ -0,0 +1,102 @@
+"""
+Streaming CSV / NDJSON export of products and inventory history
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import Product, InventoryHistory
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+PRODUCT_COLUMNS = [
+    Product.id, Product.name, Product.sku, Product.description, Product.category,
+    Product.price, Product.quantity, Product.min_stock_level, Product.supplier,
+    Product.created_at, Product.updated_at,
+]
+
+HISTORY_COLUMNS = [
+    InventoryHistory.id, InventoryHistory.product_id, InventoryHistory.action,
+    InventoryHistory.quantity_change, InventoryHistory.performed_by,
+    InventoryHistory.notes, InventoryHistory.created_at,
+]
+
+# Rows fetched per round-trip from the server-side cursor; each batch is
+# encoded and flushed to the client as one chunk
+BATCH_SIZE = 5000
+
+
+def export_statement(dataset: str, product_id: Optional[int] = None):
+    """The ordered select() behind an export, plus the columns it returns"""
+    if dataset == "products":
+        columns, where = PRODUCT_COLUMNS, None
+    elif dataset == "history":
+        columns = HISTORY_COLUMNS
+        where = InventoryHistory.product_id == product_id if product_id is not None else None
+    else:
+        raise ValueError(f"Unknown dataset: {dataset}")
+
+    stmt = select(*columns).order_by(columns[0])
+    if where is not None:
+        stmt = stmt.where(where)
+    # yield_per turns on stream_results, so PostgreSQL keeps the result on the
+    # server and only one batch of rows is held in memory at a time
+    return stmt.execution_options(yield_per=BATCH_SIZE), columns
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_header(columns: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([c.key for c in columns])
+    return buffer.getvalue()
+
+
+def encode_batch(fmt: str, columns: list, rows: Iterable[tuple]) -> str:
+    """Encode a batch of row tuples as CSV lines or NDJSON objects"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([_serialize(v) for v in row] for row in rows)
+        return buffer.getvalue()
+    keys = [c.key for c in columns]
+    return "".join(
+        json.dumps(dict(zip(keys, row)), default=_serialize, separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+
+def _check_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def export(db: Session, dataset: str, fmt: str, product_id: Optional[int] = None) -> Iterator[str]:
+    """Stream an export of `products` or `history` in the given format"""
+    _check_format(fmt)
+    stmt, columns = export_statement(dataset, product_id)
+    if fmt == "csv":
+        yield encode_header(columns)
+    for batch in db.execute(stmt).partitions():
+        yield encode_batch(fmt, columns, batch)
+
+
+async def export_async(db: AsyncSession, dataset: str, fmt: str, product_id: Optional[int] = None) -> AsyncIterator[str]:
+    """Async counterpart of export() for StreamingResponse"""
+    _check_format(fmt)
+    stmt, columns = export_statement(dataset, product_id)
+    if fmt == "csv":
+        yield encode_header(columns)
+    result = await db.stream(stmt)
+    async for batch in result.partitions():
+        yield encode_batch(fmt, columns, batch)
@@ -0,0 +1,48 @@
+"""
+Compact old inventory history into daily totals and query the archive
+
+Usage:
+    python history_retention.py compact --days 365 --batch-size 5000
+    python history_retention.py query --product-id 42 --since 2023-01-01 --until 2023-07-01
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+from database import SessionLocal
+from retention import DEFAULT_BATCH_SIZE, HISTORY_ARCHIVE_DIR, HISTORY_RETENTION_DAYS, compact_history, read_archive
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inventory history retention")
+    parser.add_argument("--archive-dir", default=HISTORY_ARCHIVE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compact = commands.add_parser("compact", help="Archive and compact history older than --days")
+    compact.add_argument("--days", type=int, default=HISTORY_RETENTION_DAYS)
+    compact.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    compact.add_argument("--max-batches", type=int, help="Stop after this many batches")
+
+    query = commands.add_parser("query", help="Print archived rows as NDJSON")
+    query.add_argument("--product-id", type=int)
+    query.add_argument("--action")
+    query.add_argument("--since", type=datetime.fromisoformat, help="Inclusive, e.g. 2023-01-01")
+    query.add_argument("--until", type=datetime.fromisoformat, help="Exclusive")
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        for row in read_archive(args.archive_dir, args.product_id, args.since, args.until, args.action):
+            sys.stdout.write(json.dumps(row, separators=(",", ":")) + "\n")
+        return
+
+    db = SessionLocal()
+    try:
+        report = compact_history(db, args.days, args.archive_dir, args.batch_size, args.max_batches)
+    finally:
+        db.close()
+    print(f"✓ Archived {report.archived} rows older than {report.cutoff:%Y-%m-%d} "
+          f"in {report.batches} batches ({report.daily_rows} daily rows updated)")
+    for path in report.files:
+        print(f"  {path}")
+
+if __name__ == "__main__":
+    main()
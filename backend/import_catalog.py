@@ -0,0 +1,35 @@
+"""
+Bulk import / upsert products from a CSV or JSON file
+
+Usage:
+    python import_catalog.py supplier_catalog.csv --performed-by admin
+    python import_catalog.py catalog.json --chunk-size 5000
+"""
+import argparse
+import json
+from database import SessionLocal
+from importer import DEFAULT_CHUNK_SIZE, import_products, read_csv, read_json
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upsert products by SKU from CSV or JSON")
+    parser.add_argument("path", help="CSV file with a header row, or a JSON array")
+    parser.add_argument("--format", choices=["csv", "json"], help="Defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--performed-by", default="import", help="Recorded in inventory history")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("json" if args.path.lower().endswith(".json") else "csv")
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as f:
+            records = read_json(f) if fmt == "json" else read_csv(f)
+            report = import_products(db, records, args.performed_by, args.chunk_size)
+    finally:
+        db.close()
+
+    print(f"✓ Created {report.created}, updated {report.updated}, failed {report.failed}")
+    for error in report.errors:
+        print(json.dumps(error.dict()))
+
+if __name__ == "__main__":
+    main()
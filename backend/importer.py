@@ -0,0 +1,233 @@
+"""
+Bulk product import with upsert-by-SKU in batched transactions
+"""
+import csv
+import io
+import json
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from models import Product, InventoryHistory
+from changes import record_product_changes
+from rollup import product_state
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Required when the SKU is new; an existing product keeps its current value
+REQUIRED_FOR_NEW = ("name", "price")
+
+class ProductImportRow(BaseModel):
+    """
+    One imported product. New SKUs get the defaults below for omitted
+    fields; for existing SKUs only the fields actually given are updated.
+    """
+    name: Optional[str] = None
+    sku: str
+    description: str = ""
+    category: str = ""
+    price: Optional[float] = None
+    quantity: int = 0
+    min_stock_level: int = 10
+    supplier: str = ""
+
+    def given(self) -> dict:
+        """The fields present in the input, without the SKU"""
+        return self.dict(exclude={"sku"}, exclude_unset=True, exclude_none=True)
+
+    def missing_for_new(self) -> List[str]:
+        return [name for name in REQUIRED_FOR_NEW if getattr(self, name) is None]
+
+class ImportRowError(BaseModel):
+    row: int
+    sku: Optional[str] = None
+    error: str
+
+class ImportReport(BaseModel):
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+
+
+def read_csv(stream: IO[bytes]) -> Iterator[dict]:
+    """Yield one dict per CSV line; empty cells count as not given"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for record in reader:
+        yield {k.strip(): v for k, v in record.items() if k and v not in (None, "")}
+
+
+def read_json(stream: IO[bytes]) -> List[dict]:
+    """Read a JSON array of product objects"""
+    records = json.load(stream)
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON array of products")
+    return records
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors()
+    )
+
+
+def _write_chunk(db: Session, chunk: List[Tuple[int, ProductImportRow]],
+                 performed_by: str) -> Tuple[int, int, List[ImportRowError]]:
+    """
+    Upsert one chunk and its history rows; the caller owns the transaction.
+
+    Returns (created, updated, errors); new SKUs missing a required field are
+    reported in `errors` and skipped.
+    """
+    skus = [row.sku for _, row in chunk]
+    existing = {
+        row.sku: row
+        for row in db.execute(
+            select(
+                Product.sku, Product.id, Product.category, Product.price,
+                Product.quantity, Product.min_stock_level
+            ).where(Product.sku.in_(skus))
+        )
+    }
+
+    errors = []
+    new_rows, updated_rows = [], []
+    for line, row in chunk:
+        if row.sku in existing:
+            updated_rows.append(row)
+        elif row.missing_for_new():
+            errors.append(ImportRowError(row=line, sku=row.sku, error="; ".join(
+                f"{name}: Field required for new products" for name in row.missing_for_new()
+            )))
+        else:
+            new_rows.append(row)
+
+    inserts = [row.dict() for row in new_rows]
+    updates = [{"id": existing[row.sku].id, **row.given()} for row in updated_rows]
+
+    history = []
+    created_ids = {}
+    if inserts:
+        created = db.execute(insert(Product).returning(Product.id, Product.sku), inserts).all()
+        created_ids = {sku: product_id for product_id, sku in created}
+        quantities = {r["sku"]: r["quantity"] for r in inserts}
+        history.extend(
+            {
+                "product_id": product_id,
+                "action": "added",
+                "quantity_change": quantities[sku],
+                "performed_by": performed_by,
+                "notes": f"Product imported: {sku}",
+            }
+            for product_id, sku in created
+        )
+    if updates:
+        # Rows giving different fields are grouped into one executemany each
+        db.execute(update(Product), updates)
+        history.extend(
+            {
+                "product_id": existing[row.sku].id,
+                "action": "updated",
+                "quantity_change": (
+                    row.quantity - (existing[row.sku].quantity or 0) if "quantity" in row.given() else 0
+                ),
+                "performed_by": performed_by,
+                "notes": f"Product updated by import: {row.sku}",
+            }
+            for row in updated_rows
+        )
+    if history:
+        db.execute(insert(InventoryHistory), history)
+
+    changes = []
+    for row in updated_rows:
+        before = product_state(existing[row.sku])
+        given = row.given()
+        changes.append((before, before._replace(**{
+            field: given[field] for field in ("category", "price", "quantity", "min_stock_level") if field in given
+        })))
+    changes.extend((None, product_state(row)._replace(product_id=created_ids[row.sku])) for row in new_rows)
+    record_product_changes(db, changes)
+    return len(inserts), len(updates), errors
+
+
+def _flush_chunk(db: Session, chunk: List[Tuple[int, ProductImportRow]], performed_by: str, report: ImportReport):
+    """
+    Commit a chunk in one transaction. If the database rejects it, retry the
+    rows one by one inside savepoints so only the offending rows are reported.
+    """
+    try:
+        created, updated, errors = _write_chunk(db, chunk, performed_by)
+        db.commit()
+        report.created += created
+        report.updated += updated
+        report.failed += len(errors)
+        report.errors.extend(errors)
+        return
+    except DBAPIError:
+        db.rollback()
+
+    for line, row in chunk:
+        try:
+            with db.begin_nested():
+                created, updated, errors = _write_chunk(db, [(line, row)], performed_by)
+            report.created += created
+            report.updated += updated
+            report.failed += len(errors)
+            report.errors.extend(errors)
+        except DBAPIError as e:
+            report.failed += 1
+            report.errors.append(ImportRowError(row=line, sku=row.sku, error=str(e.orig)))
+    db.commit()
+
+
+def import_products(
+    db: Session,
+    records: Iterable[dict],
+    performed_by: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> ImportReport:
+    """
+    Validate and upsert products by SKU, `chunk_size` rows per transaction.
+
+    Invalid rows and duplicate SKUs are reported with their 1-based row
+    number and skipped; they never abort the rest of the import. Rows for
+    existing SKUs may be partial: omitted fields keep their current values.
+    """
+    report = ImportReport()
+    seen = {}
+    chunk: List[Tuple[int, ProductImportRow]] = []
+
+    for line, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            report.failed += 1
+            report.errors.append(ImportRowError(row=line, error="Expected an object"))
+            continue
+        try:
+            row = ProductImportRow(**record)
+        except ValidationError as e:
+            report.failed += 1
+            report.errors.append(ImportRowError(
+                row=line, sku=record.get("sku"), error=_validation_message(e)
+            ))
+            continue
+
+        if row.sku in seen:
+            report.failed += 1
+            report.errors.append(ImportRowError(
+                row=line, sku=row.sku, error=f"Duplicate SKU (first seen on row {seen[row.sku]})"
+            ))
+            continue
+        seen[row.sku] = line
+
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            _flush_chunk(db, chunk, performed_by, report)
+            chunk = []
+
+    if chunk:
+        _flush_chunk(db, chunk, performed_by, report)
+    # Rows missing fields for a new product are only found when their chunk is written
+    report.errors.sort(key=lambda e: e.row)
+    return report
@@ -0,0 +1,245 @@
+"""
+Live product change feed (Server-Sent Events)
+
+Product writes capture the rows they changed inside their transaction
+(through changes.record_product_changes()); when the transaction commits,
+the changes are published to the in-process ChangeBroker as one event whose
+id is the catalog version of the write.
+
+* Every connection has a bounded queue. A client that falls behind by more
+  than LIVE_FEED_QUEUE_SIZE events is disconnected instead of buffering
+  without limit; its EventSource reconnects and resumes.
+* The last LIVE_FEED_BUFFER events are kept in a ring buffer, so a client
+  reconnecting with Last-Event-ID receives what it missed. If that id is
+  older than the buffer (or from before this process started), the client
+  gets a `reset` event and should refetch.
+* Writes touching more than LIVE_FEED_MAX_CHANGES products (bulk imports)
+  publish a `reset` instead of the rows.
+
+The broker only sees writes made by this process; with several API worker
+processes, run one feed process or have clients refetch on `reset`.
+"""
+import asyncio
+import bisect
+import os
+import threading
+from collections import deque
+from typing import List, NamedTuple, Optional, Tuple
+import orjson
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from exports import PRODUCT_COLUMNS
+from models import Product
+
+LIVE_FEED_BUFFER = int(os.getenv("LIVE_FEED_BUFFER", "1000"))
+LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", "256"))
+LIVE_FEED_HEARTBEAT = float(os.getenv("LIVE_FEED_HEARTBEAT", "15"))
+LIVE_FEED_MAX_CHANGES = int(os.getenv("LIVE_FEED_MAX_CHANGES", "500"))
+
+
+class FeedEvent(NamedTuple):
+    id: int
+    event: str
+    data: bytes
+
+    def encode(self) -> bytes:
+        return b"id: %d\nevent: %s\ndata: %s\n\n" % (self.id, self.event.encode(), self.data)
+
+
+class Subscription:
+    def __init__(self, queue_size: int):
+        # One extra slot so the overflow marker always fits
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size + 1)
+        self.queue_size = queue_size
+        self.overflowed = False
+
+    def offer(self, event: FeedEvent):
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.queue_size:
+            self.overflowed = True
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(event)
+
+
+class ChangeBroker:
+    """Fans committed product changes out to SSE connections"""
+
+    def __init__(self, buffer_size: int = LIVE_FEED_BUFFER, queue_size: int = LIVE_FEED_QUEUE_SIZE):
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._buffer: deque = deque()
+            self._subscribers = set()
+            self._loop = None
+            # Every event after `_floor` is still in the buffer
+            self._floor: Optional[int] = None
+            self.published = 0
+            self.overflows = 0
+
+    @property
+    def active(self) -> bool:
+        """Writes only capture changes once someone has subscribed"""
+        return self._floor is not None
+
+    def subscribe(self, last_event_id: int, current_version: int) -> Tuple[Subscription, Optional[List[FeedEvent]]]:
+        """
+        Register a connection. Returns the subscription and the buffered
+        events after `last_event_id`, or None when some of them are gone.
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            if self._floor is None:
+                self._floor = current_version
+            self._subscribers.add(subscription)
+            if last_event_id < self._floor:
+                return subscription, None
+            start = bisect.bisect_right([e.id for e in self._buffer], last_event_id)
+            return subscription, list(self._buffer)[start:]
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: FeedEvent):
+        """Buffer an event and hand it to every connection; safe from any thread"""
+        with self._lock:
+            # Commits can finish out of version order; keep the buffer sorted
+            ids = [e.id for e in self._buffer]
+            self._buffer.insert(bisect.bisect_right(ids, event.id), event)
+            while len(self._buffer) > self.buffer_size:
+                self._floor = self._buffer.popleft().id
+            self.published += 1
+            subscribers = list(self._subscribers)
+            loop = self._loop
+        if not subscribers or loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, event, subscribers)
+        except RuntimeError:
+            pass  # the loop has shut down
+
+    def _deliver(self, event: FeedEvent, subscribers: List[Subscription]):
+        for subscription in subscribers:
+            was_overflowed = subscription.overflowed
+            subscription.offer(event)
+            if subscription.overflowed and not was_overflowed:
+                self.overflows += 1
+
+    def latest_id(self) -> Optional[int]:
+        with self._lock:
+            return self._buffer[-1].id if self._buffer else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": len(self._subscribers),
+                "buffered": len(self._buffer),
+                "oldest_resumable_id": self._floor,
+                "published": self.published,
+                "overflows": self.overflows,
+            }
+
+
+change_broker = ChangeBroker()
+
+
+async def event_stream(broker: ChangeBroker, subscription: Subscription, backlog: Optional[List[FeedEvent]],
+                       current_version: int, heartbeat: float = LIVE_FEED_HEARTBEAT):
+    """SSE body for one connection; ends when the client disconnects or falls behind"""
+    try:
+        if backlog is None:
+            latest = max(current_version, broker.latest_id() or 0)
+            yield FeedEvent(latest, "reset", orjson.dumps({"version": latest, "reason": "resume"})).encode()
+        elif not backlog:
+            # Gives the client an id to resume from before the first change arrives
+            yield FeedEvent(current_version, "ready", orjson.dumps({"version": current_version})).encode()
+        for feed_event in backlog or ():
+            yield feed_event.encode()
+        while True:
+            try:
+                feed_event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if feed_event is None:
+                break  # fell behind: the client reconnects with Last-Event-ID
+            yield feed_event.encode()
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def _op(before, after) -> str:
+    if before is None:
+        return "created"
+    if after is None:
+        return "deleted"
+    if before.quantity != after.quantity and before._replace(quantity=after.quantity) == after:
+        return "stock"
+    return "updated"
+
+
+def capture_product_changes(db: Session, changes: list, catalog_version: int):
+    """Read the changed rows inside the write's transaction; published on commit"""
+    if not change_broker.active:
+        return
+    if len(changes) > LIVE_FEED_MAX_CHANGES:
+        feed_event = FeedEvent(catalog_version, "reset", orjson.dumps({"version": catalog_version, "reason": "bulk"}))
+    else:
+        ids = [after.product_id for _, after in changes if after is not None and after.product_id is not None]
+        rows = {}
+        if ids:
+            db.flush()  # routes may still hold the new values on ORM instances
+            keys = [c.key for c in PRODUCT_COLUMNS]
+            rows = {
+                row.id: dict(zip(keys, row))
+                for row in db.execute(select(*PRODUCT_COLUMNS).where(Product.id.in_(ids)))
+            }
+        deltas = []
+        for before, after in changes:
+            op = _op(before, after)
+            if op == "deleted":
+                deltas.append({"op": op, "id": before.product_id})
+            elif after.product_id in rows:
+                deltas.append({"op": op, "product": rows[after.product_id]})
+        feed_event = FeedEvent(catalog_version, "products", orjson.dumps({"version": catalog_version, "changes": deltas}))
+    # Tagged with the innermost transaction, so a rolled-back savepoint drops its events
+    transaction = db.get_nested_transaction() or db.get_transaction()
+    db.info.setdefault("feed_events", []).append((transaction, feed_event))
+
+
+def _inside(transaction, ancestor) -> bool:
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_feed_events(session):
+    # Also fires when a savepoint is released; only the outer commit makes changes real
+    if session.in_nested_transaction():
+        return
+    for _, feed_event in session.info.pop("feed_events", ()):
+        change_broker.publish(feed_event)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_feed_events(session, previous_transaction):
+    # Drops only what the rolled-back transaction captured: a savepoint
+    # rollback (e.g. the importer's per-row retry) keeps earlier rows' events
+    kept = [
+        (transaction, feed_event) for transaction, feed_event in session.info.get("feed_events", ())
+        if not _inside(transaction, previous_transaction)
+    ]
+    if kept:
+        session.info["feed_events"] = kept
+    else:
+        session.info.pop("feed_events", None)
@@ -1,25 +1,26 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base, SessionLocal
-from routes import products, auth, reports
+from database import engine, SessionLocal, replica_router
+from migrations import pending_migrations, run_migrations
+from routes import products, auth, reports, exports, admin, live, metrics
 from models import User
 from auth import get_password_hash
+from compression import CompressionMiddleware
+from metrics import METRICS_ENABLED, MetricsMiddleware
+from read_replica import ReadYourWritesMiddleware
+from outbox import OUTBOX_WORKER, OutboxWorker, configured_sinks
 
-app = FastAPI(title="Wholesale Shop Inventory Management API")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-Base.metadata.create_all(bind=engine)
+# Migrations normally run out-of-band (`python migrate_db.py`) before a deploy;
+# this is a convenience for local development with a single worker
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
 
 # Create default admin user if not exists
-def create_default_admin():
-    db = SessionLocal()
+def create_default_admin(session_factory=SessionLocal):
+    db = session_factory()
     try:
         admin = db.query(User).filter(User.username == "admin").first()
         if not admin:
@@ -35,11 +36,67 @@ def create_default_admin():
     finally:
         db.close()
 
-create_default_admin()
+def prepare_database(engine=engine, session_factory=SessionLocal, migrate: bool = MIGRATE_ON_STARTUP):
+    """Refuse to serve an outdated schema (or migrate it), then ensure the admin exists"""
+    pending = pending_migrations(engine)
+    if pending and not migrate:
+        raise RuntimeError(
+            f"{len(pending)} schema migration(s) pending; run `python migrate_db.py` "
+            "or set MIGRATE_ON_STARTUP=true"
+        )
+    if pending:
+        run_migrations(engine)
+    create_default_admin(session_factory)
+
+# Delivers low-stock alerts queued by product writes (see outbox.py); only
+# started in-process with OUTBOX_WORKER=true, normally `python outbox_worker.py`
+outbox_worker = OutboxWorker(SessionLocal, configured_sinks())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work lives here rather than at import time, so importing main
+    # (tests, tooling, each worker before it forks) touches no database
+    await run_in_threadpool(prepare_database)
+    if OUTBOX_WORKER:
+        if not outbox_worker.sinks:
+            raise RuntimeError(
+                "OUTBOX_WORKER=true but no alert sinks are configured; "
+                "set OUTBOX_LOG_PATH and/or OUTBOX_WEBHOOK_URL"
+            )
+        outbox_worker.start()
+    try:
+        yield
+    finally:
+        outbox_worker.stop()
+
+app = FastAPI(
+    title="Wholesale Shop Inventory Management API",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified"],
+)
+app.add_middleware(CompressionMiddleware)
+# Pins a client's reads to the primary for a moment after it writes
+app.add_middleware(ReadYourWritesMiddleware, router=replica_router)
+# Outermost, so timings and sizes cover CORS and compression too
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(products.router)
 app.include_router(reports.router)
+app.include_router(exports.router)
+app.include_router(admin.router)
+app.include_router(live.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def root():
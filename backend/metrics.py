@@ -0,0 +1,270 @@
+"""
+Request metrics in Prometheus text format
+
+MetricsMiddleware times every HTTP request and records, per route template
+(e.g. `/api/products/{product_id}`), a latency histogram, the number of SQL
+statements and the time spent in the database (from SQLAlchemy engine
+events, attributed to the request through a context variable) and the
+response size as sent, after compression. `GET /metrics` renders them.
+
+A request that runs the same statement METRICS_N_PLUS_ONE_THRESHOLD times
+or more is counted in `http_request_n_plus_one_total` and logged with the
+statement: that is the shape of an N+1 query (one query per row of an
+earlier result).
+
+Event streams are not recorded, since their duration is the connection's.
+Metrics are kept per process; with several workers, scrape each one or put
+them behind a single process.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "10"))
+# When set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+logger = logging.getLogger("inventory.metrics")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One counter per bucket plus +Inf, then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def count(self, labels: tuple) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[:-1]) if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else _number(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: int = 1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def value(self, labels: tuple) -> int:
+        with self._lock:
+            return self._values[labels]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labels, labels)} {value}" for labels, value in values)
+        return lines
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Time from request to the last response byte",
+            ("method", "route", "status"), LATENCY_BUCKETS)
+        self.db_queries = Histogram(
+            "http_request_db_queries", "SQL statements executed per request",
+            ("method", "route"), QUERY_BUCKETS)
+        self.db_duration = Histogram(
+            "http_request_db_seconds", "Time spent executing SQL per request",
+            ("method", "route"), LATENCY_BUCKETS)
+        self.response_size = Histogram(
+            "http_response_size_bytes", "Response body size as sent (after compression)",
+            ("method", "route"), SIZE_BUCKETS)
+        self.n_plus_one = CounterMetric(
+            "http_request_n_plus_one_total",
+            f"Requests that ran one statement {METRICS_N_PLUS_ONE_THRESHOLD}+ times",
+            ("method", "route"))
+        self.all = [self.request_duration, self.db_queries, self.db_duration, self.response_size, self.n_plus_one]
+
+    def clear(self):
+        for metric in self.all:
+            metric.clear()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.all:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+class QueryStats:
+    """SQL executed on behalf of one request"""
+    __slots__ = ("scope", "queries", "seconds", "statements")
+
+    def __init__(self, scope: Optional[Scope] = None):
+        # The router fills in scope["endpoint"] before the route runs
+        self.scope = scope
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def most_repeated(self) -> Tuple[Optional[str], int]:
+        if not self.statements:
+            return None, 0
+        return self.statements.most_common(1)[0]
+
+
+# Set by MetricsMiddleware; SQL outside a request (workers, CLIs) isn't attributed
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    if current_query_stats.get() is not None:
+        context._metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = current_query_stats.get()
+    start = getattr(context, "_metrics_start", None)
+    if stats is None or start is None:
+        return
+    stats.queries += 1
+    stats.seconds += time.perf_counter() - start
+    stats.statements[statement] += 1
+
+
+_route_templates: Dict[object, str] = {}
+
+
+def route_template(scope: Scope) -> str:
+    """Path template of the route that handled the request; bounded label values"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    template = _route_templates.get(endpoint)
+    if template is None:
+        app = scope.get("app")
+        template = next(
+            (route.path for route in getattr(app, "routes", ()) if getattr(route, "endpoint", None) is endpoint),
+            getattr(endpoint, "__name__", "unknown"),
+        )
+        _route_templates[endpoint] = template
+    return template
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics = request_metrics,
+                 n_plus_one_threshold: int = METRICS_N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.metrics = metrics
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stats = QueryStats(scope)
+        token = current_query_stats.set(stats)
+        status = 500
+        size = 0
+        streaming = False
+
+        async def send_measured(message: Message):
+            nonlocal status, size, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                streaming = content_type.startswith("text/event-stream")
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            current_query_stats.reset(token)
+            if not streaming:
+                self.record(scope, status, time.perf_counter() - start, stats, size)
+
+    def record(self, scope: Scope, status: int, seconds: float, stats: QueryStats, size: int):
+        route = route_template(scope)
+        labels = (scope["method"], route)
+        self.metrics.request_duration.observe(labels + (str(status),), seconds)
+        self.metrics.db_queries.observe(labels, stats.queries)
+        self.metrics.db_duration.observe(labels, stats.seconds)
+        self.metrics.response_size.observe(labels, size)
+
+        statement, repeats = stats.most_repeated()
+        if repeats >= self.n_plus_one_threshold:
+            self.metrics.n_plus_one.inc(labels)
+            logger.warning(
+                "Possible N+1 on %s %s: %d statements, one ran %d times: %s",
+                scope["method"], route, stats.queries, repeats, " ".join(statement.split())[:300],
+            )
@@ -1,59 +1,28 @@
 """
-Database migration script to add missing columns
+Apply pending versioned schema migrations (see migrations.py)
+
+Usage:
+    python migrate_db.py           # apply pending migrations
+    python migrate_db.py --status  # list applied and pending migrations
 """
-from sqlalchemy import text
+import argparse
 from database import engine
+from migrations import MIGRATIONS, pending_migrations, run_migrations
+
+def migrate(argv=None):
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--status", action="store_true", help="Only list migration status")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        pending = {m.version for m in pending_migrations(engine)}
+        for m in MIGRATIONS:
+            state = "pending" if m.version in pending else "applied"
+            print(f"{m.version:04d} {m.name:<45} {state}")
+        return
 
-def migrate():
-    with engine.connect() as conn:
-        try:
-            # Add supplier column to products table if it doesn't exist
-            conn.execute(text("""
-                ALTER TABLE products 
-                ADD COLUMN IF NOT EXISTS supplier VARCHAR;
-            """))
-            conn.commit()
-            print("✓ Added supplier column to products table")
-        except Exception as e:
-            print(f"Error adding supplier column: {e}")
-        
-        try:
-            # Create inventory_history table if it doesn't exist
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS inventory_history (
-                    id SERIAL PRIMARY KEY,
-                    product_id INTEGER NOT NULL,
-                    action VARCHAR NOT NULL,
-                    quantity_change INTEGER DEFAULT 0,
-                    performed_by VARCHAR,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """))
-            conn.commit()
-            print("✓ Created inventory_history table")
-        except Exception as e:
-            print(f"Error creating inventory_history table: {e}")
-        
-        try:
-            # Create users table if it doesn't exist
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR UNIQUE NOT NULL,
-                    email VARCHAR UNIQUE NOT NULL,
-                    password VARCHAR NOT NULL,
-                    role VARCHAR DEFAULT 'customer',
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """))
-            conn.commit()
-            print("✓ Created users table")
-        except Exception as e:
-            print(f"Error creating users table: {e}")
-        
-        print("\nMigration completed!")
+    applied = run_migrations(engine)
+    print(f"\nMigration completed! ({len(applied)} applied)")
 
 if __name__ == "__main__":
     migrate()
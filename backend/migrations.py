@@ -0,0 +1,218 @@
+"""
+Versioned schema migrations
+
+Each migration is a function registered with @migration(version, name). It
+receives a Connection inside a transaction, and the version is recorded in
+`schema_migrations` in that same transaction, so a migration is applied
+exactly once or not at all. Migrations must be safe to run against a
+database that create_all() has already brought up to date, so they create
+objects with checkfirst / IF NOT EXISTS.
+
+Run pending migrations with `python migrate_db.py`.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, List, NamedTuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, insert, or_, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from models import User, Product, InventoryHistory, InventoryHistoryDaily, CategoryRollup, CatalogVersion, StockMovementDaily, OutboxEvent, ProductTombstone, MovementSnapshotState
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    """Register a migration; versions must be unique and increasing"""
+    def register(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append(Migration(version, name, fn))
+        return fn
+    return register
+
+
+def add_column_if_missing(conn: Connection, table: str, column: str, ddl: str):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def create_indexes(conn: Connection, model, names: List[str]):
+    indexes = {index.name: index for index in model.__table__.indexes}
+    for name in names:
+        indexes[name].create(bind=conn, checkfirst=True)
+
+
+def rebuild_category_rollups(conn: Connection):
+    """Recount the rollups, recreating the table first if it predates null_category"""
+    from rollup import rebuild_rollups
+
+    inspector = inspect(conn)
+    if inspector.has_table("category_rollups") and \
+            "null_category" not in {c["name"] for c in inspector.get_columns("category_rollups")}:
+        # Derived data only, so a rebuilt table loses nothing
+        CategoryRollup.__table__.drop(bind=conn)
+    CategoryRollup.__table__.create(bind=conn, checkfirst=True)
+    rebuild_rollups(Session(bind=conn))
+
+
+def applied_versions(conn: Connection) -> set:
+    """Versions recorded so far; read-only, a database without the table has none"""
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def run_migrations(engine: Engine, log: Callable[[str], None] = print) -> List[int]:
+    """Apply every pending migration in version order; returns the versions applied"""
+    applied = []
+    pending = pending_migrations(engine)
+    if pending:
+        with engine.begin() as conn:
+            schema_migrations.create(bind=conn, checkfirst=True)
+    for m in pending:
+        with engine.begin() as conn:
+            m.apply(conn)
+            conn.execute(insert(schema_migrations).values(
+                version=m.version, name=m.name, applied_at=datetime.utcnow()
+            ))
+        applied.append(m.version)
+        log(f"✓ {m.version:04d} {m.name}")
+    return applied
+
+
+@migration(1, "initial schema")
+def _initial_schema(conn):
+    for model in (User, Product, InventoryHistory):
+        model.__table__.create(bind=conn, checkfirst=True)
+    # Databases created before suppliers were tracked
+    add_column_if_missing(conn, "products", "supplier", "VARCHAR")
+
+
+@migration(2, "product pagination and low-stock indexes")
+def _product_indexes(conn):
+    create_indexes(conn, Product, [
+        "ix_products_name_id",
+        "ix_products_price_id",
+        "ix_products_quantity_id",
+        "ix_products_updated_at_id",
+        "ix_products_low_stock",
+    ])
+
+
+@migration(3, "category rollups")
+def _category_rollups(conn):
+    rebuild_category_rollups(conn)
+
+
+@migration(4, "product search index")
+def _product_search(conn):
+    from search import install_search
+
+    install_search(conn)
+
+
+@migration(5, "inventory history indexes")
+def _history_indexes(conn):
+    create_indexes(conn, InventoryHistory, [
+        "ix_inventory_history_product_created_id",
+        "ix_inventory_history_created_id",
+    ])
+
+
+@migration(6, "inventory history daily aggregates")
+def _history_daily(conn):
+    InventoryHistoryDaily.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(7, "catalog version counter")
+def _catalog_version(conn):
+    CatalogVersion.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(8, "stock movement daily snapshots")
+def _stock_movement_daily(conn):
+    # Filled by the nightly `python movement_snapshots.py`
+    StockMovementDaily.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(9, "low-stock alert outbox")
+def _outbox_events(conn):
+    OutboxEvent.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(10, "product row versions and tombstones for delta sync")
+def _delta_sync(conn):
+    # Existing rows start at version 0, so a first sync returns all of them
+    add_column_if_missing(conn, "products", "row_version", "BIGINT NOT NULL DEFAULT 0")
+    create_indexes(conn, Product, ["ix_products_row_version_id"])
+    ProductTombstone.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(11, "replace NULL supplier, description and category with empty strings")
+def _fill_null_text(conn):
+    # Formerly fix_null_suppliers.py. Rows change, so they get a new catalog
+    # version: cached responses go stale and delta sync clients pick them up.
+    from changes import bump_catalog_version
+
+    has_null = or_(Product.supplier.is_(None), Product.description.is_(None), Product.category.is_(None))
+    if conn.scalar(select(Product.id).where(has_null).limit(1)) is None:
+        return
+    version = bump_catalog_version(Session(bind=conn))
+    conn.execute(update(Product).where(has_null).values(
+        supplier=func.coalesce(Product.supplier, ""),
+        description=func.coalesce(Product.description, ""),
+        category=func.coalesce(Product.category, ""),
+        row_version=version,
+    ))
+
+
+@migration(12, "product created_at pagination index")
+def _product_created_at_index(conn):
+    create_indexes(conn, Product, ["ix_products_created_at_id"])
+
+
+@migration(13, "exact category rollup values")
+def _exact_rollup_values(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE category_rollups ALTER COLUMN total_value TYPE NUMERIC(14, 4)"))
+    # Recount with NULL quantities treated as 0 and values rounded like the incremental path
+    rebuild_category_rollups(conn)
+
+
+@migration(14, "stock movement snapshot watermark")
+def _movement_snapshot_watermark(conn):
+    from movements import SNAPSHOT_STATE_ID
+
+    MovementSnapshotState.__table__.create(bind=conn, checkfirst=True)
+    # Continue after the last snapshot row, as the nightly job did before
+    last_day = conn.scalar(select(func.max(StockMovementDaily.day)))
+    if last_day is not None and conn.scalar(select(MovementSnapshotState.id)) is None:
+        conn.execute(insert(MovementSnapshotState).values(
+            id=SNAPSHOT_STATE_ID, next_day=last_day + timedelta(days=1), updated_at=datetime.utcnow()
+        ))
+
+
+@migration(15, "separate rollup rows for NULL and empty categories")
+def _null_category_rollups(conn):
+    # /reports/stats counts NULL and "" as two categories again
+    rebuild_category_rollups(conn)
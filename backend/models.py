@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean
+from sqlalchemy import Column, BigInteger, Integer, String, Float, Numeric, Date, DateTime, Text, Boolean, Index, text
 from datetime import datetime
 from database import Base
 
@@ -27,6 +27,26 @@ class Product(Base):
     supplier = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Catalog version of the last write to this row; drives delta sync
+    row_version = Column(BigInteger, nullable=False, default=0, server_default=text("0"))
+    
+    # Composite (sort key, id) indexes backing keyset pagination in get_products
+    __table_args__ = (
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_quantity_id", "quantity", "id"),
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_updated_at_id", "updated_at", "id"),
+        # Delta sync reads only the rows written after the client's version
+        Index("ix_products_row_version_id", "row_version", "id"),
+        # Partial index: the low-stock report only touches rows below their threshold
+        Index(
+            "ix_products_low_stock",
+            "id",
+            sqlite_where=text("quantity <= min_stock_level"),
+            postgresql_where=text("quantity <= min_stock_level"),
+        ),
+    )
 
 class InventoryHistory(Base):
     __tablename__ = "inventory_history"
@@ -38,3 +58,112 @@ class InventoryHistory(Base):
     performed_by = Column(String)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Newest-first keyset pagination for one product and for the whole log
+    __table_args__ = (
+        Index("ix_inventory_history_product_created_id", "product_id", "created_at", "id"),
+        Index("ix_inventory_history_created_id", "created_at", "id"),
+    )
+
+# Deleted products, so delta sync clients can drop them
+class ProductTombstone(Base):
+    __tablename__ = "product_tombstones"
+    
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    sku = Column(String)
+    row_version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_product_tombstones_row_version_id", "row_version", "id"),
+    )
+
+# Per-product daily totals for history compacted out of inventory_history
+class InventoryHistoryDaily(Base):
+    __tablename__ = "inventory_history_daily"
+    
+    product_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    action = Column(String, primary_key=True)
+    events = Column(Integer, nullable=False, default=0)
+    quantity_change = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_inventory_history_daily_day", "day"),
+    )
+
+# Per-product daily movement totals, snapshotted nightly for the movement report
+class StockMovementDaily(Base):
+    __tablename__ = "stock_movement_daily"
+    
+    product_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    category = Column(String, nullable=False, default="")  # as of the snapshot; "" for uncategorized
+    inbound = Column(Integer, nullable=False, default=0)
+    outbound = Column(Integer, nullable=False, default=0)
+    events = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_stock_movement_daily_day", "day"),
+    )
+
+# Single-row high-water mark of stock_movement_daily: every day before
+# next_day is snapshotted, including days with no movements
+class MovementSnapshotState(Base):
+    __tablename__ = "movement_snapshot_state"
+    
+    id = Column(Integer, primary_key=True)
+    next_day = Column(Date, nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Low-stock threshold crossings, written in the same transaction as the product
+# change and delivered by the outbox worker (outbox.py)
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String, nullable=False)  # low_stock or restocked
+    product_id = Column(Integer, nullable=False)
+    dedupe_key = Column(String, nullable=False, unique=True)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, delivered, superseded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    delivered_at = Column(DateTime)
+    
+    __table_args__ = (
+        # Partial index: the worker only ever polls undelivered events
+        Index(
+            "ix_outbox_events_pending",
+            "next_attempt_at",
+            "id",
+            sqlite_where=text("status = 'pending'"),
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+# Per-category inventory totals, maintained in the same transaction as product writes
+class CategoryRollup(Base):
+    __tablename__ = "category_rollups"
+    
+    category = Column(String, primary_key=True)  # "" for uncategorized products
+    # NULL and "" categories are distinct categories, as in SELECT DISTINCT
+    null_category = Column(Boolean, primary_key=True, default=False)
+    product_count = Column(Integer, nullable=False, default=0)
+    # NUMERIC on PostgreSQL; SQLite has no exact decimal type, so it stays REAL
+    # and rollup.py rounds the running total instead
+    total_value = Column(Float().with_variant(Numeric(14, 4, asdecimal=False), "postgresql"), nullable=False, default=0.0)
+    low_stock_count = Column(Integer, nullable=False, default=0)
+    out_of_stock_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Single-row counter bumped by every catalog write; drives ETags on read routes
+class CatalogVersion(Base):
+    __tablename__ = "catalog_version"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
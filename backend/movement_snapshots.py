@@ -0,0 +1,30 @@
+"""
+Snapshot daily stock movement totals for the movement report
+
+Run nightly (e.g. from cron shortly after midnight UTC); each run picks up
+where the last one stopped, so missed nights are caught up automatically.
+
+Usage:
+    python movement_snapshots.py
+    python movement_snapshots.py --since 2024-01-01   # rebuild from a date
+"""
+import argparse
+from datetime import date
+from database import SessionLocal
+from movements import snapshot_movements
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot daily stock movements")
+    parser.add_argument("--since", type=date.fromisoformat, help="Rebuild snapshots from this day (inclusive)")
+    parser.add_argument("--through", type=date.fromisoformat, help="Stop before this day (default: today)")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        written = snapshot_movements(db, args.since, args.through)
+    finally:
+        db.close()
+    print(f"✓ Wrote {written} daily movement rows")
+
+if __name__ == "__main__":
+    main()
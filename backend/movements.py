@@ -0,0 +1,234 @@
+"""
+Stock movement report: inbound, outbound and net quantity per day, week or
+month, by product or by category
+
+Complete days are read from `stock_movement_daily`, a snapshot built by the
+nightly job (`python movement_snapshots.py`), so a year-long range reads at
+most one row per product and active day instead of scanning the history log.
+The job records how far it got in `movement_snapshot_state`, quiet days
+included, and days from there on (normally just today) are aggregated from
+`inventory_history` on the fly. Both parts are bucketed in SQL.
+
+Snapshots also cover history that retention has already compacted into
+`inventory_history_daily`. Those rows only keep the net change per action,
+so for compacted days a net gain counts as inbound and a net loss as
+outbound.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Date, case, cast, delete, func, insert, literal, select, type_coerce, union_all, update
+from sqlalchemy.orm import Session
+from models import InventoryHistory, InventoryHistoryDaily, MovementSnapshotState, Product, StockMovementDaily
+
+PERIODS = ("day", "week", "month")
+GROUPS = ("product", "category")
+# Days per snapshot transaction when catching up on a backlog
+SNAPSHOT_CHUNK_DAYS = 31
+SNAPSHOT_STATE_ID = 1
+
+
+def _day(column, dialect: str):
+    """Calendar day of a DATETIME column"""
+    if dialect == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def _bucket(day, period: str, dialect: str):
+    """First day of the day/week (Monday)/month containing `day`"""
+    if period == "day":
+        return day
+    if dialect == "sqlite":
+        if period == "week":
+            # strftime('%w') is 0 for Sunday; step back to the Monday
+            return func.date(day, func.printf("-%d days", (func.strftime("%w", day) + 6) % 7))
+        return func.strftime("%Y-%m-01", day)
+    return cast(func.date_trunc(period, day), Date)
+
+
+def _watermark(db: Session) -> Optional[date]:
+    """First day not yet snapshotted; None before the first snapshot run"""
+    return db.scalar(select(MovementSnapshotState.next_day).where(MovementSnapshotState.id == SNAPSHOT_STATE_ID))
+
+
+def _advance_watermark(db: Session, start: date, end: date):
+    """Mark [start, end) as snapshotted, unless that would leave a gap or move the mark back"""
+    watermark = _watermark(db)
+    now = datetime.utcnow()
+    if watermark is None:
+        db.execute(insert(MovementSnapshotState).values(id=SNAPSHOT_STATE_ID, next_day=end, updated_at=now))
+    elif start <= watermark < end:
+        db.execute(
+            update(MovementSnapshotState)
+            .where(MovementSnapshotState.id == SNAPSHOT_STATE_ID)
+            .values(next_day=end, updated_at=now)
+        )
+
+
+def _day_range_start(db: Session) -> Optional[date]:
+    """Earliest day with any history, raw or compacted"""
+    dialect = db.get_bind().dialect.name
+    raw = db.scalar(select(type_coerce(func.min(_day(InventoryHistory.created_at, dialect)), Date)))
+    compacted = db.scalar(select(func.min(InventoryHistoryDaily.day)))
+    days = [d for d in (raw, compacted) if d is not None]
+    return min(days) if days else None
+
+
+def _snapshot_chunk(db: Session, start: date, end: date) -> int:
+    dialect = db.get_bind().dialect.name
+    raw = select(
+        InventoryHistory.product_id,
+        _day(InventoryHistory.created_at, dialect).label("day"),
+        func.coalesce(InventoryHistory.quantity_change, 0).label("change"),
+        literal(1).label("events"),
+    ).where(
+        InventoryHistory.created_at >= datetime.combine(start, time.min),
+        InventoryHistory.created_at < datetime.combine(end, time.min),
+    )
+    compacted = select(
+        InventoryHistoryDaily.product_id,
+        InventoryHistoryDaily.day,
+        InventoryHistoryDaily.quantity_change,
+        InventoryHistoryDaily.events,
+    ).where(InventoryHistoryDaily.day >= start, InventoryHistoryDaily.day < end)
+    moves = union_all(raw, compacted).subquery()
+
+    category = func.coalesce(Product.category, "")
+    totals = (
+        select(
+            moves.c.product_id,
+            moves.c.day,
+            category,
+            func.sum(case((moves.c.change > 0, moves.c.change), else_=0)),
+            func.sum(case((moves.c.change < 0, -moves.c.change), else_=0)),
+            func.sum(moves.c.events),
+        )
+        .select_from(moves)
+        .outerjoin(Product, Product.id == moves.c.product_id)
+        .group_by(moves.c.product_id, moves.c.day, category)
+    )
+    db.execute(delete(StockMovementDaily).where(StockMovementDaily.day >= start, StockMovementDaily.day < end))
+    result = db.execute(insert(StockMovementDaily).from_select(
+        ["product_id", "day", "category", "inbound", "outbound", "events"], totals
+    ))
+    return result.rowcount
+
+
+def snapshot_movements(db: Session, since: Optional[date] = None, through: Optional[date] = None) -> int:
+    """
+    Build snapshot rows for complete days, committing one chunk at a time.
+
+    Starts at the watermark (or at `since`, to rebuild) and stops before
+    `through` (default: today, which is still in progress). The watermark
+    moves with each chunk, so days without movements are not scanned again.
+    Returns the number of snapshot rows written.
+    """
+    end = through or datetime.utcnow().date()
+    if since is None:
+        since = _watermark(db) or _day_range_start(db)
+    written = 0
+    while since is not None and since < end:
+        chunk_end = min(since + timedelta(days=SNAPSHOT_CHUNK_DAYS), end)
+        written += _snapshot_chunk(db, since, chunk_end)
+        _advance_watermark(db, since, chunk_end)
+        db.commit()
+        since = chunk_end
+    return written
+
+
+def _report_rows(db: Session, period: str, group_by: str, since: date, until: date,
+                 product_id: Optional[int], category: Optional[str], live_from: date) -> list:
+    dialect = db.get_bind().dialect.name
+    rows = []
+
+    if since < live_from:
+        bucket = _bucket(StockMovementDaily.day, period, dialect)
+        key = StockMovementDaily.product_id if group_by == "product" else StockMovementDaily.category
+        stmt = (
+            select(
+                type_coerce(bucket, Date).label("bucket"),
+                key.label("key"),
+                func.sum(StockMovementDaily.inbound),
+                func.sum(StockMovementDaily.outbound),
+                func.sum(StockMovementDaily.events),
+            )
+            .where(StockMovementDaily.day >= since, StockMovementDaily.day < min(until, live_from))
+            .group_by(bucket, key)
+        )
+        if product_id is not None:
+            stmt = stmt.where(StockMovementDaily.product_id == product_id)
+        if category is not None:
+            stmt = stmt.where(StockMovementDaily.category == category)
+        rows.extend(db.execute(stmt).all())
+
+    if until > live_from:
+        change = func.coalesce(InventoryHistory.quantity_change, 0)
+        bucket = _bucket(_day(InventoryHistory.created_at, dialect), period, dialect)
+        product_category = func.coalesce(Product.category, "")
+        key = InventoryHistory.product_id if group_by == "product" else product_category
+        stmt = (
+            select(
+                type_coerce(bucket, Date).label("bucket"),
+                key.label("key"),
+                func.sum(case((change > 0, change), else_=0)),
+                func.sum(case((change < 0, -change), else_=0)),
+                func.count(),
+            )
+            .select_from(InventoryHistory)
+            .outerjoin(Product, Product.id == InventoryHistory.product_id)
+            .where(
+                InventoryHistory.created_at >= datetime.combine(max(since, live_from), time.min),
+                InventoryHistory.created_at < datetime.combine(until, time.min),
+            )
+            .group_by(bucket, key)
+        )
+        if product_id is not None:
+            stmt = stmt.where(InventoryHistory.product_id == product_id)
+        if category is not None:
+            stmt = stmt.where(product_category == category)
+        rows.extend(db.execute(stmt).all())
+    return rows
+
+
+def movement_report(db: Session, period: str = "day", group_by: str = "product",
+                    since: Optional[date] = None, until: Optional[date] = None,
+                    product_id: Optional[int] = None, category: Optional[str] = None) -> List[dict]:
+    """
+    Movement totals per (period, product or category) for days in
+    [since, until), oldest period first.
+
+    Categories are reported as they were when the day was snapshotted;
+    uncategorized products are grouped under "". Buckets that straddle the
+    range edges only include the days inside it.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    if group_by not in GROUPS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUPS)}")
+    until = until or datetime.utcnow().date() + timedelta(days=1)
+    since = since or until - timedelta(days=30)
+    if since >= until:
+        return []
+    live_from = _watermark(db) or date.min
+
+    totals: Dict[Tuple[date, object], List[int]] = defaultdict(lambda: [0, 0, 0])
+    for bucket, key, inbound, outbound, events in _report_rows(
+        db, period, group_by, since, until, product_id, category, live_from
+    ):
+        total = totals[(bucket, key)]
+        total[0] += int(inbound or 0)
+        total[1] += int(outbound or 0)
+        total[2] += int(events or 0)
+
+    return [
+        {
+            "period_start": bucket,
+            group_by if group_by == "category" else "product_id": key,
+            "inbound": inbound,
+            "outbound": outbound,
+            "net": inbound - outbound,
+            "events": events,
+        }
+        for (bucket, key), (inbound, outbound, events) in sorted(totals.items())
+    ]
@@ -0,0 +1,243 @@
+"""
+Transactional outbox for low-stock alerts
+
+record_threshold_crossings() runs inside every product write (through
+changes.record_product_changes()) and inserts an `outbox_events` row when a
+product's quantity drops to or below its min_stock_level (`low_stock`) or
+climbs back above it (`restocked`). The event commits or rolls back with
+the write, so alerts are never lost and never sent for a write that failed.
+
+OutboxWorker polls pending events and delivers them in batches to every
+configured sink: a webhook (OUTBOX_WEBHOOK_URL) and/or an NDJSON log file
+(OUTBOX_LOG_PATH). Delivery is at least once:
+
+* a failed batch is retried with exponential backoff, up to
+  OUTBOX_MAX_ATTEMPTS, then marked `failed`;
+* each event carries a stable `id` and `dedupe_key` so receivers can drop
+  redeliveries, and the key's unique constraint keeps an event from being
+  recorded twice;
+* within a batch only the newest event per product is sent; older ones are
+  marked `superseded`, since the newest describes the current state.
+
+On PostgreSQL pending rows are claimed with FOR UPDATE SKIP LOCKED, so
+several workers can run side by side. SQLite has no SKIP LOCKED, so there
+run exactly one worker, or events are delivered once per worker.
+
+Delivery normally runs as its own process (`python outbox_worker.py`, the
+Procfile's `worker`). OUTBOX_WORKER=true runs it as a thread inside the API
+instead, which is meant for a single-process development server: every API
+worker process would start its own thread.
+"""
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from models import OutboxEvent
+from rollup import ProductState
+
+OUTBOX_WEBHOOK_URL = os.getenv("OUTBOX_WEBHOOK_URL", "")
+OUTBOX_WEBHOOK_TIMEOUT = float(os.getenv("OUTBOX_WEBHOOK_TIMEOUT", "5"))
+OUTBOX_LOG_PATH = os.getenv("OUTBOX_LOG_PATH", "")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "5"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+OUTBOX_WORKER = os.getenv("OUTBOX_WORKER", "false").lower() in ("1", "true", "yes")
+
+
+def _is_low(state: Optional[ProductState]) -> bool:
+    return state is not None and state.quantity <= state.min_stock_level
+
+
+def threshold_crossings(changes: Iterable[Tuple[Optional[ProductState], Optional[ProductState]]]):
+    """Yield (event_type, state) for every change that crosses min_stock_level"""
+    for before, after in changes:
+        if after is None or after.product_id is None:
+            continue  # deleted products raise no alerts
+        if _is_low(after) and not _is_low(before):
+            yield "low_stock", after
+        elif _is_low(before) and not _is_low(after):
+            yield "restocked", after
+
+
+def record_threshold_crossings(db: Session, changes, catalog_version: int) -> int:
+    """Insert outbox events for threshold crossings in the caller's transaction"""
+    now = datetime.utcnow()
+    events = {}
+    for event_type, state in threshold_crossings(changes):
+        dedupe_key = f"{event_type}:{state.product_id}:{catalog_version}"
+        payload = {
+            "type": event_type,
+            "product_id": state.product_id,
+            "sku": state.sku,
+            "quantity": state.quantity,
+            "min_stock_level": state.min_stock_level,
+            "catalog_version": catalog_version,
+            "occurred_at": now.isoformat(),
+        }
+        events[dedupe_key] = {
+            "event_type": event_type,
+            "product_id": state.product_id,
+            "dedupe_key": dedupe_key,
+            "payload": json.dumps(payload, separators=(",", ":")),
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "next_attempt_at": now,
+        }
+    if events:
+        db.execute(insert(OutboxEvent), list(events.values()))
+    return len(events)
+
+
+class LogSink:
+    """Appends one JSON line per event to a local file"""
+    name = "log"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def deliver(self, events: List[dict]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class WebhookSink:
+    """POSTs {"events": [...]} as JSON; any non-2xx answer fails the batch"""
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = OUTBOX_WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, events: List[dict]):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"events": events}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"webhook answered {e.code}") from e
+
+
+def configured_sinks() -> list:
+    sinks = []
+    if OUTBOX_LOG_PATH:
+        sinks.append(LogSink(OUTBOX_LOG_PATH))
+    if OUTBOX_WEBHOOK_URL:
+        sinks.append(WebhookSink(OUTBOX_WEBHOOK_URL))
+    return sinks
+
+
+class OutboxWorker:
+    """Delivers pending outbox events; run_once() handles one batch"""
+
+    def __init__(self, session_factory: Callable[[], Session], sinks: list,
+                 batch_size: int = OUTBOX_BATCH_SIZE, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 retry_seconds: float = OUTBOX_RETRY_SECONDS):
+        self.session_factory = session_factory
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _claim(self, db: Session, now: datetime) -> List[OutboxEvent]:
+        stmt = (
+            select(OutboxEvent)
+            .where(OutboxEvent.status == "pending", OutboxEvent.next_attempt_at <= now)
+            .order_by(OutboxEvent.next_attempt_at, OutboxEvent.id)
+            .limit(self.batch_size)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            stmt = stmt.with_for_update(skip_locked=True)
+        return db.scalars(stmt).all()
+
+    def run_once(self, now: Optional[datetime] = None) -> dict:
+        """Deliver one batch; returns counts of delivered, superseded, retried and failed events"""
+        now = now or datetime.utcnow()
+        result = {"delivered": 0, "superseded": 0, "retried": 0, "failed": 0}
+        db = self.session_factory()
+        try:
+            events = self._claim(db, now)
+            if not events:
+                return result
+            newest = {}
+            for event in sorted(events, key=lambda e: e.id):
+                newest[event.product_id] = event
+            batch = sorted(newest.values(), key=lambda e: e.id)
+            for event in events:
+                if newest[event.product_id] is not event:
+                    event.status = "superseded"
+                    event.delivered_at = now
+                    result["superseded"] += 1
+
+            try:
+                bodies = [{"id": e.id, "dedupe_key": e.dedupe_key, **json.loads(e.payload)} for e in batch]
+                for sink in self.sinks:
+                    sink.deliver(bodies)
+            except Exception as e:
+                for event in batch:
+                    event.attempts += 1
+                    event.last_error = f"{type(e).__name__}: {e}"[:1000]
+                    if event.attempts >= self.max_attempts:
+                        event.status = "failed"
+                        result["failed"] += 1
+                    else:
+                        event.next_attempt_at = now + timedelta(seconds=self.retry_seconds * 2 ** (event.attempts - 1))
+                        result["retried"] += 1
+            else:
+                for event in batch:
+                    event.status = "delivered"
+                    event.delivered_at = now
+                    event.attempts += 1
+                result["delivered"] = len(batch)
+            db.commit()
+            return result
+        finally:
+            db.close()
+
+    def run_forever(self, interval: float = OUTBOX_POLL_INTERVAL):
+        while not self._stop.is_set():
+            try:
+                result = self.run_once()
+            except Exception as e:
+                print(f"Outbox worker error: {e}")
+                result = {}
+            # Keep draining while batches come back full
+            if result.get("delivered", 0) + result.get("superseded", 0) < self.batch_size:
+                self._stop.wait(interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def outbox_stats(db: Session) -> dict:
+    counts = dict(db.execute(select(OutboxEvent.status, func.count()).group_by(OutboxEvent.status)).all())
+    oldest = db.scalar(select(func.min(OutboxEvent.created_at)).where(OutboxEvent.status == "pending"))
+    return {
+        "counts": counts,
+        "oldest_pending_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else None,
+        "sinks": [sink.name for sink in configured_sinks()],
+    }
@@ -0,0 +1,44 @@
+"""
+Deliver queued low-stock alerts outside the API process
+
+This is the normal way to deliver alerts: run one of these next to the API
+(the Procfile's `worker`), or drain the queue once. Set OUTBOX_LOG_PATH
+and/or OUTBOX_WEBHOOK_URL first.
+
+Usage:
+    python outbox_worker.py
+    python outbox_worker.py --once
+"""
+import argparse
+from database import SessionLocal
+from outbox import OUTBOX_POLL_INTERVAL, OutboxWorker, configured_sinks
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deliver low-stock alerts from the outbox")
+    parser.add_argument("--once", action="store_true", help="Deliver pending events and exit")
+    parser.add_argument("--interval", type=float, default=OUTBOX_POLL_INTERVAL, help="Seconds between polls")
+    args = parser.parse_args(argv)
+
+    sinks = configured_sinks()
+    if not sinks:
+        parser.error("No sinks configured; set OUTBOX_WEBHOOK_URL and/or OUTBOX_LOG_PATH")
+    worker = OutboxWorker(SessionLocal, sinks)
+    if not args.once:
+        print(f"✓ Delivering to {', '.join(sink.name for sink in sinks)}; Ctrl+C to stop")
+        try:
+            worker.run_forever(args.interval)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    totals = dict.fromkeys(("delivered", "superseded", "retried", "failed"), 0)
+    while True:
+        result = worker.run_once()
+        for name, count in result.items():
+            totals[name] = totals.get(name, 0) + count
+        if not any(result.values()) or result["retried"] or result["failed"]:
+            break
+    print("✓ " + ", ".join(f"{count} {name}" for name, count in totals.items()))
+
+if __name__ == "__main__":
+    main()
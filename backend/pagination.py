@@ -0,0 +1,129 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, false, or_
+from models import InventoryHistory
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Inventory history is always listed newest first, with the id as tie-breaker
+HISTORY_SORT = "-created_at"
+HISTORY_KEY = [InventoryHistory.created_at, InventoryHistory.id]
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    """Encode the sort spec and the last row's key values into an opaque cursor"""
+    payload = {
+        "s": sort,
+        "k": [v.isoformat() if isinstance(v, datetime) else v for v in values],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, columns: list) -> list:
+    """Decode a cursor produced by encode_cursor for the same sort spec"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload["s"] != sort or len(payload["k"]) != len(columns):
+            raise ValueError("cursor does not match sort")
+        values = []
+        for column, value in zip(columns, payload["k"]):
+            if value is not None and column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            values.append(value)
+        return values
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _nullable(column) -> bool:
+    return getattr(getattr(column, "expression", column), "nullable", False)
+
+
+def _after(column, value, descending: bool):
+    """Rows strictly after `value` in `column`'s order, NULL sorting above every value"""
+    if value is None:
+        return column.is_not(None) if descending else false()
+    step = column < value if descending else column > value
+    if _nullable(column) and not descending:
+        return or_(step, column.is_(None))
+    return step
+
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def keyset_condition(columns: list, values: list, descending: bool):
+    """Build the row-value comparison `(c1, c2, ...) > (v1, v2, ...)` portably"""
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        step = _after(column, value, descending)
+        equal = [_equal(c, v) for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal, step) if equal else step)
+    return or_(*clauses)
+
+
+def order_by(columns: list, descending: bool) -> list:
+    """ORDER BY terms matching keyset_condition: NULLs last ascending, first descending"""
+    terms = []
+    for column in columns:
+        term = column.desc() if descending else column.asc()
+        if _nullable(column):
+            # PostgreSQL's default, spelled out so SQLite sorts NULLs the same way
+            term = term.nulls_first() if descending else term.nulls_last()
+        terms.append(term)
+    return terms
+
+
+def parse_sort(sort: str, fields: dict) -> Tuple[str, bool]:
+    """Split `-field` / `field` into (field, descending) and validate it"""
+    descending = sort.startswith("-")
+    field = sort[1:] if descending else sort
+    if field not in fields:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sort field. Allowed: {', '.join(sorted(fields))}"
+        )
+    return field, descending
+
+
+def page_statement(stmt, sort: str, columns: list, descending: bool, limit: int, cursor: Optional[str] = None):
+    """
+    Apply keyset pagination to a select() ordered by `columns`.
+
+    The last column must be unique (normally the primary key) so that the
+    ordering is total. One extra row is fetched to detect a following page;
+    pass the rows to split_page().
+    """
+    if cursor:
+        values = decode_cursor(cursor, sort, columns)
+        stmt = stmt.where(keyset_condition(columns, values, descending))
+
+    return stmt.order_by(*order_by(columns, descending)).limit(limit + 1)
+
+
+def split_page(rows: List, sort: str, columns: list, limit: int,
+               key: Optional[Callable] = None) -> Tuple[List, Optional[str]]:
+    """
+    Drop the look-ahead row and return (rows, next_cursor); None on the last page.
+
+    `key` extracts the sort values from a row; by default they are read as
+    attributes named after the columns.
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        values = key(last) if key else [getattr(last, c.key) for c in columns]
+        next_cursor = encode_cursor(sort, values)
+    return rows, next_cursor
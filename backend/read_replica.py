@@ -0,0 +1,177 @@
+"""
+Read-replica routing for read-only routes
+
+With DATABASE_REPLICA_URL set, GET routes in routes/products.py and
+routes/reports.py take their session from get_async_read_db (database.py).
+That session is on the replica, except in two cases, when it is on the
+primary:
+
+* The client wrote recently. A successful POST/PUT/PATCH/DELETE makes the
+  client (the user named by its bearer token, else its Authorization
+  header) sticky to the primary for REPLICA_STICKY_SECONDS, so it reads its
+  own writes despite replication lag.
+* The replica is unavailable. When a replica connection can't be opened,
+  reads go to the primary. The replica is tried again after
+  REPLICA_RETRY_SECONDS.
+
+Catalog ETags are read through the same session as the data, so a lagging
+replica can't produce a body older than its ETag. Stickiness is tracked
+per process. With several workers, a client whose next request lands on
+another worker may read from the replica during the sticky window.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request
+from jose import JWTError, jwt
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+REPLICA_STICKY_CLIENTS = int(os.getenv("REPLICA_STICKY_CLIENTS", "10000"))
+# Seconds to wait for a replica connection before falling back (PostgreSQL)
+REPLICA_CONNECT_TIMEOUT = float(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+REPLICA_ERRORS = (DBAPIError, PoolTimeoutError, OSError, asyncio.TimeoutError)
+
+
+def client_key(headers: Headers) -> Optional[str]:
+    """The user behind a bearer token, so stickiness survives token refreshes"""
+    authorization = headers.get("authorization")
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer":
+        # Unverified on purpose: a forged subject can only send reads to the primary
+        try:
+            subject = jwt.get_unverified_claims(token).get("sub")
+        except JWTError:
+            subject = None
+        if subject:
+            return f"user:{subject}"
+    return hashlib.sha1(authorization.encode("utf-8")).hexdigest()
+
+
+class ReplicaRouter:
+    """Decides, per request, whether reads may go to the replica"""
+
+    def __init__(self, session_factory=None, sticky_seconds: float = REPLICA_STICKY_SECONDS,
+                 retry_seconds: float = REPLICA_RETRY_SECONDS, max_clients: int = REPLICA_STICKY_CLIENTS,
+                 clock=time.monotonic):
+        self.session_factory = session_factory
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self.max_clients = max_clients
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sticky = OrderedDict()
+        self._down_until = 0.0
+        self.last_error: Optional[str] = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.session_factory is not None
+
+    def mark_write(self, key: Optional[str]):
+        if key is None or not self.enabled or self.sticky_seconds <= 0:
+            return
+        with self._lock:
+            self._sticky[key] = self.clock() + self.sticky_seconds
+            self._sticky.move_to_end(key)
+            while len(self._sticky) > self.max_clients:
+                self._sticky.popitem(last=False)
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        if key is None:
+            return False
+        with self._lock:
+            until = self._sticky.get(key)
+            if until is None:
+                return False
+            if until <= self.clock():
+                del self._sticky[key]
+                return False
+            return True
+
+    def replica_available(self) -> bool:
+        with self._lock:
+            return self._down_until <= self.clock()
+
+    def mark_down(self, error: Exception):
+        with self._lock:
+            self._down_until = self.clock() + self.retry_seconds
+            self.last_error = f"{type(error).__name__}: {error}"[:500]
+            self.fallbacks += 1
+
+    async def open_replica_session(self, headers: Headers):
+        """A replica session with a live connection, or None when the primary must serve"""
+        if not self.enabled or self.is_sticky(client_key(headers)) or not self.replica_available():
+            self.primary_reads += 1
+            return None
+        db = self.session_factory()
+        try:
+            await db.connection()
+        except REPLICA_ERRORS as e:
+            await db.close()
+            self.mark_down(e)
+            self.primary_reads += 1
+            return None
+        self.replica_reads += 1
+        return db
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self.clock()
+            return {
+                "enabled": self.enabled,
+                "replica_available": self._down_until <= now,
+                "retry_in_seconds": max(self._down_until - now, 0.0),
+                "last_error": self.last_error,
+                "sticky_clients": sum(1 for until in self._sticky.values() if until > now),
+                "replica_reads": self.replica_reads,
+                "primary_reads": self.primary_reads,
+                "fallbacks": self.fallbacks,
+            }
+
+
+def read_session_dependency(primary_factory, router: ReplicaRouter):
+    """FastAPI dependency yielding a replica session when allowed, else a primary one"""
+    async def get_read_db(request: Request):
+        db = await router.open_replica_session(request.headers)
+        if db is None:
+            db = primary_factory()
+        async with db:
+            yield db
+
+    return get_read_db
+
+
+class ReadYourWritesMiddleware:
+    """Makes clients sticky to the primary after a successful write"""
+
+    def __init__(self, app: ASGIApp, router: ReplicaRouter):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not self.router.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marking(message: Message):
+            # Routes commit before responding, so the write is visible by now
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                self.router.mark_write(client_key(Headers(scope=scope)))
+            await send(message)
+
+        await self.app(scope, receive, send_marking)
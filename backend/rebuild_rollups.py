@@ -0,0 +1,19 @@
+"""
+Recompute the category rollup table from products (drift repair)
+"""
+from changes import bump_catalog_version
+from database import SessionLocal
+from rollup import rebuild_rollups
+
+def rebuild():
+    db = SessionLocal()
+    try:
+        categories = rebuild_rollups(db)
+        bump_catalog_version(db)
+        db.commit()
+        print(f"✓ Rebuilt rollups for {categories} categories")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild()
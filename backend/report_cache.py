@@ -0,0 +1,205 @@
+"""
+Result cache for report endpoints
+
+Entries are keyed by endpoint, catalog version and query string, so a
+product write makes every older entry unreachable at once; the in-process
+backend additionally drops them when the write commits (see changes.py).
+TTLs bound how stale time-dependent reports (recent activity) can get and
+how long unreachable entries linger in a shared backend.
+
+Backends:
+* memory (default): per-process LRU with per-entry expiry
+* redis: any Redis-compatible server (Redis, Valkey, KeyDB, a local
+  stand-in), shared by all workers; needs the optional `redis` package
+* none: caching disabled
+
+Backend errors are counted and treated as misses, so a cache outage only
+costs the recomputation.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional, Tuple
+import orjson
+
+try:
+    import redis
+except ImportError:  # optional: pip install redis
+    redis = None
+
+REPORT_CACHE_BACKEND = os.getenv("REPORT_CACHE_BACKEND", "memory")
+REPORT_CACHE_URL = os.getenv("REPORT_CACHE_URL", "redis://localhost:6379/0")
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+
+# Seconds each report may be served from cache; override with e.g.
+# REPORT_CACHE_TTLS="low-stock=30,recent-activity=10"
+DEFAULT_TTLS = {
+    "category-stats": 300,
+    "low-stock": 120,
+    "recent-activity": 30,
+    "stock-movements": 300,
+}
+
+
+def parse_ttls(value: str) -> Dict[str, float]:
+    ttls = dict(DEFAULT_TTLS)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, seconds = item.partition("=")
+        ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+class MemoryBackend:
+    """Thread-safe LRU of byte strings with per-entry expiry"""
+    local = True
+
+    def __init__(self, maxsize: int, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class RedisBackend:
+    """Shared backend for any server speaking the Redis protocol"""
+    local = False
+
+    def __init__(self, url: str, prefix: str = "inventory:report:"):
+        if redis is None:
+            raise RuntimeError("REPORT_CACHE_BACKEND=redis requires the 'redis' package")
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*", count=500):
+            self.client.delete(key)
+
+    def size(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=500))
+
+
+class ReportCache:
+    """Report results keyed by (endpoint, catalog version, query) with hit counters"""
+
+    def __init__(self, backend, ttls: Dict[str, float]):
+        self.backend = backend
+        self.ttls = ttls
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {"hits": 0, "misses": 0, "errors": 0})
+
+    @staticmethod
+    def key(endpoint: str, version: int, query: str) -> str:
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+        return f"{endpoint}:{version}:{digest}"
+
+    def _count(self, endpoint: str, counter: str):
+        with self._lock:
+            self._counters[endpoint][counter] += 1
+
+    def get(self, endpoint: str, key: str) -> Optional[bytes]:
+        if self.backend is None or self.ttls.get(endpoint, 0) <= 0:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            self._count(endpoint, "errors")
+            value = None
+        self._count(endpoint, "hits" if value is not None else "misses")
+        return value
+
+    def set(self, endpoint: str, key: str, value: bytes):
+        ttl = self.ttls.get(endpoint, 0)
+        if self.backend is None or ttl <= 0:
+            return
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception:
+            self._count(endpoint, "errors")
+
+    def invalidate(self):
+        """Drop entries after a catalog write; shared backends rely on the versioned keys"""
+        if self.backend is not None and self.backend.local:
+            self.backend.clear()
+
+    def clear(self):
+        if self.backend is not None:
+            try:
+                self.backend.clear()
+            except Exception:
+                pass
+        with self._lock:
+            self._counters.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            endpoints = {}
+            for name, counters in self._counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                endpoints[name] = {**counters, "hit_rate": counters["hits"] / lookups if lookups else 0.0}
+        try:
+            size = self.backend.size() if self.backend is not None else 0
+        except Exception:
+            size = None
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "size": size,
+            "ttl_seconds": self.ttls,
+            "endpoints": endpoints,
+        }
+
+
+def pack(body: bytes, headers: Dict[str, str]) -> bytes:
+    """Serialize a response body and the headers that belong to it into one value"""
+    return orjson.dumps(headers) + b"\n" + body
+
+
+def unpack(value: bytes) -> Tuple[bytes, Dict[str, str]]:
+    headers, _, body = value.partition(b"\n")
+    return body, orjson.loads(headers)
+
+
+def create_backend(name: str):
+    if name == "memory":
+        return MemoryBackend(REPORT_CACHE_SIZE)
+    if name == "redis":
+        return RedisBackend(REPORT_CACHE_URL)
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown REPORT_CACHE_BACKEND: {name}")
+
+
+report_cache = ReportCache(create_backend(REPORT_CACHE_BACKEND), parse_ttls(os.getenv("REPORT_CACHE_TTLS", "")))
@@ -0,0 +1,202 @@
+"""
+Inventory history retention: daily compaction and compressed archival
+
+Raw history older than the retention window is processed oldest first in
+bounded batches. For each batch:
+
+1. the raw rows are appended to monthly gzip NDJSON archive files
+   (`history-YYYY-MM.ndjson.gz`, one gzip member per batch) and fsynced;
+2. one short transaction adds the rows to the per-product daily totals in
+   `inventory_history_daily` and deletes them from `inventory_history`.
+
+Archives are written before the delete commits, so a crash can leave a batch
+archived twice but never lose it. Both copies land in the same month's file,
+where read_archive() drops the duplicates by id.
+"""
+import gzip
+import json
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from exports import HISTORY_COLUMNS, encode_batch
+from models import InventoryHistory, InventoryHistoryDaily
+
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "365"))
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "history_archive")
+DEFAULT_BATCH_SIZE = 5000
+
+
+@dataclass
+class RetentionReport:
+    cutoff: datetime
+    batches: int = 0
+    archived: int = 0
+    daily_rows: int = 0
+    files: List[str] = field(default_factory=list)
+
+
+def archive_path(directory: str, month: str) -> str:
+    return os.path.join(directory, f"history-{month}.ndjson.gz")
+
+
+def _append_archive(directory: str, rows: list) -> List[str]:
+    by_month: Dict[str, list] = defaultdict(list)
+    for row in rows:
+        by_month[row.created_at.strftime("%Y-%m")].append(row)
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for month, month_rows in sorted(by_month.items()):
+        path = archive_path(directory, month)
+        # Appending a new gzip member keeps existing data untouched
+        with open(path, "ab") as f:
+            f.write(gzip.compress(encode_batch("ndjson", HISTORY_COLUMNS, month_rows).encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+        paths.append(path)
+    return paths
+
+
+def _daily_totals(rows: list) -> Dict[Tuple[int, date, str], List[int]]:
+    totals: Dict[Tuple[int, date, str], List[int]] = defaultdict(lambda: [0, 0])
+    for row in rows:
+        key = (row.product_id, row.created_at.date(), row.action)
+        totals[key][0] += 1
+        totals[key][1] += row.quantity_change or 0
+    return totals
+
+
+def _add_daily(db: Session, totals: Dict[Tuple[int, date, str], List[int]]):
+    """Add a batch's totals to the daily rows, creating rows as needed"""
+    rows = [dict(product_id=product_id, day=day, action=action, events=events, quantity_change=quantity_change)
+            for (product_id, day, action), (events, quantity_change) in sorted(totals.items())]
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        # One executemany for the whole batch, rather than one statement per key
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(InventoryHistoryDaily)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[InventoryHistoryDaily.product_id, InventoryHistoryDaily.day, InventoryHistoryDaily.action],
+            set_={
+                "events": InventoryHistoryDaily.events + stmt.excluded.events,
+                "quantity_change": InventoryHistoryDaily.quantity_change + stmt.excluded.quantity_change,
+            },
+        )
+        db.execute(stmt, rows)
+        return
+
+    for values in rows:
+        result = db.execute(
+            update(InventoryHistoryDaily)
+            .where(
+                InventoryHistoryDaily.product_id == values["product_id"],
+                InventoryHistoryDaily.day == values["day"],
+                InventoryHistoryDaily.action == values["action"],
+            )
+            .values(
+                events=InventoryHistoryDaily.events + values["events"],
+                quantity_change=InventoryHistoryDaily.quantity_change + values["quantity_change"],
+            )
+        )
+        if result.rowcount == 0:
+            db.execute(insert(InventoryHistoryDaily).values(**values))
+
+
+def compact_history(db: Session, days: int = HISTORY_RETENTION_DAYS, archive_dir: str = HISTORY_ARCHIVE_DIR,
+                    batch_size: int = DEFAULT_BATCH_SIZE, max_batches: Optional[int] = None,
+                    now: Optional[datetime] = None) -> RetentionReport:
+    """
+    Archive and compact history rows older than `days`.
+
+    Each batch commits on its own, so locks are held for one batch at a time
+    and the job can be stopped and resumed at any point.
+    """
+    report = RetentionReport(cutoff=(now or datetime.utcnow()) - timedelta(days=days))
+    files = set()
+    # Oldest first, served by ix_inventory_history_created_id
+    stmt = (
+        select(*HISTORY_COLUMNS)
+        .where(InventoryHistory.created_at < report.cutoff)
+        .order_by(InventoryHistory.created_at, InventoryHistory.id)
+        .limit(batch_size)
+    )
+
+    while max_batches is None or report.batches < max_batches:
+        rows = db.execute(stmt).all()
+        if not rows:
+            break
+        files.update(_append_archive(archive_dir, rows))
+
+        totals = _daily_totals(rows)
+        _add_daily(db, totals)
+        db.execute(
+            delete(InventoryHistory)
+            .where(InventoryHistory.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+        report.batches += 1
+        report.archived += len(rows)
+        report.daily_rows += len(totals)
+
+    db.rollback()
+    report.files = sorted(files)
+    return report
+
+
+def _month_range(since: Optional[datetime], until: Optional[datetime]):
+    return (since.strftime("%Y-%m") if since else None, until.strftime("%Y-%m") if until else None)
+
+
+def read_archive(archive_dir: str = HISTORY_ARCHIVE_DIR, product_id: Optional[int] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 action: Optional[str] = None) -> Iterator[dict]:
+    """Stream archived history rows matching the filters, oldest month first"""
+    if not os.path.isdir(archive_dir):
+        return
+    first, last = _month_range(since, until)
+    for name in sorted(os.listdir(archive_dir)):
+        if not (name.startswith("history-") and name.endswith(".ndjson.gz")):
+            continue
+        month = name[len("history-"):-len(".ndjson.gz")]
+        if (first and month < first) or (last and month > last):
+            continue
+        # A row is only ever archived into its own month's file, so duplicates
+        # can be dropped per file; memory stays bounded by one month
+        seen = set()
+        with gzip.open(os.path.join(archive_dir, name), "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                if row["id"] in seen:
+                    continue
+                seen.add(row["id"])
+                if product_id is not None and row["product_id"] != product_id:
+                    continue
+                if action is not None and row["action"] != action:
+                    continue
+                created_at = datetime.fromisoformat(row["created_at"])
+                if (since and created_at < since) or (until and created_at >= until):
+                    continue
+                yield row
+
+
+def read_daily(db: Session, product_id: Optional[int] = None, since: Optional[date] = None,
+               until: Optional[date] = None) -> list:
+    """Daily totals for compacted history, oldest day first"""
+    stmt = select(InventoryHistoryDaily).order_by(
+        InventoryHistoryDaily.day, InventoryHistoryDaily.product_id, InventoryHistoryDaily.action
+    )
+    if product_id is not None:
+        stmt = stmt.where(InventoryHistoryDaily.product_id == product_id)
+    if since is not None:
+        stmt = stmt.where(InventoryHistoryDaily.day >= since)
+    if until is not None:
+        stmt = stmt.where(InventoryHistoryDaily.day < until)
+    return db.execute(stmt).scalars().all()
@@ -0,0 +1,191 @@
+"""
+Incrementally maintained per-category inventory rollups
+
+Every product write passes the product's state before and after the change
+to apply_product_changes() (through changes.record_product_changes()) inside
+its own transaction, so the rollup rows are
+committed (or rolled back) together with the products they describe. The
+dashboards then read O(categories) rollup rows instead of scanning products.
+
+total_value is kept to VALUE_PLACES decimals: each product's contribution
+and every running total is rounded, so repeated deltas can't drift away from
+what rebuild_rollups() would compute.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from sqlalchemy import Numeric, and_, case, cast, delete, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import Product, CategoryRollup
+
+ROLLUP_FIELDS = ("product_count", "total_value", "low_stock_count", "out_of_stock_count")
+VALUE_PLACES = 4
+_EXACT = Numeric(asdecimal=False)
+
+
+class ProductState(NamedTuple):
+    category: Optional[str]
+    price: float
+    quantity: int
+    min_stock_level: int
+    # Identity, for side effects that name the product (outbox events)
+    product_id: Optional[int] = None
+    sku: Optional[str] = None
+
+
+def product_state(product) -> ProductState:
+    """Capture the rollup-relevant fields of a Product (or any object with them)"""
+    return ProductState(
+        category=product.category,
+        price=product.price or 0.0,
+        quantity=product.quantity or 0,
+        min_stock_level=product.min_stock_level or 0,
+        product_id=getattr(product, "id", None),
+        sku=getattr(product, "sku", None),
+    )
+
+
+def _rollup_key(category: Optional[str]) -> Tuple[str, bool]:
+    """(category, null_category) of the rollup row a product counts towards"""
+    return category or "", category is None
+
+
+def _contribution(state: ProductState) -> Tuple[int, float, int, int]:
+    low = 1 if 0 < state.quantity <= state.min_stock_level else 0
+    out = 1 if state.quantity == 0 else 0
+    return 1, round(state.price * state.quantity, VALUE_PLACES), low, out
+
+
+def _added(column, delta):
+    """`column + delta`, rounded for total_value so float error can't accumulate"""
+    if column.key != "total_value":
+        return column + delta
+    return func.round(cast(column + delta, _EXACT), VALUE_PLACES)
+
+
+def _upsert(db: Session, deltas: Dict[Tuple[str, bool], list]):
+    """Add `deltas` to their categories' rollup rows, creating rows as needed"""
+    now = datetime.utcnow()
+    rows = [dict(zip(ROLLUP_FIELDS, delta), category=category, null_category=null_category, updated_at=now)
+            for (category, null_category), delta in sorted(deltas.items())]
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        # One executemany for all categories, rather than one statement each
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(CategoryRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CategoryRollup.category, CategoryRollup.null_category],
+            set_={
+                **{f: _added(getattr(CategoryRollup, f), getattr(stmt.excluded, f)) for f in ROLLUP_FIELDS},
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        db.execute(stmt, rows)
+        return
+
+    for values in rows:
+        result = db.execute(
+            update(CategoryRollup)
+            .where(
+                CategoryRollup.category == values["category"],
+                CategoryRollup.null_category == values["null_category"],
+            )
+            .values(
+                **{f: _added(getattr(CategoryRollup, f), values[f]) for f in ROLLUP_FIELDS},
+                updated_at=values["updated_at"],
+            )
+        )
+        if result.rowcount == 0:
+            db.execute(insert(CategoryRollup).values(**values))
+
+
+def apply_product_changes(db: Session, changes: Iterable[Tuple[Optional[ProductState], Optional[ProductState]]]):
+    """
+    Fold (before, after) product states into the rollup table.
+
+    `before` is None for a newly created product and `after` is None for a
+    deleted one. Deltas are summed per category first so each category is
+    touched once, in sorted order to keep lock ordering consistent, and all
+    categories are written with a single executemany.
+    """
+    deltas: Dict[Tuple[str, bool], list] = defaultdict(lambda: [0, 0.0, 0, 0])
+    for before, after in changes:
+        if before is not None:
+            for i, value in enumerate(_contribution(before)):
+                deltas[_rollup_key(before.category)][i] -= value
+        if after is not None:
+            for i, value in enumerate(_contribution(after)):
+                deltas[_rollup_key(after.category)][i] += value
+
+    changed = {key: delta for key, delta in deltas.items() if any(delta)}
+    if changed:
+        _upsert(db, changed)
+
+
+def category_aggregates():
+    """SELECT computing rollup rows straight from the products table"""
+    # NULL numbers count as 0, the same as _contribution() on the incremental path
+    category = func.coalesce(Product.category, "")
+    null_category = Product.category.is_(None)
+    price = func.coalesce(Product.price, 0)
+    quantity = func.coalesce(Product.quantity, 0)
+    min_stock_level = func.coalesce(Product.min_stock_level, 0)
+    value = func.round(cast(price * quantity, _EXACT), VALUE_PLACES)
+    is_low_stock = and_(quantity <= min_stock_level, quantity > 0)
+    return select(
+        category.label("category"),
+        null_category.label("null_category"),
+        func.count(Product.id).label("product_count"),
+        func.coalesce(func.sum(value), 0).label("total_value"),
+        func.coalesce(func.sum(case((is_low_stock, 1), else_=0)), 0).label("low_stock_count"),
+        func.coalesce(func.sum(case((quantity == 0, 1), else_=0)), 0).label("out_of_stock_count"),
+    ).group_by(category, null_category)
+
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Recompute every rollup row from products to repair drift.
+
+    On PostgreSQL the rollup table is locked first, so concurrent writers
+    either commit before the recount (and are included in it) or wait and
+    apply their deltas on top of it. The caller commits, which releases the
+    lock, so anything that must change with the recount (such as the catalog
+    version) lands in the same transaction.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE category_rollups IN EXCLUSIVE MODE"))
+    db.execute(delete(CategoryRollup))
+    now = datetime.utcnow()
+    rows = [{**row._asdict(), "updated_at": now} for row in db.execute(category_aggregates())]
+    if rows:
+        db.execute(insert(CategoryRollup), rows)
+    return len(rows)
+
+
+def read_stats(db: Session) -> dict:
+    """Catalog-wide totals summed over the rollup rows"""
+    row = db.execute(select(
+        func.coalesce(func.sum(CategoryRollup.product_count), 0).label("total_products"),
+        func.coalesce(func.sum(CategoryRollup.total_value), 0).label("total_value"),
+        func.coalesce(func.sum(CategoryRollup.low_stock_count), 0).label("low_stock_items"),
+        func.coalesce(func.sum(CategoryRollup.out_of_stock_count), 0).label("out_of_stock_items"),
+        func.count(CategoryRollup.category).label("total_categories"),
+    ).where(CategoryRollup.product_count > 0)).one()
+    return {
+        "total_products": row.total_products,
+        "total_value": float(row.total_value),
+        "low_stock_items": row.low_stock_items,
+        "out_of_stock_items": row.out_of_stock_items,
+        "total_categories": row.total_categories,
+    }
+
+
+def read_category_stats(db: Session) -> list:
+    """Per-category rows for categories that currently hold products"""
+    return db.execute(
+        select(CategoryRollup)
+        .where(CategoryRollup.product_count > 0)
+        .order_by(CategoryRollup.category, CategoryRollup.null_category)
+    ).scalars().all()
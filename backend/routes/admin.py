@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engine, async_engine, replica_async_engine, replica_router, get_async_db, pool_status
+from auth import CachedUser, require_admin, password_hasher
+from report_cache import report_cache
+from outbox import outbox_stats
+from live_feed import change_broker
+from slow_queries import slow_query_log
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+@router.get("/pool")
+async def get_pool_status(current_user: CachedUser = Depends(require_admin)):
+    return {
+        "async": pool_status(async_engine.sync_engine),
+        "sync": pool_status(engine),
+        "replica": pool_status(replica_async_engine.sync_engine) if replica_async_engine is not None else None,
+    }
+
+@router.get("/password-hasher")
+async def get_password_hasher_status(current_user: CachedUser = Depends(require_admin)):
+    return password_hasher.stats()
+
+@router.get("/report-cache")
+async def get_report_cache_status(current_user: CachedUser = Depends(require_admin)):
+    return report_cache.stats()
+
+@router.get("/outbox")
+async def get_outbox_status(db: AsyncSession = Depends(get_async_db), current_user: CachedUser = Depends(require_admin)):
+    return await db.run_sync(outbox_stats)
+
+@router.get("/live-feed")
+async def get_live_feed_status(current_user: CachedUser = Depends(require_admin)):
+    return change_broker.stats()
+
+@router.get("/replica")
+async def get_replica_status(current_user: CachedUser = Depends(require_admin)):
+    return replica_router.stats()
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    sort: Literal["total_ms", "max_ms", "count"] = "total_ms",
+    current_user: CachedUser = Depends(require_admin)
+):
+    """Slowest statements since startup (or the last reset), aggregated by normalized text"""
+    return slow_query_log.stats(limit, sort)
+
+@router.delete("/slow-queries")
+async def reset_slow_queries(current_user: CachedUser = Depends(require_admin)):
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
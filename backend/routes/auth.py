@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
-from database import get_db
+from database import get_async_db
 from models import User
-from auth import get_password_hash, verify_password, create_access_token, get_current_user
+from auth import (
+    get_password_hash_async, verify_password_async, password_needs_rehash,
+    create_access_token, get_current_user, require_admin, user_cache, password_hasher, CachedUser
+)
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
@@ -32,17 +36,18 @@ class TokenResponse(BaseModel):
     user: UserResponse
 
 @router.post("/register", response_model=UserResponse)
-def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_async_db)):
     # Check if username exists
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User).where(User.username == user_data.username)):
         raise HTTPException(status_code=400, detail="Username already registered")
     
     # Check if email exists
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User).where(User.email == user_data.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    # Create new user; release the connection while bcrypt runs
+    await db.rollback()
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -51,16 +56,21 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return new_user
 
 @router.post("/login", response_model=TokenResponse)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == user_data.username).first()
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.username == user_data.username))
+    # Hand the connection back to the pool while bcrypt runs; detach the user
+    # first so the rollback doesn't expire its loaded attributes
+    if user:
+        db.expunge(user)
+    await db.rollback()
     
-    if not user or not verify_password(user_data.password, user.password):
+    if not user or not await verify_password_async(user_data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -69,6 +79,17 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
     if not user.is_active:
         raise HTTPException(status_code=400, detail="User account is inactive")
     
+    # Upgrade hashes made with an old cost factor while we have the plaintext.
+    # Best effort: skipped when the hasher is busy, and a later login retries
+    if password_needs_rehash(user.password) and password_hasher.has_idle_worker():
+        try:
+            new_hash = await get_password_hash_async(user_data.password)
+        except HTTPException:
+            new_hash = None
+        if new_hash:
+            await db.execute(update(User).where(User.id == user.id).values(password=new_hash))
+            await db.commit()
+    
     access_token = create_access_token(data={"sub": user.username, "role": user.role})
     
     return {
@@ -78,5 +99,9 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: CachedUser = Depends(get_current_user)):
     return current_user
+
+@router.get("/cache-stats")
+async def get_user_cache_stats(current_user: CachedUser = Depends(require_admin)):
+    return user_cache.stats()
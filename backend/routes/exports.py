@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
+from datetime import datetime
+from database import get_async_db
+from auth import CachedUser, require_admin
+from exports import EXPORT_FORMATS, export_async
+
+router = APIRouter(prefix="/api/exports", tags=["exports"])
+
+def _streaming_export(db: AsyncSession, dataset: str, fmt: str, product_id: Optional[int] = None):
+    filename = f"{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    return StreamingResponse(
+        export_async(db, dataset, fmt, product_id),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/products")
+async def export_products(
+    format: Literal["csv", "ndjson"] = "csv",
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(require_admin)
+):
+    return _streaming_export(db, "products", format)
+
+@router.get("/history")
+async def export_history(
+    format: Literal["csv", "ndjson"] = "csv",
+    product_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(require_admin)
+):
+    return _streaming_export(db, "history", format, product_id)
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import get_async_db
+from auth import CachedUser, get_current_user_from_query
+from changes import read_catalog_version
+from live_feed import change_broker, event_stream
+
+router = APIRouter(prefix="/api/live", tags=["live"])
+
+@router.get("/products")
+async def product_feed(
+    request: Request,
+    last_event_id: Optional[int] = Query(None, description="Resume after this event; the Last-Event-ID header wins"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(get_current_user_from_query)
+):
+    """Server-Sent Events stream of product changes; authenticate with ?token="""
+    version, _ = await db.run_sync(read_catalog_version)
+    # The stream stays open for hours; don't hold a pooled connection meanwhile
+    await db.close()
+    
+    header = request.headers.get("last-event-id", "")
+    resume_from = int(header) if header.isdigit() else last_event_id
+    subscription, backlog = change_broker.subscribe(version if resume_from is None else resume_from, version)
+    return StreamingResponse(
+        event_stream(change_broker, subscription, backlog, version),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,14 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import csv
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
-from datetime import datetime
-from database import get_db
-from models import Product, InventoryHistory, User
-from auth import get_current_user, require_admin
+from datetime import date, datetime
+from database import get_async_db, get_async_read_db
+from models import Product, InventoryHistory
+from auth import CachedUser, get_current_user, require_admin
+from pagination import DEFAULT_PAGE_SIZE, HISTORY_KEY, HISTORY_SORT, MAX_PAGE_SIZE, page_statement, parse_sort, split_page
+from importer import DEFAULT_CHUNK_SIZE, ImportReport, import_products, read_csv
+from changes import record_product_changes
+from rollup import product_state
+from search import apply_search
+from retention import read_daily
+from conditional import catalog_etag
+from exports import HISTORY_COLUMNS, PRODUCT_COLUMNS
+from serialization import json_response, rows_response
+from stock import StockMovementReport, StockMovementRequest, apply_stock_movements
+from sync import read_changes
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
+# Sort keys clients may request; the product id is always appended as a tie-breaker
+SORT_FIELDS = {
+    "id": Product.id,
+    "name": Product.name,
+    "sku": Product.sku,
+    "price": Product.price,
+    "quantity": Product.quantity,
+    "created_at": Product.created_at,
+    "updated_at": Product.updated_at,
+}
+
 class ProductCreate(BaseModel):
     name: str
     sku: str
@@ -44,6 +69,16 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class DailyHistoryResponse(BaseModel):
+    product_id: int
+    day: date
+    action: str
+    events: int
+    quantity_change: int
+    
+    class Config:
+        from_attributes = True
+
 class HistoryResponse(BaseModel):
     id: int
     product_id: int
@@ -57,51 +92,122 @@ class HistoryResponse(BaseModel):
         from_attributes = True
 
 @router.get("/", response_model=List[ProductResponse])
-def get_products(
+async def get_products(
+    response: Response,
     search: Optional[str] = None,
     category: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    sort: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(get_current_user),
+    catalog_version: int = Depends(catalog_etag)
 ):
-    query = db.query(Product)
+    # Searches default to best-match order; "relevance" needs a search term
+    if sort is None:
+        sort = "relevance" if search else "id"
+    by_relevance = sort == "relevance"
+    if by_relevance and not search:
+        raise HTTPException(status_code=400, detail="Sorting by relevance requires a search term")
+    if not by_relevance:
+        field, descending = parse_sort(sort, SORT_FIELDS)
+    # Plain columns, not ORM instances; rows are encoded straight to JSON
+    query = select(*PRODUCT_COLUMNS)
     
     if search:
-        query = query.filter(Product.name.ilike(f"%{search}%"))
+        query, rank = apply_search(query, db.bind.dialect.name, search)
     if category:
-        query = query.filter(Product.category == category)
+        query = query.where(Product.category == category)
     if min_price is not None:
-        query = query.filter(Product.price >= min_price)
+        query = query.where(Product.price >= min_price)
     if max_price is not None:
-        query = query.filter(Product.price <= max_price)
+        query = query.where(Product.price <= max_price)
     
-    return query.all()
+    if include_total:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        response.headers["X-Total-Count"] = str(total)
+    
+    if by_relevance:
+        columns = [rank, Product.id]
+        page = page_statement(query.add_columns(rank), sort, columns, False, limit, cursor)
+        rows = (await db.execute(page)).all()
+        rows, next_cursor = split_page(rows, sort, columns, limit, key=lambda row: [row.search_rank, row.id])
+    else:
+        columns = [SORT_FIELDS[field]] if field == "id" else [SORT_FIELDS[field], Product.id]
+        page = page_statement(query, sort, columns, descending, limit, cursor)
+        rows = (await db.execute(page)).all()
+        rows, next_cursor = split_page(rows, sort, columns, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return rows_response(PRODUCT_COLUMNS, rows, response)
 
 @router.get("/categories", response_model=List[str])
-def get_categories(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    categories = db.query(Product.category).distinct().all()
+async def get_categories(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(get_current_user),
+    catalog_version: int = Depends(catalog_etag)
+):
+    categories = await db.execute(select(Product.category).distinct())
     return [cat[0] for cat in categories if cat[0]]
 
+class DeletedProduct(BaseModel):
+    id: int
+    sku: Optional[str] = None
+    row_version: int
+
+class SyncProduct(ProductResponse):
+    row_version: int
+
+class ProductChanges(BaseModel):
+    products: List[SyncProduct]
+    deleted: List[DeletedProduct]
+    cursor: str
+    has_more: bool
+
+@router.get("/changes", response_model=ProductChanges)
+async def get_product_changes(
+    response: Response,
+    cursor: Optional[str] = None,
+    since: Optional[int] = Query(None, ge=0, description="Catalog version to sync from, instead of a cursor"),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(get_current_user)
+):
+    """
+    Products created, updated or deleted after `cursor` (or `since`). Call
+    again with the returned cursor while `has_more`; without either
+    parameter the first calls return the whole catalog.
+    """
+    changes = await db.run_sync(read_changes, cursor, since, limit)
+    return json_response(orjson.dumps(changes), response)
+
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def get_product(
+    product_id: int,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(get_current_user),
+    catalog_version: int = Depends(catalog_etag)
+):
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
 @router.post("/", response_model=ProductResponse)
-def create_product(
+async def create_product(
     product: ProductCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(require_admin)
 ):
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.flush()
     
-    # Log history
+    # Log history and update rollups in the same transaction
     history = InventoryHistory(
         product_id=db_product.id,
         action="added",
@@ -110,31 +216,75 @@ def create_product(
         notes=f"Product added: {product.name}"
     )
     db.add(history)
-    db.commit()
+    await db.run_sync(record_product_changes, [(None, product_state(db_product))])
+    await db.commit()
+    await db.refresh(db_product)
     
     return db_product
 
+@router.post("/import", response_model=ImportReport)
+async def import_products_json(
+    products: List[dict],
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(require_admin)
+):
+    return await db.run_sync(import_products, products, current_user.username, chunk_size)
+
+@router.post("/import/csv", response_model=ImportReport)
+async def import_products_csv(
+    file: UploadFile = File(...),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(require_admin)
+):
+    try:
+        return await db.run_sync(import_products, read_csv(file.file), current_user.username, chunk_size)
+    except (UnicodeDecodeError, csv.Error) as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Could not read CSV: {e}")
+
+@router.post("/stock-movements", response_model=StockMovementReport)
+async def create_stock_movements(
+    request: StockMovementRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(require_admin)
+):
+    if not request.movements:
+        raise HTTPException(status_code=400, detail="No stock movements given")
+    report = await db.run_sync(
+        apply_stock_movements, request.movements, current_user.username, request.allow_negative
+    )
+    if report.errors:
+        # Nothing was applied; unknown SKUs take precedence over stock shortfalls
+        not_found = any(e.error == "Product not found" for e in report.errors)
+        raise HTTPException(
+            status_code=404 if not_found else 409,
+            detail=[e.dict() for e in report.errors]
+        )
+    return report
+
 @router.put("/{product_id}", response_model=ProductResponse)
-def update_product(
+async def update_product(
     product_id: int,
     product: ProductUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(require_admin)
 ):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.scalar(
+        select(Product).where(Product.id == product_id).with_for_update()
+    )
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     old_quantity = db_product.quantity
+    old_state = product_state(db_product)
     
     for key, value in product.dict(exclude_unset=True).items():
         setattr(db_product, key, value)
     
-    db.commit()
-    db.refresh(db_product)
-    
-    # Log history
-    quantity_change = db_product.quantity - old_quantity
+    # Log history and update rollups in the same transaction
+    quantity_change = (db_product.quantity or 0) - (old_quantity or 0)
     history = InventoryHistory(
         product_id=db_product.id,
         action="updated",
@@ -143,17 +293,21 @@ def update_product(
         notes=f"Product updated: {db_product.name}"
     )
     db.add(history)
-    db.commit()
+    await db.run_sync(record_product_changes, [(old_state, product_state(db_product))])
+    await db.commit()
+    await db.refresh(db_product)
     
     return db_product
 
 @router.delete("/{product_id}")
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CachedUser = Depends(require_admin)
 ):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = await db.scalar(
+        select(Product).where(Product.id == product_id).with_for_update()
+    )
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
@@ -166,19 +320,38 @@ def delete_product(
         notes=f"Product deleted: {db_product.name}"
     )
     db.add(history)
+    await db.run_sync(record_product_changes, [(product_state(db_product), None)])
     
-    db.delete(db_product)
-    db.commit()
+    await db.delete(db_product)
+    await db.commit()
     
     return {"message": "Product deleted successfully"}
 
 @router.get("/{product_id}/history", response_model=List[HistoryResponse])
-def get_product_history(
+async def get_product_history(
+    product_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(require_admin)
+):
+    # Newest first; served by ix_inventory_history_product_created_id
+    query = select(*HISTORY_COLUMNS).where(InventoryHistory.product_id == product_id)
+    page = page_statement(query, HISTORY_SORT, HISTORY_KEY, True, limit, cursor)
+    rows = (await db.execute(page)).all()
+    rows, next_cursor = split_page(rows, HISTORY_SORT, HISTORY_KEY, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows_response(HISTORY_COLUMNS, rows, response)
+
+@router.get("/{product_id}/history/daily", response_model=List[DailyHistoryResponse])
+async def get_product_daily_history(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(require_admin)
 ):
-    history = db.query(InventoryHistory).filter(
-        InventoryHistory.product_id == product_id
-    ).order_by(InventoryHistory.created_at.desc()).all()
-    return history
+    # Totals for history that the retention job has compacted and archived
+    return await db.run_sync(read_daily, product_id, since, until)
@@ -1,15 +1,54 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timedelta
+import orjson
 from pydantic import BaseModel
-from typing import List
-from database import get_db
-from models import Product, InventoryHistory, User
-from auth import require_admin
+from typing import List, Literal, Optional
+from database import get_async_db, get_async_read_db
+from models import Product, InventoryHistory
+from auth import CachedUser, require_admin
+from movements import movement_report
+from rollup import read_stats, read_category_stats, rebuild_rollups
+from changes import bump_catalog_version
+from conditional import catalog_conditional, catalog_etag
+from pagination import HISTORY_KEY, HISTORY_SORT, MAX_PAGE_SIZE, page_statement, split_page
+from report_cache import pack, report_cache, unpack
+from serialization import encode_rows, json_response
 
 router = APIRouter(prefix="/api/reports", tags=["reports"])
 
+# Rows also age out of the recent-activity window, so its ETag rolls over hourly
+recent_activity_etag = catalog_conditional(extra=lambda: datetime.utcnow().strftime("%Y%m%d%H"))
+# The default stock-movement window ends today
+movements_etag = catalog_conditional(extra=lambda: datetime.utcnow().strftime("%Y%m%d"))
+
+RECENT_ACTIVITY_COLUMNS = [
+    InventoryHistory.id, InventoryHistory.product_id, InventoryHistory.action,
+    InventoryHistory.performed_by, InventoryHistory.notes, InventoryHistory.created_at,
+]
+LOW_STOCK_COLUMNS = [
+    Product.id, Product.name, Product.sku, Product.category,
+    Product.quantity, Product.min_stock_level, Product.supplier,
+]
+
+async def cached_report(endpoint: str, request: Request, response: Response, catalog_version: int, compute,
+                        vary: str = "") -> Response:
+    """
+    Serve a report from report_cache, or build it with `compute`, an async
+    callable returning (body bytes, headers that belong to the body).
+    `vary` adds whatever else the body depends on to the cache key.
+    """
+    key = report_cache.key(endpoint, catalog_version, request.url.query + vary)
+    cached = report_cache.get(endpoint, key)
+    if cached is None:
+        body, headers = await compute()
+        report_cache.set(endpoint, key, pack(body, headers))
+    else:
+        body, headers = unpack(cached)
+    response.headers.update(headers)
+    return json_response(body, response)
+
 class StatsResponse(BaseModel):
     total_products: int
     total_value: float
@@ -22,6 +61,15 @@ class CategoryStats(BaseModel):
     product_count: int
     total_value: float
 
+class MovementBucket(BaseModel):
+    period_start: date
+    product_id: Optional[int] = None
+    category: Optional[str] = None
+    inbound: int
+    outbound: int
+    net: int
+    events: int
+
 class RecentActivity(BaseModel):
     id: int
     product_id: int
@@ -34,68 +82,99 @@ class RecentActivity(BaseModel):
         from_attributes = True
 
 @router.get("/stats", response_model=StatsResponse)
-def get_stats(db: Session = Depends(get_db), current_user: User = Depends(require_admin)):
-    products = db.query(Product).all()
-    
-    total_products = len(products)
-    total_value = sum(p.price * p.quantity for p in products)
-    low_stock_items = sum(1 for p in products if p.quantity <= p.min_stock_level and p.quantity > 0)
-    out_of_stock_items = sum(1 for p in products if p.quantity == 0)
-    total_categories = db.query(Product.category).distinct().count()
-    
-    return {
-        "total_products": total_products,
-        "total_value": total_value,
-        "low_stock_items": low_stock_items,
-        "out_of_stock_items": out_of_stock_items,
-        "total_categories": total_categories
-    }
+async def get_stats(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(require_admin),
+    catalog_version: int = Depends(catalog_etag)
+):
+    return await db.run_sync(read_stats)
 
 @router.get("/category-stats", response_model=List[CategoryStats])
-def get_category_stats(db: Session = Depends(get_db), current_user: User = Depends(require_admin)):
-    results = db.query(
-        Product.category,
-        func.count(Product.id).label('product_count'),
-        func.sum(Product.price * Product.quantity).label('total_value')
-    ).group_by(Product.category).all()
-    
-    return [
-        {
-            "category": r.category or "Uncategorized",
-            "product_count": r.product_count,
-            "total_value": float(r.total_value or 0)
-        }
-        for r in results
-    ]
+async def get_category_stats(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(require_admin),
+    catalog_version: int = Depends(catalog_etag)
+):
+    async def compute():
+        rows = await db.run_sync(read_category_stats)
+        return orjson.dumps([
+            {
+                "category": r.category or "Uncategorized",
+                "product_count": r.product_count,
+                "total_value": float(r.total_value or 0)
+            }
+            for r in rows
+        ]), {}
+
+    return await cached_report("category-stats", request, response, catalog_version, compute)
 
 @router.get("/recent-activity", response_model=List[RecentActivity])
-def get_recent_activity(
+async def get_recent_activity(
+    request: Request,
+    response: Response,
     days: int = 7,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin)
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(require_admin),
+    catalog_version: int = Depends(recent_activity_etag)
 ):
-    since_date = datetime.utcnow() - timedelta(days=days)
-    history = db.query(InventoryHistory).filter(
-        InventoryHistory.created_at >= since_date
-    ).order_by(InventoryHistory.created_at.desc()).limit(50).all()
-    
-    return history
+    async def compute():
+        since_date = datetime.utcnow() - timedelta(days=days)
+        # Newest first; served by ix_inventory_history_created_id
+        query = select(*RECENT_ACTIVITY_COLUMNS).where(InventoryHistory.created_at >= since_date)
+        page = page_statement(query, HISTORY_SORT, HISTORY_KEY, True, limit, cursor)
+        rows = (await db.execute(page)).all()
+        history, next_cursor = split_page(rows, HISTORY_SORT, HISTORY_KEY, limit)
+        return encode_rows(RECENT_ACTIVITY_COLUMNS, history), {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    return await cached_report("recent-activity", request, response, catalog_version, compute)
+
+@router.get("/stock-movements", response_model=List[MovementBucket])
+async def get_stock_movements(
+    request: Request,
+    response: Response,
+    period: Literal["day", "week", "month"] = "day",
+    group_by: Literal["product", "category"] = "product",
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    product_id: Optional[int] = None,
+    category: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(require_admin),
+    catalog_version: int = Depends(movements_etag)
+):
+    """Inbound/outbound/net quantity per period for days in [since, until); the last 30 days by default"""
+    async def compute():
+        buckets = await db.run_sync(movement_report, period, group_by, since, until, product_id, category)
+        return orjson.dumps(buckets), {}
+
+    return await cached_report("stock-movements", request, response, catalog_version, compute,
+                               vary=datetime.utcnow().strftime("%Y%m%d"))
+
+@router.post("/rollups/rebuild")
+async def rebuild_report_rollups(db: AsyncSession = Depends(get_async_db), current_user: CachedUser = Depends(require_admin)):
+    # Repaired drift changes the stats, so cached report bodies must go; the
+    # version moves in the same transaction as the recount
+    categories = await db.run_sync(rebuild_rollups)
+    await db.run_sync(bump_catalog_version)
+    await db.commit()
+    return {"message": "Rollups rebuilt", "categories": categories}
 
 @router.get("/low-stock", response_model=List[dict])
-def get_low_stock_report(db: Session = Depends(get_db), current_user: User = Depends(require_admin)):
-    products = db.query(Product).filter(
-        Product.quantity <= Product.min_stock_level
-    ).all()
-    
-    return [
-        {
-            "id": p.id,
-            "name": p.name,
-            "sku": p.sku,
-            "category": p.category,
-            "quantity": p.quantity,
-            "min_stock_level": p.min_stock_level,
-            "supplier": p.supplier
-        }
-        for p in products
-    ]
+async def get_low_stock_report(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: CachedUser = Depends(require_admin),
+    catalog_version: int = Depends(catalog_etag)
+):
+    async def compute():
+        rows = (await db.execute(
+            select(*LOW_STOCK_COLUMNS).where(Product.quantity <= Product.min_stock_level)
+        )).all()
+        return encode_rows(LOW_STOCK_COLUMNS, rows), {}
+
+    return await cached_report("low-stock", request, response, catalog_version, compute)
@@ -0,0 +1,154 @@
+"""
+Indexed product search across name, SKU and description
+
+Each whitespace-separated word in the search box must appear as a
+substring of the product's name, SKU or description. Matching is served by
+an index on both supported databases:
+
+* SQLite: an external-content FTS5 table using the trigram tokenizer,
+  kept in sync with `products` by triggers, ranked with bm25().
+* PostgreSQL: a pg_trgm GIN index over the combined text, which serves the
+  ILIKE filters, ranked with word_similarity().
+
+Products whose SKU starts with the search text are always ranked first.
+Rank is "lower is better" on every backend so it can be used directly as an
+ascending keyset sort key.
+"""
+from sqlalchemy import Float, and_, case, event, func, literal, literal_column, or_, select, text, type_coerce
+from sqlalchemy.sql import column, table
+from models import Product
+
+# The trigram tokenizer can only match terms of at least three characters;
+# shorter words fall back to a LIKE filter
+MIN_INDEXED_TERM = 3
+
+# bm25 column weights for the FTS table columns (name, sku, description)
+FTS_WEIGHTS = (5.0, 10.0, 1.0)
+
+SKU_PREFIX_BOOST = 1000.0
+
+products_fts = table("products_fts", column("rowid"))
+fts_match_column = literal_column("products_fts")
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, sku, description,
+        content='products', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, sku, description)
+        VALUES (new.id, new.name, new.sku, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, sku, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, sku, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.description);
+        INSERT INTO products_fts(rowid, name, sku, description)
+        VALUES (new.id, new.name, new.sku, new.description);
+    END
+    """,
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+POSTGRESQL_DOCUMENT = "(coalesce(name, '') || ' ' || coalesce(sku, '') || ' ' || coalesce(description, ''))"
+
+POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_products_search_trgm ON products USING gin ({POSTGRESQL_DOCUMENT} gin_trgm_ops)"
+]
+
+
+def install_search(conn):
+    """Create the search index for the connection's dialect (idempotent)"""
+    dialect = conn.dialect.name
+    statements = SQLITE_DDL if dialect == "sqlite" else POSTGRESQL_DDL if dialect == "postgresql" else []
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+@event.listens_for(Product.__table__, "after_create")
+def _install_search_after_create(target, connection, **kw):
+    install_search(connection)
+
+
+@event.listens_for(Product.__table__, "after_drop")
+def _drop_search_after_drop(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS products_fts"))
+
+
+def search_terms(search: str) -> list:
+    return [term for term in search.split() if term]
+
+
+def _like_pattern(value: str, prefix: bool = False) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if prefix else f"%{escaped}%"
+
+
+def _fts_query(terms: list) -> str:
+    # Quote every term so FTS5 operators and punctuation are matched literally
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _like_filter(terms: list, document=None):
+    fields = [Product.name, Product.sku, Product.description] if document is None else [document]
+    return and_(*(
+        or_(*(field.ilike(_like_pattern(term), escape="\\") for field in fields))
+        for term in terms
+    ))
+
+
+def apply_search(stmt, dialect: str, search: str):
+    """
+    Restrict a select() over Product to rows matching `search`.
+
+    Returns the filtered statement and a rank expression (lower is better)
+    that can be added to ORDER BY.
+    """
+    terms = search_terms(search)
+    sku_boost = case(
+        (func.lower(Product.sku).like(_like_pattern(search.strip().lower(), prefix=True), escape="\\"), -SKU_PREFIX_BOOST),
+        else_=0.0,
+    )
+    if not terms:
+        return stmt, type_coerce(literal(0.0), Float).label("search_rank")
+
+    if dialect == "sqlite":
+        indexed = [t for t in terms if len(t) >= MIN_INDEXED_TERM]
+        short = [t for t in terms if len(t) < MIN_INDEXED_TERM]
+        if indexed:
+            matches = (
+                select(
+                    products_fts.c.rowid.label("id"),
+                    func.bm25(fts_match_column, *FTS_WEIGHTS).label("score"),
+                )
+                .where(fts_match_column.op("MATCH")(_fts_query(indexed)))
+                .subquery("search_matches")
+            )
+            stmt = stmt.join(matches, matches.c.id == Product.id)
+            score = matches.c.score
+        else:
+            score = literal(0.0)
+        if short:
+            stmt = stmt.where(_like_filter(short))
+    elif dialect == "postgresql":
+        # Must render exactly as the indexed expression for the planner to use it
+        document = literal_column(POSTGRESQL_DOCUMENT)
+        stmt = stmt.where(_like_filter(terms, document))
+        score = -func.word_similarity(search, document)
+    else:
+        stmt = stmt.where(_like_filter(terms))
+        score = literal(0.0)
+
+    return stmt, type_coerce(score + sku_boost, Float).label("search_rank")
@@ -0,0 +1,39 @@
+"""
+Fast JSON responses for large lists
+
+List routes select plain columns instead of ORM entities and encode the row
+tuples directly with orjson. Returning a Response makes FastAPI skip the
+response_model validation and jsonable_encoder passes; the response_model
+on the route still documents the shape. Rows must therefore already match
+it, which is the case for the column lists in exports.py.
+"""
+from typing import Iterable, List
+import orjson
+from fastapi import Response
+
+# Headers that belong to the placeholder response FastAPI injects into routes
+_SKIPPED_HEADERS = {"content-length", "content-type"}
+
+
+def encode_rows(columns: List, rows: Iterable) -> bytes:
+    """JSON array of objects keyed by column name; extra trailing row values are ignored"""
+    keys = [c.key for c in columns]
+    return orjson.dumps([dict(zip(keys, row)) for row in rows])
+
+
+def json_response(body: bytes, response: Response) -> Response:
+    """
+    Wrap an already encoded JSON body, keeping headers the route set on its
+    injected `response` (cursors, ETags), which FastAPI would otherwise drop
+    when a Response is returned.
+    """
+    fast = Response(body, media_type="application/json")
+    for name, value in response.headers.items():
+        if name not in _SKIPPED_HEADERS:
+            fast.headers.append(name, value)
+    return fast
+
+
+def rows_response(columns: List, rows: Iterable, response: Response) -> Response:
+    """Build the JSON response for `rows` (see json_response)"""
+    return json_response(encode_rows(columns, rows), response)
@@ -0,0 +1,229 @@
+"""
+Slow-query log
+
+install_slow_query_log() hooks an engine's cursor events (database.py does
+this for the sync and async engines). A statement that takes at least
+SLOW_QUERY_MS is logged with:
+
+* its normalized text (literals, placeholders and IN lists collapsed)
+* the shape of its parameters (types, not values)
+* its duration
+* the route of the request that ran it (when request metrics are enabled)
+
+Slow statements are also aggregated per normalized text, so the worst
+offenders can be read at `GET /api/admin/slow-queries`.
+
+With SLOW_QUERY_EXPLAIN, the plan of a slow SELECT is captured on the same
+connection, at most once per SLOW_QUERY_EXPLAIN_INTERVAL per statement. On
+SQLite this uses EXPLAIN QUERY PLAN; elsewhere it uses EXPLAIN. The plan is
+requested through the raw DBAPI cursor, so it doesn't re-enter these
+listeners or the request's query counts. On PostgreSQL it runs inside a
+savepoint, so a failed EXPLAIN can't abort the caller's transaction.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import current_query_stats, route_template
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+# Distinct statements tracked; the one with the least total time is dropped first
+SLOW_QUERY_MAX_STATEMENTS = int(os.getenv("SLOW_QUERY_MAX_STATEMENTS", "500"))
+
+logger = logging.getLogger("inventory.slow_queries")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """Statement text with every literal and placeholder as `?` and IN lists as `(?...)`"""
+    statement = _STRING.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _LIST.sub("(?...)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+def _type_runs(types) -> str:
+    """['int', 'int', 'str'] -> 'int x2, str'"""
+    runs = []
+    for name in types:
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return ", ".join(name if count == 1 else f"{name} x{count}" for name, count in runs)
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Types of the bound parameters, e.g. `(int, str x3)` or `{id: int}`"""
+    if executemany:
+        rows = list(parameters)
+        return f"{len(rows)} x {parameter_shape(rows[0]) if rows else '()'}"
+    if parameters is None:
+        return "()"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + _type_runs(type(value).__name__ for value in parameters) + ")"
+
+
+class SlowQueryLog:
+    """Aggregated slow statements, keyed by normalized text"""
+
+    def __init__(self, max_statements: int = SLOW_QUERY_MAX_STATEMENTS):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries: Dict[str, dict] = {}
+            self.recorded = 0
+
+    def record(self, statement: str, shape: str, seconds: float, route: Optional[str]) -> dict:
+        now = time.time()
+        with self._lock:
+            self.recorded += 1
+            entry = self._entries.get(statement)
+            if entry is None:
+                if len(self._entries) >= self.max_statements:
+                    cheapest = min(self._entries, key=lambda key: self._entries[key]["total_ms"])
+                    del self._entries[cheapest]
+                entry = self._entries[statement] = {
+                    "statement": statement,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": Counter(),
+                    "plan": None,
+                    "plan_captured_at": None,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += seconds * 1000
+            entry["max_ms"] = max(entry["max_ms"], seconds * 1000)
+            entry["last_ms"] = seconds * 1000
+            entry["last_seen"] = now
+            entry["parameters"] = shape
+            if route:
+                entry["routes"][route] += 1
+            return entry
+
+    def needs_plan(self, entry: dict, interval: float = SLOW_QUERY_EXPLAIN_INTERVAL) -> bool:
+        with self._lock:
+            captured = entry["plan_captured_at"]
+            if captured is not None and time.time() - captured < interval:
+                return False
+            # Claim it, so concurrent slow runs don't all explain
+            entry["plan_captured_at"] = time.time()
+            return True
+
+    def set_plan(self, entry: dict, plan: str):
+        with self._lock:
+            entry["plan"] = plan
+
+    def top(self, limit: int = 20, sort: str = "total_ms") -> list:
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: entry[sort], reverse=True)[:limit]
+            return [
+                {
+                    **{key: value for key, value in entry.items() if key != "routes"},
+                    "total_ms": round(entry["total_ms"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "mean_ms": round(entry["total_ms"] / entry["count"], 2),
+                    "last_ms": round(entry["last_ms"], 2),
+                    "routes": dict(entry["routes"].most_common(5)),
+                }
+                for entry in entries
+            ]
+
+    def stats(self, limit: int = 20, sort: str = "total_ms") -> dict:
+        with self._lock:
+            tracked = len(self._entries)
+            recorded = self.recorded
+        return {
+            "threshold_ms": SLOW_QUERY_MS,
+            "explain": SLOW_QUERY_EXPLAIN,
+            "recorded": recorded,
+            "statements": tracked,
+            "top": self.top(limit, sort),
+        }
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain(dbapi_connection, dialect: str, statement: str, parameters) -> str:
+    """Plan of `statement`, run on a fresh cursor of the same DBAPI connection"""
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+    explain_cursor = dbapi_connection.cursor()
+    savepoint = dialect == "postgresql"
+    try:
+        if savepoint:
+            explain_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            rows = explain_cursor.fetchall()
+        except Exception:
+            if savepoint:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        finally:
+            if savepoint:
+                explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        explain_cursor.close()
+    if dialect == "sqlite":
+        # (id, parent, notused, detail)
+        return "\n".join(str(row[-1]) for row in rows)
+    return "\n".join(" ".join(str(value) for value in row) for row in rows)
+
+
+def install_slow_query_log(engine: Engine, threshold_ms: Optional[float] = None,
+                           capture_plans: Optional[bool] = None, log: SlowQueryLog = slow_query_log):
+    """Time every statement on `engine` and record the ones at or above the threshold"""
+    threshold = (SLOW_QUERY_MS if threshold_ms is None else threshold_ms) / 1000
+    capture_plans = SLOW_QUERY_EXPLAIN if capture_plans is None else capture_plans
+    if threshold <= 0:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_slow_query_start", None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        if seconds < threshold:
+            return
+
+        request = current_query_stats.get()
+        route = None
+        if request is not None and request.scope is not None:
+            route = f"{request.scope['method']} {route_template(request.scope)}"
+        normalized = normalize_statement(statement)
+        shape = parameter_shape(parameters, executemany)
+        entry = log.record(normalized, shape, seconds, route)
+        logger.warning("Slow query %.1fms on %s: %s params=%s", seconds * 1000, route or "(no request)",
+                       normalized[:500], shape)
+
+        is_select = normalized.split(" ", 1)[0].upper() in ("SELECT", "WITH")
+        if capture_plans and is_select and not executemany and log.needs_plan(entry):
+            try:
+                plan = explain(conn.connection, conn.dialect.name, statement, parameters)
+            except Exception as e:
+                plan = f"EXPLAIN failed: {type(e).__name__}: {e}"
+            log.set_plan(entry, plan)
@@ -0,0 +1,107 @@
+"""
+Atomic multi-SKU stock movements
+
+Quantities are changed with `quantity = quantity + :delta` in the database,
+never read-modify-write in Python, so concurrent movements on the same SKU
+all land. A batch is one transaction: every SKU is updated or none is.
+"""
+from typing import Dict, List
+from pydantic import BaseModel
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from models import Product, InventoryHistory
+from changes import record_product_changes
+from rollup import ProductState
+
+class StockMovement(BaseModel):
+    sku: str
+    delta: int
+    notes: str = ""
+
+class StockMovementRequest(BaseModel):
+    movements: List[StockMovement]
+    allow_negative: bool = False
+
+class StockLevel(BaseModel):
+    product_id: int
+    sku: str
+    delta: int
+    quantity: int
+
+class StockMovementError(BaseModel):
+    sku: str
+    error: str
+
+class StockMovementReport(BaseModel):
+    applied: List[StockLevel] = []
+    errors: List[StockMovementError] = []
+
+
+def _merge(movements: List[StockMovement]) -> Dict[str, list]:
+    """Sum deltas per SKU, sorted by SKU so row locks are taken in a consistent order"""
+    merged: Dict[str, list] = {}
+    for movement in movements:
+        entry = merged.setdefault(movement.sku, [0, []])
+        entry[0] += movement.delta
+        if movement.notes:
+            entry[1].append(movement.notes)
+    return dict(sorted(merged.items()))
+
+
+def apply_stock_movements(
+    db: Session,
+    movements: List[StockMovement],
+    performed_by: str,
+    allow_negative: bool = False,
+) -> StockMovementReport:
+    """
+    Apply signed quantity deltas to many SKUs in one transaction.
+
+    Unknown SKUs, and unless `allow_negative` movements that would take a
+    quantity below zero, are reported in `errors` and roll the whole batch
+    back. Duplicate SKUs in one batch are summed.
+    """
+    report = StockMovementReport()
+    history = []
+    changes = []
+    quantity = func.coalesce(Product.quantity, 0)
+
+    for sku, (delta, notes) in _merge(movements).items():
+        stmt = (
+            update(Product)
+            .where(Product.sku == sku)
+            .values(quantity=quantity + delta)
+            .returning(Product.id, Product.category, Product.price, Product.quantity, Product.min_stock_level)
+        )
+        if not allow_negative and delta < 0:
+            stmt = stmt.where(quantity + delta >= 0)
+        row = db.execute(stmt).first()
+
+        if row is None:
+            exists = db.scalar(select(Product.id).where(Product.sku == sku)) is not None
+            report.errors.append(StockMovementError(
+                sku=sku, error="Insufficient stock" if exists else "Product not found"
+            ))
+            continue
+
+        report.applied.append(StockLevel(product_id=row.id, sku=sku, delta=delta, quantity=row.quantity))
+        history.append({
+            "product_id": row.id,
+            "action": "stock_change",
+            "quantity_change": delta,
+            "performed_by": performed_by,
+            "notes": "; ".join(notes) or f"Stock movement: {sku}",
+        })
+        after = ProductState(row.category, row.price or 0.0, row.quantity, row.min_stock_level or 0, row.id, sku)
+        changes.append((after._replace(quantity=row.quantity - delta), after))
+
+    if report.errors:
+        db.rollback()
+        report.applied = []
+        return report
+
+    if history:
+        db.execute(insert(InventoryHistory), history)
+    record_product_changes(db, changes)
+    db.commit()
+    return report
@@ -0,0 +1,91 @@
+"""
+Delta sync: products changed since a client's last sync
+
+Every product write stamps the rows it touched with its catalog version
+(`Product.row_version`) and leaves a `ProductTombstone` for each deleted
+product. A sync reads both tables in (version, kind, id) order from the
+client's cursor, through the (row_version, id) indexes, so it costs the
+number of changes since the cursor rather than the catalog size.
+
+A product written several times since the cursor is returned once, in its
+current state. Cursors are opaque; `since` accepts a catalog version
+instead (for example the id of the last live feed event).
+"""
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from exports import PRODUCT_COLUMNS
+from models import Product, ProductTombstone
+from pagination import decode_cursor, encode_cursor, keyset_condition
+
+SYNC_SORT = "sync"
+SYNC_COLUMNS = PRODUCT_COLUMNS + [Product.row_version]
+TOMBSTONE_COLUMNS = [ProductTombstone.id, ProductTombstone.product_id, ProductTombstone.sku, ProductTombstone.row_version]
+
+# Within one version, tombstones sort before products
+TOMBSTONE, PRODUCT, AFTER_VERSION = 0, 1, 2
+# decode_cursor only looks at the column types: (version, kind, id) are all integers
+CURSOR_COLUMNS = [Product.row_version, Product.id, Product.id]
+
+
+def start_position(cursor: Optional[str], since: Optional[int]) -> Tuple[int, int, int]:
+    """(version, kind, id) to read after; the beginning when neither is given"""
+    if cursor:
+        version, kind, row_id = decode_cursor(cursor, SYNC_SORT, CURSOR_COLUMNS)
+        return int(version), int(kind), int(row_id)
+    if since is not None:
+        return since, AFTER_VERSION, 0
+    return -1, AFTER_VERSION, 0
+
+
+def _after(version_column, id_column, kind: int, position: Tuple[int, int, int]):
+    version, after_kind, row_id = position
+    if after_kind < kind:
+        return version_column >= version
+    if after_kind == kind:
+        return keyset_condition([version_column, id_column], [version, row_id], False)
+    return version_column > version
+
+
+def read_changes(db: Session, cursor: Optional[str] = None, since: Optional[int] = None,
+                 limit: int = 500) -> dict:
+    """
+    Up to `limit` changes after the cursor: {"products", "deleted",
+    "cursor", "has_more"}. Keep the returned cursor for the next call.
+    """
+    position = start_position(cursor, since)
+    products = db.execute(
+        select(*SYNC_COLUMNS)
+        .where(_after(Product.row_version, Product.id, PRODUCT, position))
+        .order_by(Product.row_version, Product.id)
+        .limit(limit + 1)
+    ).all()
+    tombstones = db.execute(
+        select(*TOMBSTONE_COLUMNS)
+        .where(_after(ProductTombstone.row_version, ProductTombstone.id, TOMBSTONE, position))
+        .order_by(ProductTombstone.row_version, ProductTombstone.id)
+        .limit(limit + 1)
+    ).all()
+
+    merged = sorted(
+        [((row.row_version, PRODUCT, row.id), row) for row in products]
+        + [((row.row_version, TOMBSTONE, row.id), row) for row in tombstones],
+        key=lambda item: item[0],
+    )
+    page = merged[:limit]
+    keys = [c.key for c in SYNC_COLUMNS]
+    changed: List[dict] = []
+    deleted: List[dict] = []
+    for (version, kind, _), row in page:
+        if kind == PRODUCT:
+            changed.append(dict(zip(keys, row)))
+        else:
+            deleted.append({"id": row.product_id, "sku": row.sku, "row_version": version})
+    if page:
+        position = page[-1][0]
+    return {
+        "products": changed,
+        "deleted": deleted,
+        "cursor": encode_cursor(SYNC_SORT, list(position)),
+        "has_more": len(merged) > limit,
+    }
@@ -1,33 +1,47 @@
 """
 Unit tests for API endpoints
 """
+import asyncio
+import json
+import os
+import tempfile
+import bcrypt
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
-from database import Base, get_db
+from database import Base, get_async_db, get_async_read_db
 from models import User, Product
-from auth import get_password_hash
+from rollup import rebuild_rollups
+from auth import get_password_hash, user_cache
+from report_cache import report_cache
+from live_feed import change_broker
+from metrics import request_metrics
 
-# Test database
-TEST_DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+# Test database: a temporary SQLite file shared by the sync fixtures and the
+# async (aiosqlite) sessions the API routes use
+TEST_DATABASE_PATH = os.path.join(tempfile.mkdtemp(), "test_api.db")
+engine = create_engine(f"sqlite:///{TEST_DATABASE_PATH}", connect_args={"check_same_thread": False})
 TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{TEST_DATABASE_PATH}")
+TestAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
-def override_get_db():
-    db = TestSessionLocal()
-    try:
+async def override_get_async_db():
+    async with TestAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_async_read_db] = override_get_async_db
 
 @pytest.fixture
 def client():
     """Create test client"""
     Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    report_cache.clear()
+    change_broker.reset()
     yield TestClient(app)
     Base.metadata.drop_all(bind=engine)
 
@@ -105,6 +119,51 @@ def test_login_success(client, test_user):
     assert "user" in response.json()
     assert response.json()["token_type"] == "bearer"
 
+def test_login_rehashes_outdated_password(client, monkeypatch):
+    """Test that login transparently upgrades a hash with an old cost factor"""
+    import auth
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    db = TestSessionLocal()
+    db.add(User(
+        username="legacy",
+        email="legacy@example.com",
+        password=bcrypt.hashpw(b"legacypass", bcrypt.gensalt(rounds=4)).decode("utf-8"),
+        role="customer"
+    ))
+    db.commit()
+    db.close()
+    
+    response = client.post("/api/auth/login", json={"username": "legacy", "password": "legacypass"})
+    assert response.status_code == 200
+    
+    db = TestSessionLocal()
+    stored = db.query(User).filter(User.username == "legacy").first().password
+    db.close()
+    assert stored.startswith("$2b$05$")
+    assert client.post("/api/auth/login", json={"username": "legacy", "password": "legacypass"}).status_code == 200
+
+def test_login_skips_rehash_when_hasher_is_saturated(client, monkeypatch):
+    """Test that a correct password still logs in when the optional rehash can't run"""
+    import auth
+    from fastapi import HTTPException
+    from routes import auth as auth_routes
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    legacy_hash = bcrypt.hashpw(b"legacypass", bcrypt.gensalt(rounds=4)).decode("utf-8")
+    db = TestSessionLocal()
+    db.add(User(username="legacy", email="legacy@example.com", password=legacy_hash, role="customer"))
+    db.commit()
+    db.close()
+
+    async def saturated(password):
+        raise HTTPException(status_code=503, detail="Authentication service busy, please retry")
+    monkeypatch.setattr(auth_routes, "get_password_hash_async", saturated)
+
+    response = client.post("/api/auth/login", json={"username": "legacy", "password": "legacypass"})
+    assert response.status_code == 200
+    db = TestSessionLocal()
+    assert db.query(User).filter(User.username == "legacy").first().password == legacy_hash
+    db.close()
+
 def test_login_wrong_password(client, test_user):
     """Test login with wrong password"""
     response = client.post("/api/auth/login", json={
@@ -113,6 +172,26 @@ def test_login_wrong_password(client, test_user):
     })
     assert response.status_code == 401
 
+def test_current_user_cached_and_invalidated_on_deactivation(client, test_user):
+    """Test that principals are cached and a deactivated user is rejected"""
+    token = client.post("/api/auth/login", json=test_user).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    assert user_cache.stats()["hits"] >= 1
+    assert client.get("/api/auth/cache-stats", headers=headers).status_code == 403
+    
+    db = TestSessionLocal()
+    user = db.query(User).filter(User.username == test_user["username"]).first()
+    user.is_active = False
+    db.commit()
+    db.close()
+    
+    response = client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "User account is inactive"
+
 def test_get_products_unauthorized(client):
     """Test getting products without authentication"""
     response = client.get("/api/products/")
@@ -162,6 +241,269 @@ def test_get_products_as_admin(client, admin_token):
     assert response.status_code == 200
     assert len(response.json()) > 0
 
+def test_get_products_keyset_pagination(client, admin_token):
+    """Test walking the product list page by page with cursors"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(5):
+        client.post("/api/products/", json={
+            "name": f"Product {i}",
+            "sku": f"PAGE-{i:03d}",
+            "price": 10.0 + i
+        }, headers=headers)
+    
+    response = client.get(
+        "/api/products/",
+        params={"limit": 2, "include_total": True},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "5"
+    seen = [p["sku"] for p in response.json()]
+    cursor = response.headers.get("X-Next-Cursor")
+    while cursor:
+        response = client.get(
+            "/api/products/",
+            params={"limit": 2, "cursor": cursor},
+            headers=headers
+        )
+        assert response.status_code == 200
+        seen.extend(p["sku"] for p in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+    
+    assert seen == [f"PAGE-{i:03d}" for i in range(5)]
+
+def test_get_products_sorted_descending(client, admin_token):
+    """Test server-side sorting with a descending sort key"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i, price in enumerate([5.0, 20.0, 5.0, 10.0]):
+        client.post("/api/products/", json={
+            "name": f"Product {i}",
+            "sku": f"SORT-{i}",
+            "price": price
+        }, headers=headers)
+    
+    first = client.get("/api/products/", params={"sort": "-price", "limit": 3}, headers=headers)
+    second = client.get(
+        "/api/products/",
+        params={"sort": "-price", "limit": 3, "cursor": first.headers["X-Next-Cursor"]},
+        headers=headers
+    )
+    prices = [p["price"] for p in first.json() + second.json()]
+    assert prices == [20.0, 10.0, 5.0, 5.0]
+    assert "X-Next-Cursor" not in second.headers
+
+def test_get_products_paginates_over_null_sort_keys(client, admin_token):
+    """Test NULL quantities and timestamps sort last ascending, first descending, across pages"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(6):
+        client.post("/api/products/", json={
+            "name": f"Product {i}",
+            "sku": f"NULL-{i}",
+            "price": 1.0,
+            "quantity": i
+        }, headers=headers)
+    db = TestSessionLocal()
+    ids = [p.id for p in db.query(Product).order_by(Product.id)]
+    db.query(Product).filter(Product.id.in_(ids[:3])).update(
+        {Product.quantity: None, Product.created_at: None}, synchronize_session=False
+    )
+    db.commit()
+    db.close()
+
+    def walk(sort):
+        seen, params = [], {"sort": sort, "limit": 2}
+        while True:
+            response = client.get("/api/products/", params=params, headers=headers)
+            assert response.status_code == 200
+            seen += [p["id"] for p in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                return seen
+            params = {**params, "cursor": response.headers["X-Next-Cursor"]}
+
+    assert walk("quantity") == ids[3:] + ids[:3]
+    assert walk("-quantity") == ids[2::-1] + ids[:2:-1]
+    assert walk("created_at") == ids[3:] + ids[:3]
+    assert walk("-created_at") == ids[2::-1] + ids[:2:-1]
+
+def test_get_products_rejects_bad_sort_and_cursor(client, admin_token):
+    """Test that unknown sort fields and tampered cursors are rejected"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/api/products/", params={"sort": "password"}, headers=headers)
+    assert response.status_code == 400
+    response = client.get("/api/products/", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
+
+def test_search_products_ranked_across_fields(client, admin_token):
+    """Test indexed search over name, SKU and description with SKU prefixes first"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for name, sku, description in [
+        ("Desk Lamp", "HOME-100", "LED lamp for the office"),
+        ("Office Chair", "FURN-200", "Ergonomic chair"),
+        ("Lamp Shade", "LAMP-300", "Fabric shade"),
+        ("Stapler", "OFF-400", "Heavy duty"),
+    ]:
+        client.post("/api/products/", json={
+            "name": name, "sku": sku, "description": description, "price": 10.0
+        }, headers=headers)
+    
+    response = client.get("/api/products/", params={"search": "lamp"}, headers=headers)
+    assert response.status_code == 200
+    skus = [p["sku"] for p in response.json()]
+    assert skus[0] == "LAMP-300"
+    assert sorted(skus) == ["HOME-100", "LAMP-300"]
+    
+    # Substrings inside words, descriptions and multiple terms
+    response = client.get("/api/products/", params={"search": "gonom"}, headers=headers)
+    assert [p["sku"] for p in response.json()] == ["FURN-200"]
+    response = client.get("/api/products/", params={"search": "office led"}, headers=headers)
+    assert [p["sku"] for p in response.json()] == ["HOME-100"]
+    
+    # Short terms fall back to LIKE; other sort orders still apply
+    response = client.get("/api/products/", params={"search": "of", "sort": "sku"}, headers=headers)
+    assert [p["sku"] for p in response.json()] == ["FURN-200", "HOME-100", "OFF-400"]
+
+def test_search_index_follows_writes_and_pages(client, admin_token):
+    """Test that updates and deletes reach the search index and relevance pages with cursors"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    ids = []
+    for i in range(5):
+        response = client.post("/api/products/", json={
+            "name": f"Widget {i}", "sku": f"WID-{i}", "price": 1.0
+        }, headers=headers)
+        ids.append(response.json()["id"])
+    
+    client.put(f"/api/products/{ids[0]}", json={"name": "Gadget"}, headers=headers)
+    client.delete(f"/api/products/{ids[1]}", headers=headers)
+    
+    response = client.get("/api/products/", params={"search": "gadget"}, headers=headers)
+    assert [p["id"] for p in response.json()] == [ids[0]]
+    
+    seen = []
+    params = {"search": "widget", "limit": 2}
+    while True:
+        response = client.get("/api/products/", params=params, headers=headers)
+        assert response.status_code == 200
+        seen.extend(p["id"] for p in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert sorted(seen) == ids[2:]
+    
+    response = client.get("/api/products/", params={"sort": "relevance"}, headers=headers)
+    assert response.status_code == 400
+
+def test_stock_movements_endpoint(client, admin_token, test_user):
+    """Test applying a multi-SKU stock movement and its error responses"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for sku, quantity in [("MOVE-1", 10), ("MOVE-2", 0)]:
+        client.post("/api/products/", json={"name": sku, "sku": sku, "price": 1.0, "quantity": quantity}, headers=headers)
+    
+    response = client.post("/api/products/stock-movements", json={"movements": [
+        {"sku": "MOVE-1", "delta": -4, "notes": "sale"},
+        {"sku": "MOVE-2", "delta": 6},
+    ]}, headers=headers)
+    assert response.status_code == 200
+    assert {s["sku"]: s["quantity"] for s in response.json()["applied"]} == {"MOVE-1": 6, "MOVE-2": 6}
+    
+    response = client.post("/api/products/stock-movements", json={"movements": [
+        {"sku": "MOVE-1", "delta": -7},
+    ]}, headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"] == [{"sku": "MOVE-1", "error": "Insufficient stock"}]
+    
+    response = client.post("/api/products/stock-movements", json={"movements": [
+        {"sku": "NOPE", "delta": 1},
+    ]}, headers=headers)
+    assert response.status_code == 404
+    
+    user_token = client.post("/api/auth/login", json={"username": "testuser", "password": "testpass123"}).json()["access_token"]
+    response = client.post("/api/products/stock-movements", json={"movements": []},
+                           headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+def test_conditional_get_with_catalog_etag(client, admin_token):
+    """Test ETag / Last-Modified revalidation and that 304s skip the route query"""
+    from sqlalchemy import event
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/api/products/", json={"name": "Cached", "sku": "ETAG-1", "price": 1.0}, headers=headers)
+    
+    first = client.get("/api/products/", headers=headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+    
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/api/products/", headers={**headers, "If-None-Match": etag})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert not any("FROM products" in s for s in statements)
+    
+    # Different queries are different representations
+    other = client.get("/api/products/", params={"sort": "name"}, headers={**headers, "If-None-Match": etag})
+    assert other.status_code == 200
+    
+    since = client.get("/api/reports/stats", headers=headers).headers["Last-Modified"]
+    assert client.get("/api/reports/stats", headers={**headers, "If-Modified-Since": since}).status_code == 304
+    
+    # Any product write invalidates every ETag
+    client.post("/api/products/stock-movements", json={"movements": [{"sku": "ETAG-1", "delta": 1}]}, headers=headers)
+    response = client.get("/api/products/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["quantity"] == 1
+    
+    # Authentication still comes first
+    assert client.get("/api/products/", headers={"If-None-Match": etag}).status_code == 403
+
+def test_product_list_fast_path_matches_model_output(client, admin_token):
+    """Test that rows serialized without the response model look the same as model output"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    created = client.post("/api/products/", json={
+        "name": "Fast", "sku": "FAST-1", "price": 2.5, "quantity": 3, "description": "d"
+    }, headers=headers).json()
+    
+    listed = client.get("/api/products/", headers=headers).json()
+    single = client.get(f"/api/products/{created['id']}", headers=headers).json()
+    assert listed == [single]
+    
+    history = client.get(f"/api/products/{created['id']}/history", headers=headers).json()
+    assert set(history[0]) == {"id", "product_id", "action", "quantity_change", "performed_by", "notes", "created_at"}
+
+def test_large_responses_are_compressed(client, admin_token):
+    """Test gzip / brotli negotiation, the size threshold and streamed compression"""
+    import compression
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/api/products/import", json=[
+        {"name": f"Compressible {i}", "sku": f"ZIP-{i:03d}", "price": 1.0} for i in range(50)
+    ], headers=headers)
+    
+    response = client.get("/api/products/", headers={**headers, "Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 50
+    
+    small = client.get("/api/products/categories", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    
+    identity = client.get("/api/products/", headers={**headers, "Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in identity.headers
+    
+    if compression.brotli is not None:
+        response = client.get("/api/products/", headers={**headers, "Accept-Encoding": "gzip, br"})
+        assert response.headers["content-encoding"] == "br"
+        assert len(response.json()) == 50
+    
+    export = client.get("/api/exports/products", params={"format": "csv"},
+                        headers={**headers, "Accept-Encoding": "gzip"})
+    assert export.headers["content-encoding"] == "gzip"
+    assert len(export.text.strip().splitlines()) == 51
+
 def test_update_product_as_admin(client, admin_token):
     """Test updating product as admin"""
     # Create product
@@ -218,6 +560,76 @@ def test_delete_product_as_admin(client, admin_token):
     )
     assert get_response.status_code == 404
 
+def test_product_changes_delta_sync(client, admin_token):
+    """Test that the changes feed returns writes and deletions after a cursor"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    ids = [
+        client.post("/api/products/", json={"name": f"Sync {i}", "sku": f"SYNC-{i}", "price": 5.0}, headers=headers).json()["id"]
+        for i in range(3)
+    ]
+    first = client.get("/api/products/changes?limit=2", headers=headers).json()
+    assert [p["id"] for p in first["products"]] == ids[:2] and first["has_more"]
+    rest = client.get(f"/api/products/changes?cursor={first['cursor']}", headers=headers).json()
+    assert [p["id"] for p in rest["products"]] == ids[2:] and not rest["has_more"]
+    
+    client.put(f"/api/products/{ids[0]}", json={"price": 7.5}, headers=headers)
+    client.delete(f"/api/products/{ids[1]}", headers=headers)
+    changes = client.get(f"/api/products/changes?cursor={rest['cursor']}", headers=headers).json()
+    assert [(p["id"], p["price"]) for p in changes["products"]] == [(ids[0], 7.5)]
+    assert [d["id"] for d in changes["deleted"]] == [ids[1]]
+    idle = client.get(f"/api/products/changes?cursor={changes['cursor']}", headers=headers).json()
+    assert idle["products"] == [] and idle["deleted"] == []
+    
+    bad = client.get("/api/products/changes?cursor=garbage", headers=headers)
+    assert bad.status_code == 400
+
+def test_product_history_and_recent_activity_paginate(client, admin_token):
+    """Test newest-first keyset pagination of the history endpoints"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    product_id = client.post("/api/products/", json={
+        "name": "Tracked", "sku": "HIST-1", "price": 1.0, "quantity": 0
+    }, headers=headers).json()["id"]
+    for quantity in range(1, 5):
+        client.put(f"/api/products/{product_id}", json={"quantity": quantity}, headers=headers)
+    
+    def walk(url, params):
+        seen = []
+        while True:
+            response = client.get(url, params=params, headers=headers)
+            assert response.status_code == 200
+            seen.extend(response.json())
+            if "X-Next-Cursor" not in response.headers:
+                return seen
+            params = {**params, "cursor": response.headers["X-Next-Cursor"]}
+    
+    history = walk(f"/api/products/{product_id}/history", {"limit": 2})
+    assert [h["action"] for h in history] == ["updated"] * 4 + ["added"]
+    ids = [h["id"] for h in history]
+    assert ids == sorted(ids, reverse=True)
+    
+    activity = walk("/api/reports/recent-activity", {"limit": 3})
+    assert [a["id"] for a in activity] == ids
+
+def test_product_daily_history(client, admin_token):
+    """Test reading compacted daily totals for a product"""
+    from datetime import date
+    from models import InventoryHistoryDaily
+    db = TestSessionLocal()
+    db.add_all([
+        InventoryHistoryDaily(product_id=3, day=date(2023, 1, 1), action="stock_change", events=4, quantity_change=-6),
+        InventoryHistoryDaily(product_id=3, day=date(2023, 1, 2), action="updated", events=1, quantity_change=2),
+        InventoryHistoryDaily(product_id=4, day=date(2023, 1, 1), action="added", events=1, quantity_change=9),
+    ])
+    db.commit()
+    db.close()
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    
+    response = client.get("/api/products/3/history/daily", params={"since": "2023-01-02"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == [
+        {"product_id": 3, "day": "2023-01-02", "action": "updated", "events": 1, "quantity_change": 2}
+    ]
+
 def test_get_stats_as_admin(client, admin_token):
     """Test getting statistics as admin"""
     response = client.get(
@@ -229,5 +641,336 @@ def test_get_stats_as_admin(client, admin_token):
     assert "total_value" in response.json()
     assert "low_stock_items" in response.json()
 
+def test_bulk_import_products(client, admin_token):
+    """Test bulk import with a per-row error report"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.post("/api/products/import", json=[
+        {"name": "Bulk 1", "sku": "BULK-1", "price": 1.0, "quantity": 5},
+        {"name": "Bulk 2", "sku": "BULK-2"},
+    ], headers=headers)
+    assert response.status_code == 200
+    assert response.json()["created"] == 1
+    assert response.json()["failed"] == 1
+    assert response.json()["errors"][0]["row"] == 2
+    
+    csv_body = "name,sku,price,quantity\nBulk 1 v2,BULK-1,2.0,7\n"
+    response = client.post(
+        "/api/products/import/csv",
+        files={"file": ("catalog.csv", csv_body, "text/csv")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["updated"] == 1
+
+def test_export_products_streams_csv(client, admin_token):
+    """Test streaming product export as admin"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/api/products/", json={
+        "name": "Exported",
+        "sku": "EXP-001",
+        "price": 5.0
+    }, headers=headers)
+    
+    response = client.get("/api/exports/products", params={"format": "csv"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].startswith("id,name,sku")
+    assert "EXP-001" in lines[1]
+
+def test_get_stats_matches_python_semantics(client, admin_token):
+    """Test that rebuilt rollups match per-row Python computation"""
+    db = TestSessionLocal()
+    db.add_all([
+        Product(name="A", sku="S-1", category="Tools", price=2.5, quantity=4, min_stock_level=10),
+        Product(name="B", sku="S-2", category="Tools", price=1.0, quantity=0, min_stock_level=10),
+        Product(name="C", sku="S-3", category="", price=3.0, quantity=10, min_stock_level=10),
+        Product(name="D", sku="S-4", category=None, price=7.0, quantity=50, min_stock_level=5),
+        Product(name="E", sku="S-5", category="Food", price=0.5, quantity=0, min_stock_level=0),
+    ])
+    db.commit()
+    rebuild_rollups(db)
+    db.commit()
+    products = db.query(Product).all()
+    expected = {
+        "total_products": len(products),
+        "total_value": sum(p.price * p.quantity for p in products),
+        "low_stock_items": sum(1 for p in products if p.quantity <= p.min_stock_level and p.quantity > 0),
+        "out_of_stock_items": sum(1 for p in products if p.quantity == 0),
+        "total_categories": db.query(Product.category).distinct().count()
+    }
+    db.close()
+    
+    response = client.get(
+        "/api/reports/stats",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.status_code == 200
+    assert response.json() == expected
+    assert expected["total_categories"] == 4
+
+def test_rollups_follow_product_writes(client, admin_token):
+    """Test that create/update/delete keep the rollups equal to a full rebuild"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    ids = []
+    for i, (category, quantity) in enumerate([("Tools", 5), ("Tools", 0), ("Food", 40)]):
+        response = client.post("/api/products/", json={
+            "name": f"Item {i}",
+            "sku": f"ROLL-{i}",
+            "category": category,
+            "price": 2.0,
+            "quantity": quantity
+        }, headers=headers)
+        ids.append(response.json()["id"])
+    client.put(f"/api/products/{ids[1]}", json={"quantity": 3, "category": "Food"}, headers=headers)
+    client.delete(f"/api/products/{ids[0]}", headers=headers)
+    client.post("/api/products/import", json=[
+        {"name": "Item 2", "sku": "ROLL-2", "category": "Garden", "price": 1.0, "quantity": 0}
+    ], headers=headers)
+    
+    incremental = client.get("/api/reports/stats", headers=headers).json()
+    categories = client.get("/api/reports/category-stats", headers=headers).json()
+    rebuilt = client.post("/api/reports/rollups/rebuild", headers=headers)
+    assert rebuilt.status_code == 200
+    
+    assert incremental == client.get("/api/reports/stats", headers=headers).json()
+    assert incremental == {
+        "total_products": 2,
+        "total_value": 6.0,
+        "low_stock_items": 1,
+        "out_of_stock_items": 1,
+        "total_categories": 2
+    }
+    assert categories == [
+        {"category": "Food", "product_count": 1, "total_value": 6.0},
+        {"category": "Garden", "product_count": 1, "total_value": 0.0}
+    ]
+
+def test_rollups_rebuild_matches_incremental_nulls_and_values(client, admin_token):
+    """Test NULL quantities count as out of stock and repeated deltas don't drift"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(10):
+        client.post("/api/products/", json={
+            "name": f"Item {i}", "sku": f"DRIFT-{i}", "category": "Bulk", "price": 0.1, "quantity": 1
+        }, headers=headers)
+    response = client.post("/api/products/", json={
+        "name": "Unknown", "sku": "DRIFT-NULL", "category": "Bulk", "price": 1.0, "quantity": 0
+    }, headers=headers)
+    db = TestSessionLocal()
+    db.query(Product).filter(Product.id == response.json()["id"]).update({Product.quantity: None})
+    db.commit()
+    db.close()
+
+    incremental = client.get("/api/reports/stats", headers=headers).json()
+    assert incremental["total_value"] == 1.0
+    assert incremental["out_of_stock_items"] == 1
+    client.post("/api/reports/rollups/rebuild", headers=headers)
+    assert client.get("/api/reports/stats", headers=headers).json() == incremental
+
+def test_rollups_rebuild_bumps_version_in_the_same_commit(client, admin_token):
+    """Test the recount and the catalog version bump commit together"""
+    from sqlalchemy import event
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    etag = client.get("/api/reports/stats", headers=headers).headers["ETag"]
+
+    commits = []
+    def record(conn):
+        commits.append(conn)
+    event.listen(async_engine.sync_engine, "commit", record)
+    try:
+        response = client.post("/api/reports/rollups/rebuild", headers=headers)
+    finally:
+        event.remove(async_engine.sync_engine, "commit", record)
+    assert response.status_code == 200
+    assert len(commits) == 1
+    assert client.get("/api/reports/stats", headers=headers).headers["ETag"] != etag
+
+def test_rollups_keep_null_and_empty_categories_apart(client, admin_token):
+    """Test that incremental updates of a NULL-category product stay in its own rollup row"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/api/products/", json={"name": "Rug", "sku": "NULL-0", "price": 4.0, "quantity": 1}, headers=headers)
+    db = TestSessionLocal()
+    db.add(Product(name="Lamp", sku="NULL-1", category=None, price=10.0, quantity=3, min_stock_level=5))
+    db.commit()
+    lamp_id = db.query(Product.id).filter(Product.sku == "NULL-1").scalar()
+    rebuild_rollups(db)
+    db.commit()
+    db.close()
+
+    client.put(f"/api/products/{lamp_id}", json={"quantity": 0}, headers=headers)
+    incremental = client.get("/api/reports/stats", headers=headers).json()
+    assert (incremental["total_categories"], incremental["out_of_stock_items"]) == (2, 1)
+    client.post("/api/reports/rollups/rebuild", headers=headers)
+    assert client.get("/api/reports/stats", headers=headers).json() == incremental
+
+def test_get_stats_empty_catalog(client, admin_token):
+    """Test stats on an empty catalog"""
+    response = client.get(
+        "/api/reports/stats",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert response.json() == {
+        "total_products": 0,
+        "total_value": 0.0,
+        "low_stock_items": 0,
+        "out_of_stock_items": 0,
+        "total_categories": 0
+    }
+
+def test_report_cache_hits_and_follows_product_writes(client, admin_token):
+    """Test that repeated report reads hit the cache and a product write invalidates it"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    created = client.post("/api/products/", json={
+        "name": "Cached", "sku": "CACHE-1", "price": 1.0, "quantity": 2, "min_stock_level": 5
+    }, headers=headers).json()
+    
+    first = client.get("/api/reports/low-stock", headers=headers)
+    second = client.get("/api/reports/low-stock", headers=headers)
+    assert [p["sku"] for p in second.json()] == ["CACHE-1"]
+    assert second.json() == first.json()
+    assert second.headers["etag"] == first.headers["etag"]
+    
+    client.put(f"/api/products/{created['id']}", json={"quantity": 20}, headers=headers)
+    assert client.get("/api/reports/low-stock", headers=headers).json() == []
+    
+    # Cursors are cached with the page they belong to
+    for page in range(2):
+        response = client.get("/api/reports/recent-activity", params={"limit": 1}, headers=headers)
+        assert response.headers["x-next-cursor"]
+    
+    stats = client.get("/api/admin/report-cache", headers=headers).json()
+    assert stats["endpoints"]["low-stock"] == {"hits": 1, "misses": 2, "errors": 0, "hit_rate": 1 / 3}
+    assert stats["endpoints"]["recent-activity"]["hits"] == 1
+
+def test_stock_movement_report(client, admin_token):
+    """Test the movement report over product writes made through the API"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    created = client.post("/api/products/", json={
+        "name": "Mover", "sku": "MOVE-1", "category": "Tools", "price": 1.0, "quantity": 8
+    }, headers=headers).json()
+    client.put(f"/api/products/{created['id']}", json={"quantity": 5}, headers=headers)
+    
+    response = client.get("/api/reports/stock-movements", params={"period": "month", "group_by": "category"}, headers=headers)
+    assert response.status_code == 200
+    [bucket] = response.json()
+    assert bucket["category"] == "Tools"
+    assert (bucket["inbound"], bucket["outbound"], bucket["net"], bucket["events"]) == (8, 3, 5, 2)
+    
+    response = client.get("/api/reports/stock-movements", params={"period": "year"}, headers=headers)
+    assert response.status_code == 422
+
+async def read_feed(query: str, events: int, during=None) -> list:
+    """Run the SSE route over raw ASGI until `events` events arrive; returns (event, data) pairs"""
+    body, done = b"", asyncio.Event()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/live/products", "raw_path": b"/api/live/products", "query_string": query.encode(),
+        "headers": [], "server": ("testserver", 80), "client": ("127.0.0.1", 1234), "root_path": "",
+    }
+    
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+    
+    async def send(message):
+        nonlocal body
+        if message["type"] == "http.response.body":
+            body += message.get("body", b"")
+            if body.count(b"\n\n") >= events:
+                done.set()
+    
+    app_task = asyncio.create_task(app(scope, receive, send))
+    while not body and not app_task.done():
+        await asyncio.sleep(0.01)
+    if during:
+        await asyncio.to_thread(during)
+    await asyncio.wait_for(app_task, 5)
+    parsed = []
+    for block in body.decode().strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return parsed
+
+def test_live_feed_streams_and_resumes(client, admin_token):
+    """Test that product writes reach the feed as deltas and a reconnect resumes after the last id"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    created = client.post("/api/products/", json={"name": "Live", "sku": "LIVE-1", "price": 1.0, "quantity": 9}, headers=headers).json()
+    
+    def write():
+        client.post("/api/products/stock-movements", json={"movements": [{"sku": "LIVE-1", "delta": -4}]}, headers=headers)
+        client.put(f"/api/products/{created['id']}", json={"name": "Live renamed"}, headers=headers)
+        client.delete(f"/api/products/{created['id']}", headers=headers)
+    
+    events = asyncio.run(read_feed(f"token={admin_token}", 4, during=write))
+    ready, stock, renamed, deleted = events
+    assert ready[1] == "ready"
+    assert stock[2]["changes"] == [{"op": "stock", "product": {**stock[2]["changes"][0]["product"], "quantity": 5}}]
+    assert renamed[2]["changes"][0]["product"]["name"] == "Live renamed"
+    assert deleted[2]["changes"] == [{"op": "deleted", "id": created["id"]}]
+    assert int(ready[0]) < int(stock[0]) < int(renamed[0]) < int(deleted[0])
+    
+    # Resuming after the stock change replays the two later events
+    resumed = asyncio.run(read_feed(f"token={admin_token}&last_event_id={stock[0]}", 2))
+    assert resumed == [renamed, deleted]
+    # An id from before the feed started can't be replayed
+    assert asyncio.run(read_feed(f"token={admin_token}&last_event_id=0", 1))[0][1] == "reset"
+    
+    response = client.get("/api/live/products", params={"token": "not-a-token"})
+    assert response.status_code == 401
+
+def test_pool_status_requires_admin(client, admin_token, test_user):
+    """Test the pool stats admin endpoint"""
+    response = client.get("/api/admin/pool", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    assert "pool_class" in response.json()["async"]
+    
+    token = client.post("/api/auth/login", json=test_user).json()["access_token"]
+    response = client.get("/api/admin/pool", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+
+def test_slow_query_log_admin_endpoint(client, admin_token, test_user):
+    """Test reading and clearing the slow-query log"""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/api/admin/slow-queries?sort=max_ms&limit=5", headers=headers)
+    assert response.status_code == 200
+    assert {"threshold_ms", "recorded", "top"} <= response.json().keys()
+    assert client.delete("/api/admin/slow-queries", headers=headers).status_code == 200
+    
+    token = client.post("/api/auth/login", json=test_user).json()["access_token"]
+    response = client.get("/api/admin/slow-queries", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
+
+def test_metrics_endpoint_counts_queries_per_route(client, admin_token):
+    """Test that async routes report their SQL statements on /metrics"""
+    request_metrics.clear()
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for _ in range(2):
+        assert client.get("/api/products/", headers=headers).status_code == 200
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = dict(line.rsplit(" ", 1) for line in response.text.splitlines() if not line.startswith("#"))
+    labels = '{method="GET",route="/api/products/"}'
+    assert lines[f"http_request_db_queries_count{labels}"] == "2"
+    assert int(lines[f"http_request_db_queries_sum{labels}"]) >= 2
+    assert float(lines[f"http_request_db_seconds_sum{labels}"]) > 0
+    assert f'http_request_duration_seconds_count{{method="GET",route="/api/products/",status="200"}}' in lines
+
+def test_import_across_many_categories_is_not_flagged_as_n_plus_one(client, admin_token):
+    """Test rollup upserts for every touched category go out as one statement"""
+    request_metrics.clear()
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.post("/api/products/import", json=[
+        {"name": f"Item {i}", "sku": f"CAT-{i}", "category": f"Category {i}", "price": 1.0, "quantity": 5}
+        for i in range(30)
+    ], headers=headers)
+    assert response.status_code == 200
+
+    lines = dict(line.rsplit(" ", 1) for line in client.get("/metrics").text.splitlines() if not line.startswith("#"))
+    assert f'http_request_n_plus_one_total{{method="POST",route="/api/products/import"}}' not in lines
+    categories = client.get("/api/reports/category-stats", headers=headers).json()
+    assert len(categories) == 30
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -1,8 +1,14 @@
 """
 Unit tests for authentication module
 """
+import asyncio
+import threading
+import bcrypt
 import pytest
-from auth import get_password_hash, verify_password, create_access_token, decode_token
+from fastapi import HTTPException
+import auth
+from auth import get_password_hash, verify_password, create_access_token, decode_token, UserCache, CachedUser
+from auth import PasswordHasher, password_needs_rehash
 
 def test_password_hashing():
     """Test password hashing functionality"""
@@ -82,5 +88,94 @@ def test_multiple_users_different_hashes():
     assert verify_password(password, hash1) == True
     assert verify_password(password, hash2) == True
 
+def make_user(username, role="customer"):
+    return CachedUser(id=1, username=username, email=f"{username}@example.com", role=role, is_active=True)
+
+def test_user_cache_evicts_least_recently_used():
+    """Test that the cache stays bounded and evicts the LRU entry"""
+    cache = UserCache(maxsize=2, ttl=60)
+    cache.set(make_user("a"))
+    cache.set(make_user("b"))
+    assert cache.get("a") is not None
+    cache.set(make_user("c"))
+    
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["size"] == 2
+
+def test_user_cache_expires_entries():
+    """Test that entries expire after the TTL"""
+    now = [100.0]
+    cache = UserCache(maxsize=10, ttl=5, clock=lambda: now[0])
+    cache.set(make_user("a"))
+    now[0] += 4.9
+    assert cache.get("a") is not None
+    now[0] += 0.2
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_user_cache_invalidate():
+    """Test explicit invalidation"""
+    cache = UserCache(maxsize=10, ttl=60)
+    cache.set(make_user("a", role="admin"))
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+def test_password_needs_rehash(monkeypatch):
+    """Test detection of hashes made with a different cost factor"""
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    current = get_password_hash("secret")
+    old = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4)).decode("utf-8")
+    
+    assert current.startswith("$2b$05$")
+    assert password_needs_rehash(current) == False
+    assert password_needs_rehash(old) == True
+    assert password_needs_rehash("not-a-bcrypt-hash") == True
+
+def test_password_hasher_rejects_when_full():
+    """Test that the bounded hasher fails fast with 503 once saturated"""
+    hasher = PasswordHasher(workers=1, queue_limit=0)
+    release = threading.Event()
+    
+    async def scenario():
+        busy = asyncio.ensure_future(hasher.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        assert not hasher.has_idle_worker()
+        with pytest.raises(HTTPException) as exc:
+            await hasher.run(verify_password, "x", "y")
+        release.set()
+        await busy
+        return exc.value
+    
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["in_flight"] == 0
+
+def test_password_hasher_keeps_slot_of_cancelled_request():
+    """Test that a cancelled caller doesn't free the slot while its job still runs"""
+    hasher = PasswordHasher(workers=1, queue_limit=0)
+    release = threading.Event()
+
+    async def scenario():
+        busy = asyncio.ensure_future(hasher.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        busy.cancel()
+        await asyncio.sleep(0.05)
+        assert hasher.stats()["in_flight"] == 1
+        with pytest.raises(HTTPException):
+            await hasher.run(verify_password, "x", "y")
+        release.set()
+        for _ in range(100):
+            if hasher.stats()["in_flight"] == 0:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert hasher.stats()["in_flight"] == 0
+    assert hasher.stats()["rejected"] == 1
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,139 @@
+"""
+Unit tests for bulk product import
+"""
+import asyncio
+import io
+import orjson
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from models import Base, Product, InventoryHistory
+import importer
+from importer import import_products, read_csv
+from live_feed import change_broker
+
+TEST_DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(TEST_DATABASE_URL)
+TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db_session():
+    """Create a fresh database for each test"""
+    Base.metadata.create_all(bind=engine)
+    session = TestSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+def test_import_creates_products_in_chunks(db_session):
+    """Test that new SKUs are inserted with one history row each"""
+    records = [{"name": f"P{i}", "sku": f"SKU-{i}", "price": 1.5, "quantity": i} for i in range(25)]
+    report = import_products(db_session, records, "admin", chunk_size=10)
+    
+    assert report.created == 25
+    assert report.updated == 0
+    assert report.failed == 0
+    assert db_session.query(Product).count() == 25
+    history = db_session.query(InventoryHistory).filter_by(action="added").all()
+    assert len(history) == 25
+    assert sum(h.quantity_change for h in history) == sum(range(25))
+
+def test_import_upserts_existing_sku(db_session):
+    """Test that an existing SKU is updated and its quantity delta logged"""
+    db_session.add(Product(name="Old", sku="SKU-1", price=1.0, quantity=10))
+    db_session.commit()
+    
+    report = import_products(db_session, [
+        {"name": "New", "sku": "SKU-1", "price": 2.0, "quantity": 4},
+    ], "admin")
+    
+    assert report.updated == 1
+    product = db_session.query(Product).filter_by(sku="SKU-1").one()
+    assert product.name == "New"
+    assert product.quantity == 4
+    history = db_session.query(InventoryHistory).filter_by(product_id=product.id).one()
+    assert history.action == "updated"
+    assert history.quantity_change == -6
+
+def test_partial_import_keeps_omitted_columns(db_session):
+    """Test that a sku,price CSV only changes the price of an existing product"""
+    db_session.add(Product(
+        name="Rope", sku="SKU-1", description="10m nylon", category="Tools", price=1.0,
+        quantity=25, min_stock_level=3, supplier="Acme"
+    ))
+    db_session.commit()
+
+    data = b"sku,price\nSKU-1,2.75\nSKU-2,1.00\n"
+    report = import_products(db_session, read_csv(io.BytesIO(data)), "admin")
+
+    assert (report.updated, report.created, report.failed) == (1, 0, 1)
+    assert report.errors[0].sku == "SKU-2" and "name" in report.errors[0].error
+    product = db_session.query(Product).filter_by(sku="SKU-1").one()
+    assert (product.name, product.description, product.category, product.price) == ("Rope", "10m nylon", "Tools", 2.75)
+    assert (product.quantity, product.min_stock_level, product.supplier) == (25, 3, "Acme")
+    history = db_session.query(InventoryHistory).filter_by(product_id=product.id).one()
+    assert history.quantity_change == 0
+
+def test_import_reports_bad_rows_without_aborting(db_session):
+    """Test that invalid and duplicate rows are reported and skipped"""
+    report = import_products(db_session, [
+        {"name": "Good", "sku": "A", "price": 1.0},
+        {"name": "No price", "sku": "B"},
+        {"name": "Bad qty", "sku": "C", "price": 1.0, "quantity": "lots"},
+        {"name": "Again", "sku": "A", "price": 3.0},
+        {"name": "Also good", "sku": "D", "price": 2.0},
+    ], "admin")
+    
+    assert report.created == 2
+    assert report.failed == 3
+    assert [e.row for e in report.errors] == [2, 3, 4]
+    assert "price" in report.errors[0].error
+    assert "Duplicate SKU" in report.errors[2].error
+    assert {p.sku for p in db_session.query(Product).all()} == {"A", "D"}
+
+def test_row_failing_its_savepoint_is_not_published(db_session, monkeypatch):
+    """Test that live feed events of a row rolled back in the per-row retry are dropped"""
+    record = importer.record_product_changes
+
+    def reject_bad(db, changes):
+        version = record(db, changes)  # captures feed events first
+        if any(after.sku == "BAD" for _, after in changes):
+            raise OperationalError("INSERT", {}, Exception("rejected"))
+        return version
+    monkeypatch.setattr(importer, "record_product_changes", reject_bad)
+
+    publish = change_broker.publish
+    published_in_savepoint = []
+    def spy(feed_event):
+        published_in_savepoint.append(db_session.in_nested_transaction())
+        publish(feed_event)
+    monkeypatch.setattr(change_broker, "publish", spy)
+
+    async def subscribe(last_event_id):
+        return change_broker.subscribe(last_event_id, current_version=0)[1]
+    change_broker.reset()
+    asyncio.run(subscribe(0))
+    report = import_products(db_session, [
+        {"name": "Good", "sku": "A", "price": 1.0},
+        {"name": "Rejected", "sku": "BAD", "price": 1.0},
+        {"name": "Also good", "sku": "C", "price": 1.0},
+    ], "admin")
+
+    assert (report.created, report.failed) == (2, 1)
+    published = asyncio.run(subscribe(0))
+    change_broker.reset()
+    skus = [change["product"]["sku"] for e in published for change in orjson.loads(e.data)["changes"]]
+    assert skus == ["A", "C"]
+    # Published by the outer commit, not as each row's savepoint was released
+    assert published_in_savepoint == [False, False]
+
+def test_read_csv_skips_empty_cells():
+    """Test that blank CSV cells fall back to the model defaults"""
+    data = b"name,sku,price,quantity,category\nWidget,W-1,2.50,,Tools\n"
+    assert list(read_csv(io.BytesIO(data))) == [
+        {"name": "Widget", "sku": "W-1", "price": "2.50", "category": "Tools"}
+    ]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
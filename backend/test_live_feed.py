@@ -0,0 +1,56 @@
+"""
+Unit tests for the live product change broker
+"""
+import asyncio
+from live_feed import ChangeBroker, FeedEvent, event_stream
+
+def feed_event(event_id):
+    return FeedEvent(event_id, "products", b'{"version":%d}' % event_id)
+
+async def drain(subscription):
+    events = []
+    await asyncio.sleep(0)  # let call_soon_threadsafe deliveries run
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+def test_resume_from_ring_buffer_or_reset():
+    """Test resuming after a buffered id, and a reset once it has been evicted"""
+    async def scenario():
+        broker = ChangeBroker(buffer_size=3, queue_size=10)
+        live, backlog = broker.subscribe(5, current_version=5)
+        assert backlog == []
+        for event_id in (6, 8, 7, 9):   # commits may finish out of order
+            broker.publish(feed_event(event_id))
+        assert [e.id for e in await drain(live)] == [6, 8, 7, 9]
+        
+        _, backlog = broker.subscribe(7, current_version=9)
+        assert [e.id for e in backlog] == [8, 9]
+        # Event 6 was evicted, so a client that saw only 5 must refetch
+        _, backlog = broker.subscribe(5, current_version=9)
+        assert backlog is None
+        assert broker.stats()["oldest_resumable_id"] == 6
+    
+    asyncio.run(scenario())
+
+def test_slow_connection_is_cut_off_at_its_queue_bound():
+    """Test that a connection that stops reading is closed instead of buffering without limit"""
+    async def scenario():
+        broker = ChangeBroker(buffer_size=100, queue_size=2)
+        subscription, backlog = broker.subscribe(0, current_version=0)
+        for event_id in range(1, 6):
+            broker.publish(feed_event(event_id))
+        await asyncio.sleep(0)
+        assert subscription.queue.qsize() == 3   # two events and the overflow marker
+        assert broker.stats()["overflows"] == 1
+        
+        stream = event_stream(broker, subscription, backlog, 0, heartbeat=0.01)
+        chunks = [chunk async for chunk in stream]
+        assert chunks[0].startswith(b"id: 0\nevent: ready\n")
+        assert [c.split(b"\n")[0] for c in chunks[1:]] == [b"id: 1", b"id: 2"]
+        # The stream ended and unsubscribed; the client resumes from the buffer
+        _, backlog = broker.subscribe(2, current_version=5)
+        assert [e.id for e in backlog] == [3, 4, 5]
+        assert broker.stats()["connections"] == 1
+    
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+"""
+Tests for request metrics and the /metrics endpoint
+"""
+import logging
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from metrics import Histogram, MetricsMiddleware, RequestMetrics
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+def build_app(metrics: RequestMetrics) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=metrics, n_plus_one_threshold=5)
+    
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        with engine.connect() as conn:
+            return {"id": conn.execute(text("SELECT :id"), {"id": item_id}).scalar()}
+    
+    @app.get("/items")
+    def list_items():
+        # One query per item: the N+1 shape
+        with engine.connect() as conn:
+            return [conn.execute(text("SELECT :id"), {"id": i}).scalar() for i in range(8)]
+    
+    return app
+
+@pytest.fixture
+def metrics():
+    """Metrics registry and a client for an app that records into it"""
+    metrics = RequestMetrics()
+    return metrics, TestClient(build_app(metrics))
+
+def test_histogram_renders_cumulative_buckets():
+    """Test Prometheus histogram output"""
+    histogram = Histogram("latency_seconds", "Latency", ("route",), (0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(("/a",), value)
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 4.25' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+
+def test_requests_recorded_per_route_template(metrics):
+    """Test latency, query count and size are labelled with the route template"""
+    metrics, client = metrics
+    for item_id in (1, 2, 3):
+        assert client.get(f"/items/{item_id}").status_code == 200
+    client.get("/missing")
+    
+    assert metrics.request_duration.count(("GET", "/items/{item_id}", "200")) == 3
+    assert metrics.request_duration.count(("GET", "unmatched", "404")) == 1
+    text_output = metrics.render()
+    assert 'http_request_db_queries_sum{method="GET",route="/items/{item_id}"} 3' in text_output
+    assert 'http_request_db_queries_bucket{method="GET",route="/items/{item_id}",le="1"} 3' in text_output
+    assert 'http_response_size_bytes_count{method="GET",route="/items/{item_id}"} 3' in text_output
+
+def test_repeated_statement_flagged_as_n_plus_one(metrics, caplog):
+    """Test a request running one statement per item is counted and logged"""
+    metrics, client = metrics
+    with caplog.at_level(logging.WARNING, logger="inventory.metrics"):
+        client.get("/items")
+        client.get("/items/1")
+    
+    assert metrics.n_plus_one.value(("GET", "/items")) == 1
+    assert metrics.n_plus_one.value(("GET", "/items/{item_id}")) == 0
+    assert "Possible N+1 on GET /items: 8 statements, one ran 8 times" in caplog.text
@@ -0,0 +1,120 @@
+"""
+Tests for the versioned schema migrations
+"""
+import os
+import tempfile
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import sessionmaker
+from migrations import MIGRATIONS, pending_migrations, run_migrations, schema_migrations
+
+@pytest.fixture
+def engine():
+    """A fresh SQLite file per test"""
+    path = os.path.join(tempfile.mkdtemp(), "migrations.db")
+    engine = create_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+def test_migrations_build_schema_and_run_once(engine):
+    """Test that migrations create the schema and are only applied once"""
+    # Checking for pending migrations doesn't write to the database
+    assert pending_migrations(engine) == MIGRATIONS
+    assert inspect(engine).get_table_names() == []
+    
+    applied = run_migrations(engine, log=lambda message: None)
+    assert applied == [m.version for m in MIGRATIONS]
+    
+    inspector = inspect(engine)
+    assert {"users", "products", "inventory_history", "category_rollups"} <= set(inspector.get_table_names())
+    history_indexes = {i["name"] for i in inspector.get_indexes("inventory_history")}
+    assert "ix_inventory_history_product_created_id" in history_indexes
+    assert "ix_inventory_history_created_id" in history_indexes
+    
+    assert run_migrations(engine, log=lambda message: None) == []
+    assert pending_migrations(engine) == []
+    with engine.connect() as conn:
+        versions = conn.execute(select(schema_migrations.c.version)).scalars().all()
+    assert versions == [m.version for m in MIGRATIONS]
+
+def test_migrations_upgrade_legacy_database(engine):
+    """Test upgrading a database created before suppliers and indexes existed"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE products (
+                id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, sku VARCHAR UNIQUE NOT NULL,
+                description TEXT, category VARCHAR, price FLOAT NOT NULL, quantity INTEGER,
+                min_stock_level INTEGER, created_at DATETIME, updated_at DATETIME
+            )
+        """))
+        conn.execute(text("""
+            INSERT INTO products (name, sku, category, price, quantity, min_stock_level)
+            VALUES ('Lamp', 'L-1', 'Home', 10.0, 3, 5)
+        """))
+    
+    run_migrations(engine, log=lambda message: None)
+    
+    columns = {c["name"] for c in inspect(engine).get_columns("products")}
+    assert "supplier" in columns
+    with engine.connect() as conn:
+        rollup = conn.execute(text("SELECT product_count, low_stock_count FROM category_rollups")).one()
+        matches = conn.execute(text("SELECT rowid FROM products_fts WHERE products_fts MATCH 'lamp'")).all()
+    assert tuple(rollup) == (1, 1)
+    assert len(matches) == 1
+    with engine.connect() as conn:
+        lamp = conn.execute(text("SELECT supplier, description, category, row_version FROM products")).one()
+    # NULL text columns are filled in, under a new catalog version for delta sync
+    assert tuple(lamp) == ("", "", "Home", 1)
+
+def test_snapshot_watermark_migration_continues_after_last_snapshot(engine):
+    """Test that existing movement snapshots seed the explicit watermark"""
+    run_migrations(engine, log=lambda message: None)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE movement_snapshot_state"))
+        conn.execute(schema_migrations.delete().where(schema_migrations.c.version == 14))
+        conn.execute(text("""
+            INSERT INTO stock_movement_daily (product_id, day, category, inbound, outbound, events)
+            VALUES (1, '2024-05-06', 'Tools', 10, 3, 2)
+        """))
+    
+    assert run_migrations(engine, log=lambda message: None) == [14]
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT next_day FROM movement_snapshot_state")) == "2024-05-07"
+
+def test_rollup_migration_splits_null_and_empty_categories(engine):
+    """Test that a rollup table from before null_category is rebuilt with separate rows"""
+    run_migrations(engine, log=lambda message: None)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE category_rollups"))
+        conn.execute(text("""
+            CREATE TABLE category_rollups (
+                category VARCHAR PRIMARY KEY, product_count INTEGER NOT NULL, total_value FLOAT NOT NULL,
+                low_stock_count INTEGER NOT NULL, out_of_stock_count INTEGER NOT NULL, updated_at DATETIME
+            )
+        """))
+        conn.execute(schema_migrations.delete().where(schema_migrations.c.version == 15))
+        conn.execute(text("""
+            INSERT INTO products (name, sku, category, price, quantity, min_stock_level, row_version)
+            VALUES ('Lamp', 'L-1', NULL, 10.0, 3, 5, 0), ('Rug', 'R-1', '', 4.0, 1, 0, 0)
+        """))
+    
+    assert run_migrations(engine, log=lambda message: None) == [15]
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT category, null_category, product_count FROM category_rollups ORDER BY null_category"
+        )).all()
+    assert [tuple(row) for row in rows] == [("", 0, 1), ("", 1, 1)]
+
+def test_prepare_database_requires_migrations(engine):
+    """Test that startup refuses an unmigrated database unless told to migrate"""
+    from main import prepare_database
+    from models import User
+    
+    session_factory = sessionmaker(bind=engine)
+    with pytest.raises(RuntimeError, match="migration"):
+        prepare_database(engine, session_factory, migrate=False)
+    prepare_database(engine, session_factory, migrate=True)
+    prepare_database(engine, session_factory, migrate=False)
+    
+    with session_factory() as db:
+        assert db.scalars(select(User.username)).all() == ["admin"]
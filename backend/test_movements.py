@@ -0,0 +1,105 @@
+"""
+Tests for the time-bucketed stock movement report
+"""
+import os
+import tempfile
+from datetime import date, datetime
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import InventoryHistory, InventoryHistoryDaily, Product, StockMovementDaily
+import movements
+from movements import movement_report, snapshot_movements
+
+@pytest.fixture
+def db_session():
+    """A fresh SQLite file per test"""
+    path = os.path.join(tempfile.mkdtemp(), "movements.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Product(id=1, name="Hammer", sku="H-1", category="Tools", price=1.0, quantity=0),
+        Product(id=2, name="Apple", sku="A-1", category=None, price=1.0, quantity=0),
+    ])
+    for product_id, created_at, change in [
+        (1, datetime(2024, 5, 6, 9, 0), 10),    # Monday
+        (1, datetime(2024, 5, 6, 17, 0), -3),
+        (2, datetime(2024, 5, 12, 23, 59), -2),  # Sunday, same week
+        (2, datetime(2024, 5, 13, 0, 0), 4),     # next Monday
+        (1, datetime(2024, 6, 3, 8, 0), 5),
+    ]:
+        session.add(InventoryHistory(product_id=product_id, action="stock_change", quantity_change=change,
+                                     performed_by="test", created_at=created_at))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+def report(session, period, group_by="product", **filters):
+    rows = movement_report(session, period, group_by, date(2024, 4, 1), date(2024, 7, 1), **filters)
+    key = "product_id" if group_by == "product" else "category"
+    return [(r["period_start"].isoformat(), r[key], r["inbound"], r["outbound"], r["net"]) for r in rows]
+
+def test_movement_buckets_match_with_and_without_snapshots(db_session):
+    """Test day/week/month buckets, and that snapshots do not change the numbers"""
+    live = {period: report(db_session, period) for period in ("day", "week", "month")}
+    assert live["day"] == [
+        ("2024-05-06", 1, 10, 3, 7),
+        ("2024-05-12", 2, 0, 2, -2),
+        ("2024-05-13", 2, 4, 0, 4),
+        ("2024-06-03", 1, 5, 0, 5),
+    ]
+    assert live["week"] == [
+        ("2024-05-06", 1, 10, 3, 7),
+        ("2024-05-06", 2, 0, 2, -2),
+        ("2024-05-13", 2, 4, 0, 4),
+        ("2024-06-03", 1, 5, 0, 5),
+    ]
+    assert live["month"] == [("2024-05-01", 1, 10, 3, 7), ("2024-05-01", 2, 4, 2, 2), ("2024-06-01", 1, 5, 0, 5)]
+    
+    # Snapshot through June 1st; June 3rd is still read from the raw log
+    assert snapshot_movements(db_session, through=date(2024, 6, 1)) == 3
+    assert snapshot_movements(db_session, through=date(2024, 6, 1)) == 0
+    assert db_session.query(StockMovementDaily).count() == 3
+    for period, expected in live.items():
+        assert report(db_session, period) == expected
+    
+    assert report(db_session, "month", "category") == [("2024-05-01", "", 4, 2, 2), ("2024-05-01", "Tools", 10, 3, 7),
+                                                       ("2024-06-01", "Tools", 5, 0, 5)]
+    assert report(db_session, "month", product_id=2) == [("2024-05-01", 2, 4, 2, 2)]
+    assert report(db_session, "month", "category", category="Tools") == [("2024-05-01", "Tools", 10, 3, 7),
+                                                                        ("2024-06-01", "Tools", 5, 0, 5)]
+
+def test_snapshot_watermark_advances_over_quiet_days(db_session, monkeypatch):
+    """Test that days without movements are not rescanned by the next run"""
+    assert snapshot_movements(db_session, through=date(2024, 6, 20)) == 4
+    
+    snapshot_chunk = movements._snapshot_chunk
+    chunks = []
+    def spy(db, start, end):
+        chunks.append((start, end))
+        return snapshot_chunk(db, start, end)
+    monkeypatch.setattr(movements, "_snapshot_chunk", spy)
+    
+    assert snapshot_movements(db_session, through=date(2024, 6, 25)) == 0
+    assert snapshot_movements(db_session, through=date(2024, 6, 25)) == 0
+    assert chunks == [(date(2024, 6, 20), date(2024, 6, 25))]
+    # A rebuild of older days does not move the watermark back
+    snapshot_movements(db_session, since=date(2024, 5, 1), through=date(2024, 6, 1))
+    assert movements._watermark(db_session) == date(2024, 6, 25)
+    assert report(db_session, "month") == [("2024-05-01", 1, 10, 3, 7), ("2024-05-01", 2, 4, 2, 2),
+                                           ("2024-06-01", 1, 5, 0, 5)]
+
+def test_snapshots_include_compacted_history(db_session):
+    """Test that days already compacted by retention still reach the report"""
+    db_session.add(InventoryHistoryDaily(product_id=1, day=date(2024, 4, 30), action="stock_change",
+                                         events=2, quantity_change=-4))
+    db_session.commit()
+    
+    snapshot_movements(db_session, through=date(2024, 6, 1))
+    
+    assert report(db_session, "month")[0] == ("2024-04-01", 1, 0, 4, -4)
+    with pytest.raises(ValueError):
+        movement_report(db_session, period="year")
@@ -0,0 +1,141 @@
+"""
+Tests for the low-stock alert outbox and its delivery worker
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import OutboxEvent, Product
+from outbox import LogSink, OutboxWorker, WebhookSink
+from rollup import product_state
+from changes import record_product_changes
+import main
+from stock import StockMovement, apply_stock_movements
+
+@pytest.fixture
+def session_factory():
+    """A fresh SQLite file per test with one product above its threshold"""
+    path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    product = Product(name="Rope", sku="R-1", category="Tools", price=2.0, quantity=20, min_stock_level=5)
+    db.add(product)
+    db.flush()
+    record_product_changes(db, [(None, product_state(product))])
+    db.commit()
+    db.close()
+    yield Session
+    engine.dispose()
+
+@pytest.fixture
+def webhook():
+    """A local HTTP stand-in that records posted batches and can fail on demand"""
+    received, failures = [], []
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            status = failures.pop(0) if failures else 204
+            if status < 300:
+                received.append(body["events"])
+            self.send_response(status)
+            self.end_headers()
+        
+        def log_message(self, *args):
+            pass
+    
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/alerts", received, failures
+    server.shutdown()
+    server.server_close()
+
+def move(Session, delta):
+    db = Session()
+    report = apply_stock_movements(db, [StockMovement(sku="R-1", delta=delta)], "tester")
+    db.close()
+    assert not report.errors
+
+def events(Session):
+    db = Session()
+    rows = db.scalars(select(OutboxEvent).order_by(OutboxEvent.id)).all()
+    db.close()
+    return [(e.event_type, e.status) for e in rows]
+
+def test_threshold_crossings_are_recorded_with_the_write(session_factory):
+    """Test that only writes crossing min_stock_level queue an event"""
+    move(session_factory, -10)   # 20 -> 10: still above
+    assert events(session_factory) == []
+    move(session_factory, -5)    # 10 -> 5: crosses down
+    move(session_factory, -2)    # 5 -> 3: stays low
+    move(session_factory, 7)     # 3 -> 10: crosses up
+    assert events(session_factory) == [("low_stock", "pending"), ("restocked", "pending")]
+    
+    # A rolled-back write leaves nothing behind
+    db = session_factory()
+    report = apply_stock_movements(db, [StockMovement(sku="R-1", delta=-8), StockMovement(sku="NOPE", delta=1)], "tester")
+    db.close()
+    assert report.errors
+    assert len(events(session_factory)) == 2
+
+def test_worker_retries_then_delivers_newest_event_per_product(session_factory, webhook):
+    """Test batching, retry with backoff, superseding and the log sink"""
+    url, received, failures = webhook
+    log_path = os.path.join(tempfile.mkdtemp(), "alerts.ndjson")
+    worker = OutboxWorker(session_factory, [LogSink(log_path), WebhookSink(url)], retry_seconds=60)
+    move(session_factory, -18)   # low
+    move(session_factory, 20)    # restocked
+    move(session_factory, -21)   # low again
+    
+    failures.append(500)
+    now = datetime.utcnow()
+    assert worker.run_once(now) == {"delivered": 0, "superseded": 2, "retried": 1, "failed": 0}
+    assert received == []
+    # Not due again until the backoff has passed
+    assert worker.run_once(now + timedelta(seconds=30))["retried"] == 0
+    
+    result = worker.run_once(now + timedelta(seconds=61))
+    assert result["delivered"] == 1
+    [[alert]] = received
+    assert (alert["type"], alert["sku"], alert["quantity"]) == ("low_stock", "R-1", 1)
+    assert alert["dedupe_key"].startswith("low_stock:")
+    assert events(session_factory) == [("low_stock", "superseded"), ("restocked", "superseded"), ("low_stock", "delivered")]
+    
+    # The log sink saw the failed attempt too: delivery is at least once
+    with open(log_path) as f:
+        logged = [json.loads(line)["id"] for line in f]
+    assert logged == [alert["id"], alert["id"]]
+    assert worker.run_once(now + timedelta(seconds=120)) == {"delivered": 0, "superseded": 0, "retried": 0, "failed": 0}
+
+def test_worker_gives_up_after_max_attempts(session_factory):
+    """Test that an unreachable webhook eventually marks events failed"""
+    worker = OutboxWorker(session_factory, [WebhookSink("http://127.0.0.1:9/unreachable", timeout=1)],
+                          max_attempts=2, retry_seconds=0)
+    move(session_factory, -18)
+    
+    assert worker.run_once()["retried"] == 1
+    assert worker.run_once()["failed"] == 1
+    assert events(session_factory) == [("low_stock", "failed")]
+
+def test_in_process_worker_requires_a_sink(monkeypatch):
+    """Test the API refuses OUTBOX_WORKER=true without anywhere to deliver to"""
+    monkeypatch.setattr(main, "OUTBOX_WORKER", True)
+    monkeypatch.setattr(main, "prepare_database", lambda: None)
+    monkeypatch.setattr(main.outbox_worker, "sinks", [])
+
+    async def start():
+        async with main.lifespan(main.app):
+            pass
+
+    with pytest.raises(RuntimeError, match="OUTBOX_LOG_PATH"):
+        asyncio.run(start())
@@ -0,0 +1,131 @@
+"""
+Tests for read-replica routing, using two SQLite files as primary and replica
+"""
+import os
+import tempfile
+from datetime import timedelta
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, get_async_db, get_async_read_db
+from models import Product, User
+from auth import create_access_token, user_cache
+from read_replica import ReadYourWritesMiddleware, ReplicaRouter, read_session_dependency
+from routes import products
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def create_database(path: str, sku: str):
+    """A schema with one product; users only exist on the primary"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Product(name=sku, sku=sku, price=1.0, quantity=10))
+    if sku == "PRIMARY":
+        db.add_all([
+            User(username="admin", email="admin@example.com", password="x", role="admin"),
+            User(username="reader", email="reader@example.com", password="x", role="customer"),
+        ])
+    db.commit()
+    db.close()
+    engine.dispose()
+    return async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"),
+                              autoflush=False, expire_on_commit=False)
+
+def build_client(replica_path: str, clock: FakeClock, **router_options) -> tuple:
+    tmp = tempfile.mkdtemp()
+    primary = create_database(os.path.join(tmp, "primary.db"), "PRIMARY")
+    if os.path.isdir(os.path.dirname(replica_path)):
+        create_database(replica_path, "REPLICA")
+    replica = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{replica_path}"),
+                                 autoflush=False, expire_on_commit=False)
+    router = ReplicaRouter(replica, clock=clock, **router_options)
+
+    async def get_primary_db():
+        async with primary() as db:
+            yield db
+
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware, router=router)
+    app.include_router(products.router)
+    app.dependency_overrides[get_async_db] = get_primary_db
+    app.dependency_overrides[get_async_read_db] = read_session_dependency(primary, router)
+    return router, TestClient(app)
+
+def headers(username: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+def skus(client: TestClient, username: str) -> list:
+    response = client.get("/api/products/", headers=headers(username))
+    assert response.status_code == 200
+    return [p["sku"] for p in response.json()]
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+def test_writer_reads_primary_until_sticky_window_ends():
+    """Test reads go to the replica, except for a client that just wrote"""
+    clock = FakeClock()
+    router, client = build_client(os.path.join(tempfile.mkdtemp(), "replica.db"), clock, sticky_seconds=5)
+    admin = headers("admin")
+    assert skus(client, "admin") == ["REPLICA"]
+
+    response = client.post("/api/products/", headers=admin,
+                           json={"name": "Rope", "sku": "ROPE", "price": 2.0, "quantity": 3})
+    assert response.status_code == 200
+    # The writer sees its write, even with a reissued token; other clients keep reading the replica
+    assert skus(client, "admin") == ["PRIMARY", "ROPE"]
+    refreshed = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'}, timedelta(minutes=5))}"}
+    assert [p["sku"] for p in client.get("/api/products/", headers=refreshed).json()] == ["PRIMARY", "ROPE"]
+    assert skus(client, "reader") == ["REPLICA"]
+
+    clock.now += 5
+    assert skus(client, "admin") == ["REPLICA"]
+    stats = router.stats()
+    assert (stats["replica_reads"], stats["primary_reads"], stats["sticky_clients"]) == (3, 2, 0)
+
+def test_failed_write_does_not_make_client_sticky():
+    """Test an error response leaves the client on the replica"""
+    router, client = build_client(os.path.join(tempfile.mkdtemp(), "replica.db"), FakeClock())
+    response = client.post("/api/products/", headers=headers("reader"),
+                           json={"name": "Rope", "sku": "ROPE", "price": 2.0, "quantity": 3})
+    assert response.status_code == 403
+    assert skus(client, "reader") == ["REPLICA"]
+    assert router.stats()["sticky_clients"] == 0
+
+def test_unavailable_replica_falls_back_to_primary():
+    """Test reads fall back to the primary and the replica is retried after the retry window"""
+    clock = FakeClock()
+    missing = os.path.join(tempfile.mkdtemp(), "missing", "replica.db")
+    router, client = build_client(missing, clock, retry_seconds=30)
+    assert skus(client, "reader") == ["PRIMARY"]
+    stats = router.stats()
+    assert (stats["replica_available"], stats["fallbacks"]) == (False, 1)
+    assert "OperationalError" in stats["last_error"]
+
+    # Within the retry window the replica isn't tried again
+    assert skus(client, "reader") == ["PRIMARY"]
+    assert router.stats()["fallbacks"] == 1
+
+    clock.now += 30
+    assert skus(client, "reader") == ["PRIMARY"]
+    assert router.stats()["fallbacks"] == 2
+
+def test_disabled_router_uses_primary():
+    """Test no replica configured means every read uses the primary session"""
+    router = ReplicaRouter(None)
+    router.mark_write("client")
+    assert not router.enabled
+    assert not router.is_sticky("client")
+    assert router.stats()["sticky_clients"] == 0
@@ -0,0 +1,59 @@
+"""
+Unit tests for the report result cache
+"""
+from report_cache import MemoryBackend, ReportCache, pack, parse_ttls, unpack
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BrokenBackend:
+    local = False
+
+    def get(self, key):
+        raise ConnectionError("cache down")
+
+    def set(self, key, value, ttl):
+        raise ConnectionError("cache down")
+
+
+def test_memory_backend_expires_and_evicts_least_recently_used():
+    clock = FakeClock()
+    backend = MemoryBackend(2, clock=clock)
+    backend.set("a", b"1", ttl=10)
+    backend.set("b", b"2", ttl=5)
+    assert backend.get("a") == b"1"
+    backend.set("c", b"3", ttl=10)
+    assert backend.get("b") is None  # evicted: "a" was used more recently
+    clock.now = 10
+    assert backend.get("a") is None
+    assert backend.get("c") is None
+    assert backend.size() == 0
+
+
+def test_report_cache_keys_counters_and_backend_errors():
+    cache = ReportCache(MemoryBackend(8), parse_ttls("low-stock=0"))
+    key = cache.key("category-stats", 3, "days=7")
+    assert key != cache.key("category-stats", 4, "days=7")
+    assert key != cache.key("category-stats", 3, "days=8")
+
+    assert cache.get("category-stats", key) is None
+    cache.set("category-stats", key, pack(b"[]", {"X-Next-Cursor": "abc"}))
+    assert unpack(cache.get("category-stats", key)) == (b"[]", {"X-Next-Cursor": "abc"})
+    cache.invalidate()
+    assert cache.get("category-stats", key) is None
+
+    # A zero TTL disables caching for that report
+    cache.set("low-stock", "low-stock:3:x", b"[]")
+    assert cache.get("low-stock", "low-stock:3:x") is None
+
+    broken = ReportCache(BrokenBackend(), parse_ttls(""))
+    broken.set("low-stock", "k", b"[]")
+    assert broken.get("low-stock", "k") is None
+    assert cache.stats()["endpoints"]["category-stats"] == {"hits": 1, "misses": 2, "errors": 0, "hit_rate": 1 / 3}
+    assert broken.stats()["endpoints"]["low-stock"] == {"hits": 0, "misses": 1, "errors": 2, "hit_rate": 0.0}
@@ -0,0 +1,123 @@
+"""
+Tests for inventory history retention and archival
+"""
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import InventoryHistory, InventoryHistoryDaily
+from retention import compact_history, read_archive, read_daily
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+@pytest.fixture
+def db_session():
+    """A fresh SQLite file per test"""
+    path = os.path.join(tempfile.mkdtemp(), "retention.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def add_history(session, product_id, created_at, action="stock_change", change=1):
+    session.add(InventoryHistory(
+        product_id=product_id, action=action, quantity_change=change,
+        performed_by="test", notes="", created_at=created_at
+    ))
+
+def test_compact_history_archives_and_aggregates(db_session):
+    """Test that old rows move to the archive and daily totals, in batches"""
+    old_day = datetime(2023, 1, 15, 9, 0)
+    for i in range(7):
+        add_history(db_session, 1, old_day + timedelta(minutes=i), change=i)
+    add_history(db_session, 2, datetime(2023, 2, 1, 8, 0), action="added", change=5)
+    add_history(db_session, 1, NOW - timedelta(days=10), change=3)
+    db_session.commit()
+    archive_dir = tempfile.mkdtemp()
+    
+    report = compact_history(db_session, days=365, archive_dir=archive_dir, batch_size=3, now=NOW)
+    
+    assert report.archived == 8
+    assert report.batches == 3
+    assert [os.path.basename(f) for f in report.files] == ["history-2023-01.ndjson.gz", "history-2023-02.ndjson.gz"]
+    assert db_session.scalar(select(func.count(InventoryHistory.id))) == 1
+    
+    daily = [(d.product_id, d.day, d.action, d.events, d.quantity_change) for d in read_daily(db_session)]
+    assert daily == [
+        (1, date(2023, 1, 15), "stock_change", 7, sum(range(7))),
+        (2, date(2023, 2, 1), "added", 1, 5),
+    ]
+    
+    archived = list(read_archive(archive_dir, product_id=1))
+    assert [row["quantity_change"] for row in archived] == list(range(7))
+    assert list(read_archive(archive_dir, since=datetime(2023, 2, 1))) == [
+        row for row in read_archive(archive_dir) if row["product_id"] == 2
+    ]
+    
+    # Nothing left to do on a second run
+    assert compact_history(db_session, days=365, archive_dir=archive_dir, now=NOW).archived == 0
+
+def test_compact_history_resumes_and_merges_daily_totals(db_session):
+    """Test stopping after one batch and finishing later on the same day"""
+    day = datetime(2023, 3, 1, 10, 0)
+    for i in range(4):
+        add_history(db_session, 7, day + timedelta(minutes=i), change=2)
+    db_session.commit()
+    archive_dir = tempfile.mkdtemp()
+    
+    first = compact_history(db_session, days=30, archive_dir=archive_dir, batch_size=3, max_batches=1, now=NOW)
+    assert first.archived == 3
+    compact_history(db_session, days=30, archive_dir=archive_dir, batch_size=3, now=NOW)
+    
+    row = db_session.scalars(select(InventoryHistoryDaily)).one()
+    assert (row.events, row.quantity_change) == (4, 8)
+    assert len(list(read_archive(archive_dir))) == 4
+
+def test_daily_totals_written_with_one_statement_per_batch(db_session):
+    """Test that a batch's (product, day, action) keys go out as one executemany upsert"""
+    for product_id in range(1, 5):
+        for day in range(1, 4):
+            add_history(db_session, product_id, datetime(2023, 1, day, 9, 0), change=product_id)
+    add_history(db_session, 1, datetime(2023, 1, 1, 10, 0), action="added", change=1)
+    db_session.commit()
+
+    upserts = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO INVENTORY_HISTORY_DAILY"):
+            upserts.append(len(parameters) if executemany else 1)
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        report = compact_history(db_session, days=30, archive_dir=tempfile.mkdtemp(), now=NOW)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert (report.batches, report.daily_rows) == (1, 13)
+    assert upserts == [13]
+    assert db_session.scalar(select(func.count()).select_from(InventoryHistoryDaily)) == 13
+
+def test_batch_archived_twice_after_crash_is_read_once(db_session, monkeypatch):
+    """Test a batch re-archived after a failed commit is deduplicated within its month file"""
+    for month in (1, 2):
+        for i in range(2):
+            add_history(db_session, month, datetime(2023, month, 10, 9, i))
+    db_session.commit()
+    archive_dir = tempfile.mkdtemp()
+
+    commit = db_session.commit
+    def crash():
+        monkeypatch.setattr(db_session, "commit", commit)
+        raise RuntimeError("crashed before commit")
+    monkeypatch.setattr(db_session, "commit", crash)
+    with pytest.raises(RuntimeError):
+        compact_history(db_session, days=30, archive_dir=archive_dir, now=NOW)
+    db_session.rollback()
+    assert compact_history(db_session, days=30, archive_dir=archive_dir, now=NOW).archived == 4
+
+    rows = list(read_archive(archive_dir))
+    assert sorted(row["id"] for row in rows) == [1, 2, 3, 4]
@@ -0,0 +1,83 @@
+"""
+Tests for the slow-query log
+"""
+import logging
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+from metrics import MetricsMiddleware, RequestMetrics
+from slow_queries import SlowQueryLog, install_slow_query_log, normalize_statement, parameter_shape
+
+@pytest.fixture
+def slow_log():
+    """An in-memory SQLite engine whose every statement counts as slow"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("CREATE INDEX ix_items_name ON items (name)"))
+    log = SlowQueryLog()
+    install_slow_query_log(engine, threshold_ms=0.000001, capture_plans=True, log=log)
+    yield engine, log
+    engine.dispose()
+
+def test_normalize_statement_and_parameter_shape():
+    """Test literals, placeholders and IN lists collapse to one shape"""
+    assert normalize_statement("SELECT *\n  FROM t1 WHERE a = 'x''y' AND b IN (?, ?, ?) LIMIT 10") == \
+        "SELECT * FROM t1 WHERE a = ? AND b IN (?...) LIMIT ?"
+    assert normalize_statement("SELECT a::text FROM t WHERE id = %(id_1)s OR id = $2") == \
+        "SELECT a::text FROM t WHERE id = ? OR id = ?"
+    assert parameter_shape((1, 2, "a", None)) == "(int x2, str, NoneType)"
+    assert parameter_shape({"id": 3}) == "{id: int}"
+    assert parameter_shape([(1,), (2,)], executemany=True) == "2 x (int)"
+
+def test_slow_statements_aggregated_with_plan_and_route(slow_log, caplog):
+    """Test aggregation by normalized text, EXPLAIN capture and route attribution"""
+    engine, log = slow_log
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=RequestMetrics())
+    
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        with engine.connect() as conn:
+            return {"name": conn.execute(text("SELECT name FROM items WHERE name = :name"), {"name": str(item_id)}).scalar()}
+    
+    client = TestClient(app)
+    with caplog.at_level(logging.WARNING, logger="inventory.slow_queries"):
+        for item_id in (1, 2, 3):
+            client.get(f"/items/{item_id}")
+    
+    entry = next(e for e in log.top(sort="count") if e["statement"] == "SELECT name FROM items WHERE name = ?")
+    assert entry["count"] == 3
+    assert entry["routes"] == {"GET /items/{item_id}": 3}
+    assert entry["parameters"] == "(str)"
+    assert "ix_items_name" in entry["plan"]
+    assert "on GET /items/{item_id}: SELECT name FROM items WHERE name = ?" in caplog.text
+    
+    with engine.connect() as conn:
+        conn.execute(text("SELECT count(*) FROM items"))
+    outside = next(e for e in log.top() if e["statement"] == "SELECT count(*) FROM items")
+    assert outside["routes"] == {}
+
+def test_failed_explain_is_recorded_not_raised(slow_log, monkeypatch):
+    """Test that a failing EXPLAIN doesn't affect the statement that triggered it"""
+    engine, log = slow_log
+    def broken_explain(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr("slow_queries.explain", broken_explain)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    entries = {e["statement"]: e for e in log.top()}
+    assert entries["SELECT ?"]["plan"] == "EXPLAIN failed: RuntimeError: boom"
+    
+    log.clear()
+    assert log.stats()["statements"] == 0
+
+def test_eviction_keeps_most_expensive_statements():
+    """Test the aggregate is bounded by dropping the cheapest statement"""
+    log = SlowQueryLog(max_statements=2)
+    log.record("SELECT a", "()", 0.5, None)
+    log.record("SELECT b", "()", 0.1, None)
+    log.record("SELECT c", "()", 0.3, None)
+    assert [e["statement"] for e in log.top()] == ["SELECT a", "SELECT c"]
@@ -0,0 +1,120 @@
+"""
+Tests for atomic stock movements
+"""
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Product, InventoryHistory, CategoryRollup
+from rollup import rebuild_rollups
+from stock import StockMovement, apply_stock_movements
+
+@pytest.fixture
+def session_factory():
+    """A SQLite file shared by many connections, so writers really contend"""
+    path = os.path.join(tempfile.mkdtemp(), "stock.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30, "check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add_all([
+        Product(name="Apple", sku="A-1", category="Fruit", price=1.0, quantity=0, min_stock_level=5),
+        Product(name="Banana", sku="B-1", category="Fruit", price=2.0, quantity=1000, min_stock_level=5),
+        Product(name="Cherry", sku="C-1", category="Fruit", price=3.0, quantity=100, min_stock_level=5),
+    ])
+    db.commit()
+    rebuild_rollups(db)
+    db.commit()
+    db.close()
+    yield Session
+    engine.dispose()
+
+def quantities(Session):
+    db = Session()
+    try:
+        return dict(db.execute(select(Product.sku, Product.quantity)).all())
+    finally:
+        db.close()
+
+def test_movements_apply_together_or_not_at_all(session_factory):
+    """Test a multi-SKU batch, duplicate SKUs, and rollback on any failure"""
+    db = session_factory()
+    report = apply_stock_movements(db, [
+        StockMovement(sku="B-1", delta=-10, notes="sale"),
+        StockMovement(sku="A-1", delta=4),
+        StockMovement(sku="B-1", delta=-5),
+    ], "cashier")
+    assert report.errors == []
+    assert [(s.sku, s.delta, s.quantity) for s in report.applied] == [("A-1", 4, 4), ("B-1", -15, 985)]
+    
+    report = apply_stock_movements(db, [
+        StockMovement(sku="A-1", delta=1),
+        StockMovement(sku="C-1", delta=-101),
+        StockMovement(sku="Z-9", delta=1),
+    ], "cashier")
+    assert report.applied == []
+    assert [(e.sku, e.error) for e in report.errors] == [("C-1", "Insufficient stock"), ("Z-9", "Product not found")]
+    db.close()
+    
+    assert quantities(session_factory) == {"A-1": 4, "B-1": 985, "C-1": 100}
+    db = session_factory()
+    changes = db.execute(select(InventoryHistory.quantity_change).order_by(InventoryHistory.id)).scalars().all()
+    assert changes == [4, -15]
+    rollup = db.get(CategoryRollup, ("Fruit", False))
+    assert rollup.total_value == pytest.approx(4 * 1.0 + 985 * 2.0 + 100 * 3.0)
+    assert rollup.low_stock_count == 1
+    db.close()
+
+def test_allow_negative_skips_the_guard(session_factory):
+    """Test that the non-negative guard can be turned off"""
+    db = session_factory()
+    report = apply_stock_movements(db, [StockMovement(sku="A-1", delta=-3)], "cashier", allow_negative=True)
+    db.close()
+    assert report.applied[0].quantity == -3
+
+def test_parallel_clients_lose_no_updates(session_factory):
+    """Test that concurrent movements on the same SKUs all land exactly once"""
+    workers, batches = 8, 25
+    
+    def cashier(n):
+        db = session_factory()
+        try:
+            for _ in range(batches):
+                report = apply_stock_movements(db, [
+                    StockMovement(sku="A-1", delta=1),
+                    StockMovement(sku="B-1", delta=-1),
+                ], f"cashier-{n}")
+                assert report.errors == []
+        finally:
+            db.close()
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(cashier, range(workers)))
+    
+    total = workers * batches
+    assert quantities(session_factory)["A-1"] == total
+    assert quantities(session_factory)["B-1"] == 1000 - total
+    db = session_factory()
+    assert db.scalar(select(func.count(InventoryHistory.id))) == 2 * total
+    db.close()
+
+def test_parallel_clients_never_oversell(session_factory):
+    """Test that the non-negative guard holds when clients race for the last units"""
+    def cashier(n):
+        db = session_factory()
+        try:
+            return sum(
+                1 for _ in range(20)
+                if not apply_stock_movements(db, [StockMovement(sku="C-1", delta=-1)], f"cashier-{n}").errors
+            )
+        finally:
+            db.close()
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        sold = sum(pool.map(cashier, range(8)))
+    
+    assert sold == 100
+    assert quantities(session_factory)["C-1"] == 0
@@ -0,0 +1,68 @@
+"""
+Tests for delta sync (products changed since a cursor)
+"""
+import os
+import tempfile
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Product
+from changes import record_product_changes
+from rollup import product_state
+from stock import StockMovement, apply_stock_movements
+from sync import read_changes
+
+@pytest.fixture
+def db_session():
+    """A fresh SQLite file per test"""
+    path = os.path.join(tempfile.mkdtemp(), "sync.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def create(db, *skus):
+    products = [Product(name=sku, sku=sku, price=1.0, quantity=10) for sku in skus]
+    db.add_all(products)
+    db.flush()
+    record_product_changes(db, [(None, product_state(p)) for p in products])
+    db.commit()
+    return products
+
+def sync_all(db, cursor=None, limit=2):
+    """Follow the cursor until has_more is false; returns (skus, deleted ids, cursor)"""
+    skus, deleted = [], []
+    while True:
+        page = read_changes(db, cursor, limit=limit)
+        skus += [p["sku"] for p in page["products"]]
+        deleted += [d["id"] for d in page["deleted"]]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            return skus, deleted, cursor
+
+def test_delta_sync_returns_only_changes_after_the_cursor(db_session):
+    """Test paging within one version, updates, tombstones and an idle sync"""
+    hammer, rope, saw = create(db_session, "HAMMER", "ROPE", "SAW")
+    skus, deleted, cursor = sync_all(db_session)
+    assert (skus, deleted) == (["HAMMER", "ROPE", "SAW"], [])
+    assert sync_all(db_session, cursor)[:2] == ([], [])
+    
+    apply_stock_movements(db_session, [StockMovement(sku="ROPE", delta=-1)], "tester")
+    record_product_changes(db_session, [(product_state(saw), None)])
+    db_session.delete(saw)
+    db_session.commit()
+    create(db_session, "NAILS")
+    apply_stock_movements(db_session, [StockMovement(sku="ROPE", delta=-1)], "tester")
+    
+    skus, deleted, cursor = sync_all(db_session, cursor, limit=1)
+    # ROPE changed twice but comes back once, at its latest version
+    assert skus == ["NAILS", "ROPE"]
+    assert deleted == [saw.id]
+    assert read_changes(db_session, cursor)["products"] == []
+    
+    since = read_changes(db_session, since=0)
+    assert [p["sku"] for p in since["products"]] == ["HAMMER", "NAILS", "ROPE"]
+    assert since["products"][-1]["quantity"] == 8
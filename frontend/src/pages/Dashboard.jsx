@@ -1,6 +1,6 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import { useNavigate } from 'react-router-dom'
-import { productService, reportService } from '../services/api'
+import { productService, reportService, liveService, applyProductChanges } from '../services/api'
 
 function Dashboard({ user }) {
   const [stats, setStats] = useState({
@@ -11,7 +11,9 @@ function Dashboard({ user }) {
     totalCategories: 0
   })
   const [lowStockProducts, setLowStockProducts] = useState([])
+  const [allProducts, setAllProducts] = useState(null)
   const navigate = useNavigate()
+  const reloadTimer = useRef(null)
 
   const isAdmin = user.role === 'admin'
 
@@ -19,6 +21,37 @@ function Dashboard({ user }) {
     loadStats()
   }, [])
 
+  // Customers hold the whole catalog, so recompute the stats whenever it changes
+  useEffect(() => {
+    if (allProducts === null) return
+    const totalProducts = allProducts.length
+    const totalValue = allProducts.reduce((sum, p) => sum + (p.price * p.quantity), 0)
+    const lowStock = allProducts.filter(p => p.quantity <= p.min_stock_level && p.quantity > 0).length
+    const outOfStock = allProducts.filter(p => p.quantity === 0).length
+    setStats({ totalProducts, totalValue, lowStock, outOfStock, totalCategories: 0 })
+  }, [allProducts])
+
+  useEffect(() => {
+    const unsubscribe = liveService.subscribeToProducts({
+      onChanges: (changes) => {
+        if (isAdmin) {
+          // Admin stats come from server-side rollups; a burst of writes
+          // triggers one (ETag-revalidated) reload
+          clearTimeout(reloadTimer.current)
+          reloadTimer.current = setTimeout(loadStats, 500)
+        } else {
+          const created = changes.filter(change => change.op === 'created').map(change => change.product)
+          setAllProducts(prev => prev && [...applyProductChanges(prev, changes), ...created])
+        }
+      },
+      onReset: () => loadStats()
+    })
+    return () => {
+      clearTimeout(reloadTimer.current)
+      unsubscribe()
+    }
+  }, [])
+
   const loadStats = async () => {
     try {
       if (isAdmin) {
@@ -28,15 +61,8 @@ function Dashboard({ user }) {
         const lowStockResponse = await reportService.getLowStock()
         setLowStockProducts(lowStockResponse.data.slice(0, 5))
       } else {
-        const response = await productService.getAll()
-        const products = response.data
-        
-        const totalProducts = products.length
-        const totalValue = products.reduce((sum, p) => sum + (p.price * p.quantity), 0)
-        const lowStock = products.filter(p => p.quantity <= p.min_stock_level && p.quantity > 0).length
-        const outOfStock = products.filter(p => p.quantity === 0).length
-        
-        setStats({ totalProducts, totalValue, lowStock, outOfStock, totalCategories: 0 })
+        const response = await productService.getAllPages()
+        setAllProducts(response.data)
       }
     } catch (error) {
       console.error('Error loading stats:', error)
@@ -1,40 +1,100 @@
-import React, { useState, useEffect } from 'react'
-import { productService } from '../services/api'
+import React, { useState, useEffect, useRef } from 'react'
+import { productService, liveService, applyProductChanges } from '../services/api'
 import ProductForm from '../components/ProductForm'
 import ProductDetail from '../components/ProductDetail'
 
+const PAGE_SIZE = 50
+
 function Products({ user }) {
   const [products, setProducts] = useState([])
-  const [filteredProducts, setFilteredProducts] = useState([])
+  const [totalCount, setTotalCount] = useState(0)
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loading, setLoading] = useState(false)
   const [showModal, setShowModal] = useState(false)
   const [showDetail, setShowDetail] = useState(false)
   const [editingProduct, setEditingProduct] = useState(null)
   const [selectedProduct, setSelectedProduct] = useState(null)
   const [categories, setCategories] = useState([])
+  const [newCount, setNewCount] = useState(0)
   const [filters, setFilters] = useState({
     search: '',
     category: '',
     minPrice: '',
-    maxPrice: ''
+    maxPrice: '',
+    sort: 'name'
   })
 
   const isAdmin = user.role === 'admin'
 
   useEffect(() => {
-    loadProducts()
     loadCategories()
   }, [])
 
+  // The feed outlives filter changes, so it reads the latest state through refs
+  const loadProductsRef = useRef()
+  loadProductsRef.current = () => loadProducts()
+  const productsRef = useRef(products)
+  productsRef.current = products
+
+  // Patch the loaded rows with changes pushed by the server instead of refetching
   useEffect(() => {
-    applyFilters()
-  }, [products, filters])
+    return liveService.subscribeToProducts({
+      onChanges: (changes) => {
+        const shown = new Set(productsRef.current.map(product => product.id))
+        const removed = changes.filter(change => change.op === 'deleted' && shown.has(change.id)).length
+        setProducts(prev => applyProductChanges(prev, changes))
+        setTotalCount(count => count - removed)
+        // New products may not match the current filters or page; offer a reload
+        setNewCount(count => count + changes.filter(change => change.op === 'created').length)
+      },
+      onReset: () => loadProductsRef.current()
+    })
+  }, [])
+
+  // Filtering and sorting happen on the server; debounce so typing in the
+  // search box doesn't fire a request per keystroke
+  useEffect(() => {
+    const timer = setTimeout(() => loadProducts(), 300)
+    return () => clearTimeout(timer)
+  }, [filters])
+
+  const buildParams = () => {
+    // Best-match ordering only makes sense while searching
+    const sort = filters.sort === 'relevance' && !filters.search ? 'name' : filters.sort
+    const params = { limit: PAGE_SIZE, sort }
+    if (filters.search) params.search = filters.search
+    if (filters.category) params.category = filters.category
+    if (filters.minPrice) params.min_price = parseFloat(filters.minPrice)
+    if (filters.maxPrice) params.max_price = parseFloat(filters.maxPrice)
+    return params
+  }
 
   const loadProducts = async () => {
+    setLoading(true)
     try {
-      const response = await productService.getAll()
+      const response = await productService.getAll({ ...buildParams(), include_total: true })
       setProducts(response.data)
+      setTotalCount(parseInt(response.headers['x-total-count'] || response.data.length, 10))
+      setNextCursor(response.headers['x-next-cursor'] || null)
+      setNewCount(0)
     } catch (error) {
       console.error('Error loading products:', error)
+    } finally {
+      setLoading(false)
+    }
+  }
+
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setLoading(true)
+    try {
+      const response = await productService.getAll({ ...buildParams(), cursor: nextCursor })
+      setProducts(prev => [...prev, ...response.data])
+      setNextCursor(response.headers['x-next-cursor'] || null)
+    } catch (error) {
+      console.error('Error loading products:', error)
+    } finally {
+      setLoading(false)
     }
   }
 
@@ -47,37 +107,12 @@ function Products({ user }) {
     }
   }
 
-  const applyFilters = () => {
-    let filtered = [...products]
-
-    if (filters.search) {
-      filtered = filtered.filter(p =>
-        p.name.toLowerCase().includes(filters.search.toLowerCase()) ||
-        p.sku.toLowerCase().includes(filters.search.toLowerCase())
-      )
-    }
-
-    if (filters.category) {
-      filtered = filtered.filter(p => p.category === filters.category)
-    }
-
-    if (filters.minPrice) {
-      filtered = filtered.filter(p => p.price >= parseFloat(filters.minPrice))
-    }
-
-    if (filters.maxPrice) {
-      filtered = filtered.filter(p => p.price <= parseFloat(filters.maxPrice))
-    }
-
-    setFilteredProducts(filtered)
-  }
-
   const handleFilterChange = (e) => {
     setFilters({ ...filters, [e.target.name]: e.target.value })
   }
 
   const clearFilters = () => {
-    setFilters({ search: '', category: '', minPrice: '', maxPrice: '' })
+    setFilters({ ...filters, search: '', category: '', minPrice: '', maxPrice: '' })
   }
 
   const handleDelete = async (id) => {
@@ -130,7 +165,7 @@ function Products({ user }) {
           <input
             type="text"
             name="search"
-            placeholder="Search by name or SKU..."
+            placeholder="Search by name, SKU or description..."
             value={filters.search}
             onChange={handleFilterChange}
           />
@@ -163,13 +198,30 @@ function Products({ user }) {
             step="0.01"
           />
         </div>
+        <div className="filter-group">
+          <select name="sort" value={filters.sort} onChange={handleFilterChange}>
+            <option value="relevance">Best match</option>
+            <option value="name">Name (A-Z)</option>
+            <option value="-name">Name (Z-A)</option>
+            <option value="sku">SKU</option>
+            <option value="price">Price (low to high)</option>
+            <option value="-price">Price (high to low)</option>
+            <option value="quantity">Quantity (low to high)</option>
+            <option value="-updated_at">Recently updated</option>
+          </select>
+        </div>
         <button className="btn btn-secondary" onClick={clearFilters}>
           Clear
         </button>
       </div>
 
       <div style={{ marginBottom: '10px', color: '#7f8c8d' }}>
-        Showing {filteredProducts.length} of {products.length} products
+        Showing {products.length} of {totalCount} products
+        {newCount > 0 && (
+          <button className="btn btn-secondary" onClick={loadProducts} style={{ marginLeft: '10px' }}>
+            {newCount} new {newCount === 1 ? 'product' : 'products'} - refresh
+          </button>
+        )}
       </div>
 
       <div className="table">
@@ -187,7 +239,7 @@ function Products({ user }) {
             </tr>
           </thead>
           <tbody>
-            {filteredProducts.map((product) => (
+            {products.map((product) => (
               <tr key={product.id}>
                 <td>{product.sku}</td>
                 <td>{product.name}</td>
@@ -227,6 +279,14 @@ function Products({ user }) {
         </table>
       </div>
 
+      {nextCursor && (
+        <div style={{ textAlign: 'center', marginTop: '15px' }}>
+          <button className="btn btn-primary" onClick={loadMore} disabled={loading}>
+            {loading ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
+
       {showModal && (
         <ProductForm
           product={editingProduct}
@@ -9,15 +9,67 @@ const api = axios.create({
   },
 })
 
+// Bodies of GET responses that carried an ETag, keyed by URL + query string.
+// Revalidated with If-None-Match; a 304 reuses the cached body and headers.
+const MAX_CACHED_RESPONSES = 100
+const responseCache = new Map()
+let cachedForToken = null
+
+const cacheKey = (config) => {
+  const params = new URLSearchParams()
+  Object.entries(config.params || {})
+    .filter(([, value]) => value !== undefined && value !== null && value !== '')
+    .sort(([a], [b]) => a.localeCompare(b))
+    .forEach(([key, value]) => params.append(key, value))
+  return `${config.url}?${params.toString()}`
+}
+
+export const clearResponseCache = () => responseCache.clear()
+
 // Add token to requests
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem('token')
   if (token) {
     config.headers.Authorization = `Bearer ${token}`
   }
+  // Never serve one user's cached bodies to another
+  if (token !== cachedForToken) {
+    responseCache.clear()
+    cachedForToken = token
+  }
+  if ((config.method || 'get').toLowerCase() === 'get') {
+    const cached = responseCache.get(cacheKey(config))
+    if (cached) {
+      config.headers['If-None-Match'] = cached.etag
+    }
+    config.validateStatus = (status) => (status >= 200 && status < 300) || status === 304
+  }
   return config
 })
 
+api.interceptors.response.use((response) => {
+  if ((response.config.method || 'get').toLowerCase() !== 'get') {
+    return response
+  }
+  const key = cacheKey(response.config)
+  if (response.status === 304) {
+    const cached = responseCache.get(key)
+    if (cached) {
+      return { ...response, status: 200, data: cached.data, headers: { ...cached.headers, ...response.headers } }
+    }
+  }
+  const etag = response.headers.etag
+  if (etag) {
+    responseCache.delete(key)
+    responseCache.set(key, { etag, data: response.data, headers: { ...response.headers } })
+    // Map keeps insertion order, so the first key is the least recently stored
+    if (responseCache.size > MAX_CACHED_RESPONSES) {
+      responseCache.delete(responseCache.keys().next().value)
+    }
+  }
+  return response
+})
+
 export const authService = {
   login: (credentials) => api.post('/auth/login', credentials),
   register: (userData) => api.post('/auth/register', userData),
@@ -26,12 +78,61 @@ export const authService = {
 
 export const productService = {
   getAll: (params) => api.get('/products', { params }),
+  // Follow X-Next-Cursor until the whole (filtered) list has been fetched
+  getAllPages: async (params = {}) => {
+    const items = []
+    let cursor = null
+    do {
+      const response = await api.get('/products', {
+        params: { ...params, limit: 500, ...(cursor ? { cursor } : {}) }
+      })
+      items.push(...response.data)
+      cursor = response.headers['x-next-cursor']
+    } while (cursor)
+    return { data: items }
+  },
+  // Delta sync: pass the previous response's cursor; repeat while has_more
+  getChanges: (cursor, limit = 500) =>
+    api.get('/products/changes', { params: { limit, ...(cursor ? { cursor } : {}) } }),
   getById: (id) => api.get(`/products/${id}`),
   getCategories: () => api.get('/products/categories'),
   create: (data) => api.post('/products', data),
   update: (id, data) => api.put(`/products/${id}`, data),
   delete: (id) => api.delete(`/products/${id}`),
   getHistory: (id) => api.get(`/products/${id}/history`),
+  // movements: [{ sku, delta, notes }]; applied atomically, all or nothing
+  moveStock: (movements, allowNegative = false) =>
+    api.post('/products/stock-movements', { movements, allow_negative: allowNegative }),
+}
+
+// Patch a product list with live feed deltas: known rows are replaced in
+// place, deleted rows dropped. Created products are left to the caller since
+// they may not match its filters or sort order.
+export const applyProductChanges = (products, changes) => {
+  const updates = new Map()
+  const deleted = new Set()
+  changes.forEach((change) => {
+    if (change.op === 'deleted') deleted.add(change.id)
+    else updates.set(change.product.id, change.product)
+  })
+  return products
+    .filter((product) => !deleted.has(product.id))
+    .map((product) => updates.get(product.id) || product)
+}
+
+export const liveService = {
+  // Server-Sent Events; the browser reconnects by itself and resumes with
+  // Last-Event-ID. onReset means missed changes can't be replayed: refetch.
+  subscribeToProducts: ({ onChanges, onReset }) => {
+    const token = localStorage.getItem('token')
+    if (!token || typeof EventSource === 'undefined') {
+      return () => {}
+    }
+    const source = new EventSource(`${API_URL}/live/products?token=${encodeURIComponent(token)}`)
+    source.addEventListener('products', (event) => onChanges(JSON.parse(event.data).changes))
+    source.addEventListener('reset', () => onReset && onReset())
+    return () => source.close()
+  },
 }
 
 export const reportService = {
@@ -39,6 +140,8 @@ export const reportService = {
   getCategoryStats: () => api.get('/reports/category-stats'),
   getRecentActivity: (days) => api.get('/reports/recent-activity', { params: { days } }),
   getLowStock: () => api.get('/reports/low-stock'),
+  // params: { period: 'day'|'week'|'month', group_by: 'product'|'category', since, until }
+  getStockMovements: (params) => api.get('/reports/stock-movements', { params }),
 }
 
 export default api
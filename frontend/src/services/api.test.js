@@ -3,7 +3,7 @@
  */
 import { describe, it, expect, beforeEach, vi } from 'vitest'
 import axios from 'axios'
-import { authService, productService, reportService } from './api'
+import { authService, productService, reportService, applyProductChanges } from './api'
 
 // Mock axios
 vi.mock('axios')
@@ -25,7 +25,8 @@ describe('API Service', () => {
       axios.create.mockReturnValue({
         post: vi.fn().mockResolvedValue(mockResponse),
         interceptors: {
-          request: { use: vi.fn() }
+          request: { use: vi.fn() },
+          response: { use: vi.fn() }
         }
       })
 
@@ -47,7 +48,8 @@ describe('API Service', () => {
       axios.create.mockReturnValue({
         post: vi.fn().mockResolvedValue(mockResponse),
         interceptors: {
-          request: { use: vi.fn() }
+          request: { use: vi.fn() },
+          response: { use: vi.fn() }
         }
       })
 
@@ -73,7 +75,8 @@ describe('API Service', () => {
       axios.create.mockReturnValue({
         get: vi.fn().mockResolvedValue({ data: mockProducts }),
         interceptors: {
-          request: { use: vi.fn() }
+          request: { use: vi.fn() },
+          response: { use: vi.fn() }
         }
       })
 
@@ -95,7 +98,8 @@ describe('API Service', () => {
       axios.create.mockReturnValue({
         post: vi.fn().mockResolvedValue(mockResponse),
         interceptors: {
-          request: { use: vi.fn() }
+          request: { use: vi.fn() },
+          response: { use: vi.fn() }
         }
       })
 
@@ -112,7 +116,8 @@ describe('API Service', () => {
       axios.create.mockReturnValue({
         put: vi.fn().mockResolvedValue(mockResponse),
         interceptors: {
-          request: { use: vi.fn() }
+          request: { use: vi.fn() },
+          response: { use: vi.fn() }
         }
       })
 
@@ -128,7 +133,8 @@ describe('API Service', () => {
       axios.create.mockReturnValue({
         delete: vi.fn().mockResolvedValue(mockResponse),
         interceptors: {
-          request: { use: vi.fn() }
+          request: { use: vi.fn() },
+          response: { use: vi.fn() }
         }
       })
 
@@ -150,7 +156,8 @@ describe('API Service', () => {
       axios.create.mockReturnValue({
         get: vi.fn().mockResolvedValue({ data: mockStats }),
         interceptors: {
-          request: { use: vi.fn() }
+          request: { use: vi.fn() },
+          response: { use: vi.fn() }
         }
       })
 
@@ -160,4 +167,24 @@ describe('API Service', () => {
       expect(result.data.total_value).toBe(50000.0)
     })
   })
+
+  describe('applyProductChanges', () => {
+    it('should patch updated rows in place and drop deleted ones', () => {
+      const products = [
+        { id: 1, name: 'Hammer', quantity: 5 },
+        { id: 2, name: 'Rope', quantity: 8 },
+        { id: 3, name: 'Saw', quantity: 1 }
+      ]
+      const changes = [
+        { op: 'stock', product: { id: 2, name: 'Rope', quantity: 3 } },
+        { op: 'deleted', id: 1 },
+        { op: 'created', product: { id: 4, name: 'Nails', quantity: 100 } }
+      ]
+
+      expect(applyProductChanges(products, changes)).toEqual([
+        { id: 2, name: 'Rope', quantity: 3 },
+        { id: 3, name: 'Saw', quantity: 1 }
+      ])
+    })
+  })
 })